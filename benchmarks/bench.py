@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for CompassAssistant and the API server
+
+Generates (or reuses) a synthetic vault, then measures:
+- index: cold build of the vault index, and a warm refresh
+- methods: the CompassAssistant read paths (status, digest, courses, search, map)
+- endpoints: every route in server/main.py, through an in-process TestClient
+  (write endpoints last, since they change the vault)
+
+Repeated calls normally fall inside the index's refresh_interval, so they
+never pay for a refresh. Cases marked "throttle expired" call
+VaultIndex.expire() before every call to measure the refresh as well.
+
+For each case it reports p50/p99 latency, the peak of Python allocations
+(tracemalloc, one extra run) and file operations per call. The read/stat/glob
+counts come from instrumentation; for endpoints they are read from the
+Server-Timing header. opens counts every Python-level open() in the process
+(audit hook), including paths that are not instrumented.
+
+Results can be saved as a JSON baseline and compared on later runs. A case
+regresses when its p50 or memory peak grows by more than --tolerance (and by
+more than a small absolute noise floor), or when it does more file operations
+than before. Any regression makes the run exit with status 1.
+
+Usage:
+    python benchmarks/bench.py --size small --save-baseline
+    python benchmarks/bench.py --size small            # compare with benchmarks/baseline.json
+    python benchmarks/bench.py --dir /tmp/compass-bench --size full --repeat 10
+
+Baselines are machine-specific: compare runs from the same machine and the
+same vault size only.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(HERE))
+
+import synth_vault  # noqa: E402
+
+# 预设规模：(years, cards, harbor)
+SIZES = {
+    "small": (1, 2000, 200),
+    "medium": (2, 10000, 1000),
+    "full": (5, 50000, 5000),
+}
+
+DEFAULT_BASELINE = HERE / "baseline.json"
+
+# 不计时的路由（长连接）
+SKIPPED_ROUTES = {("GET", "/api/events"): "SSE stream, never completes"}
+
+# 回归判定的绝对噪声下限
+MIN_LATENCY_DELTA_MS = 1.0
+MIN_MEMORY_DELTA_KB = 256
+
+IO_FIELDS = ("reads", "bytes", "stats", "globs", "opens")
+
+_opens = 0
+
+
+def _audit(event, args):
+    global _opens
+    if event == "open":
+        _opens += 1
+
+
+def percentile(samples, pct):
+    """最近秩百分位数"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+class Case:
+    """
+    一个基准用例
+
+    - fn: 无参调用
+    - route: (method, path模板)，端点用例的fn返回从Server-Timing解析出的io计数，
+      其余用例使用本线程instrumentation的计数
+    - once: 只运行一次（冷启动）
+    """
+
+    def __init__(self, group, name, fn, route=None, once=False):
+        self.group = group
+        self.name = name
+        self.fn = fn
+        self.route = route
+        self.once = once
+
+
+def _io_from_stats(stats):
+    return {
+        "reads": stats.files_read, "bytes": stats.bytes_read,
+        "stats": stats.files_stat, "globs": stats.globs,
+    }
+
+
+_IO_RE = re.compile(r'io;desc="read=(\d+) bytes=(\d+) stat=(\d+) glob=(\d+)"')
+
+
+def _io_from_header(response):
+    match = _IO_RE.search(response.headers.get("server-timing", ""))
+    if not match:
+        return {"reads": 0, "bytes": 0, "stats": 0, "globs": 0}
+    reads, nbytes, stats, globs = (int(g) for g in match.groups())
+    return {"reads": reads, "bytes": nbytes, "stats": stats, "globs": globs}
+
+
+def run_case(case, repeat, warmup):
+    """运行用例：先预热，再计时repeat次，最后在tracemalloc下再运行一次取内存峰值"""
+    import instrumentation
+
+    def call():
+        global _opens
+        stats, token = instrumentation.begin()
+        opens_before = _opens
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                counted = case.fn()
+        finally:
+            instrumentation.end(token)
+        counts = counted if case.route else _io_from_stats(stats)
+        counts["opens"] = _opens - opens_before
+        return counts
+
+    runs = 1 if case.once else repeat
+    for _ in range(0 if case.once else warmup):
+        call()
+
+    samples, io_samples = [], {field: [] for field in IO_FIELDS}
+    for _ in range(runs):
+        started = time.perf_counter()
+        counts = call()
+        samples.append((time.perf_counter() - started) * 1000)
+        for field in IO_FIELDS:
+            io_samples[field].append(counts.get(field, 0))
+
+    peak_kb = None
+    if not case.once:
+        tracemalloc.start()
+        try:
+            call()
+            peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+
+    result = {
+        "group": case.group,
+        "runs": runs,
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "peak_kb": round(peak_kb, 1) if peak_kb is not None else None,
+    }
+    # io取中位数：索引按refresh_interval定期扫描，个别调用会多出一次扫描
+    result.update({field: percentile(io_samples[field], 50) for field in IO_FIELDS})
+    return result
+
+
+# ---------------------------------------------------------------------------
+# 用例
+# ---------------------------------------------------------------------------
+
+def _busiest_date(compass):
+    """卡片最多的日期，保证带日期的用例有内容可读"""
+    counts = {}
+    for row in compass.index.list("card"):
+        counts[row["date"]] = counts.get(row["date"], 0) + 1
+    busiest = max(counts, key=counts.get) if counts else compass.today
+    return busiest
+
+
+def _harbor_sample(compass):
+    rows = compass.index.list("harbor")
+    return rows[len(rows) // 2] if rows else None
+
+
+def _card_sample(compass, date):
+    rows = compass.index.list("card", date=date, limit=1)
+    return rows[0] if rows else None
+
+
+def expired(compass, fn):
+    """每次调用前让索引的refresh_interval节流失效（重复调用否则都落在节流窗口内，测不到刷新开销）"""
+    def call():
+        compass.index.expire()
+        return fn()
+    return call
+
+
+def method_cases(compass):
+    busiest = _busiest_date(compass)
+    card = _card_sample(compass, busiest)
+    card_path = card["path"] if card else "missing.md"
+    return [
+        Case("index", "index.refresh (warm, forced)", lambda: compass.index.refresh(force=True)),
+        Case("index", "index.refresh (warm, throttle expired)", lambda: expired(compass, compass.index.refresh)()),
+        Case("methods", "get_latest_course", compass.get_latest_course),
+        Case("methods", "get_latest_courses(3)", lambda: compass.get_latest_courses(3)),
+        Case("methods", "get_latest_course_doc", compass.get_latest_course_doc),
+        Case("methods", "get_digest", compass.get_digest),
+        Case("methods", "get_context_info", compass.get_context_info),
+        Case("methods", "get_status", compass.get_status),
+        Case("methods", "show_status", compass.show_status),
+        Case("methods", "get_today_cards", compass.get_today_cards),
+        Case("methods", "get_analysis_templates", compass.get_analysis_templates),
+        Case("methods", "search('英伟达')", lambda: compass.search("英伟达")),
+        Case("methods", "search('GPU', tag=ai)", lambda: compass.search("GPU", tags=["ai"])),
+        Case("methods", "generate_map(busiest day, dry run)", lambda: compass.generate_map(busiest, write=False)),
+        Case("methods", "similarity.related(card, k=10)", lambda: compass.similarity.related(card_path)),
+        Case("methods", "similarity.similar(text, k=5)",
+             lambda: compass.similarity.similar("英伟达 GPU 数据中心 inference cost", k=5)),
+        Case("methods", "build_context(budget=6000)", compass.build_context),
+        Case("methods", "build_context(budget=6000, no cache)", lambda: compass.build_context(use_cache=False)),
+        Case("methods", "rollups('month')", lambda: compass.rollups("month")),
+    ]
+
+
+def endpoint_cases(client, compass):
+    busiest = _busiest_date(compass)
+    today = compass.today
+    harbor = _harbor_sample(compass)
+    category, filename = (harbor["category"], Path(harbor["path"]).name) if harbor else ("concepts", "missing.md")
+    card = _card_sample(compass, busiest)
+    card_name = card["name"] if card else "missing.md"
+
+    def get(path, **params):
+        def fn():
+            response = client.get(path, params=params)
+            response.raise_for_status()
+            return _io_from_header(response)
+        return fn
+
+    def revalidate(path):
+        """带If-None-Match的条件请求（期望304）"""
+        etag = client.get(path).headers.get("etag")
+
+        def fn():
+            response = client.get(path, headers={"If-None-Match": etag} if etag else {})
+            if response.status_code not in (200, 304):
+                response.raise_for_status()
+            return _io_from_header(response)
+        return fn
+
+    def send(method, path, **kwargs):
+        def fn():
+            response = client.request(method, path, **kwargs)
+            response.raise_for_status()
+            return _io_from_header(response)
+        return fn
+
+    counter = iter(range(10 ** 9))
+
+    def fleeting():
+        n = next(counter)
+        return send("POST", "/api/cards/fleeting", json={
+            "title": f"bench fleeting {n}", "content": "基准测试卡片 benchmark card", "tags": ["bench"],
+        })()
+
+    batch_body = "\n".join(
+        json.dumps({"title": f"bench batch {i}", "content": f"批量导入 {i}", "type": "fleeting", "tags": ["bench"]},
+                   ensure_ascii=False)
+        for i in range(100)
+    ).encode("utf-8")
+
+    def patch_today():
+        etag = client.get("/api/today").json().get("course_etag")
+        headers = {"If-Match": etag} if etag else {}
+        return send("PATCH", "/api/today", json={"field": "focus", "value": "- 英伟达 / Nvidia\n- HBM"},
+                    headers=headers)()
+
+    R = lambda method, path: (method, path)  # noqa: E731
+    return [
+        Case("endpoints", "GET /api/metrics", get("/api/metrics"), R("GET", "/api/metrics")),
+        Case("endpoints", "GET /api/config/user", get("/api/config/user"), R("GET", "/api/config/user")),
+        Case("endpoints", "GET /api/status", get("/api/status"), R("GET", "/api/status")),
+        Case("endpoints", "GET /api/today", get("/api/today"), R("GET", "/api/today")),
+        Case("endpoints", "GET /api/cards/dates", get("/api/cards/dates"), R("GET", "/api/cards/dates")),
+        Case("endpoints", "GET /api/cards/dates (304)", revalidate("/api/cards/dates"), R("GET", "/api/cards/dates")),
+        Case("endpoints", "GET /api/cards/dates (throttle expired)", expired(compass, get("/api/cards/dates")),
+             R("GET", "/api/cards/dates")),
+        Case("endpoints", "GET /api/cards/dates (304, throttle expired)",
+             expired(compass, revalidate("/api/cards/dates")), R("GET", "/api/cards/dates")),
+        Case("endpoints", "GET /api/cards/dates?counts (this year)",
+             get("/api/cards/dates", counts="true", year=int(today[:4])), R("GET", "/api/cards/dates")),
+        Case("endpoints", "GET /api/cards (today)", get("/api/cards"), R("GET", "/api/cards")),
+        Case("endpoints", "GET /api/cards?date=<busiest day>", get("/api/cards", date=busiest), R("GET", "/api/cards")),
+        Case("endpoints", "GET /api/cards?date=<busiest day> (throttle expired)",
+             expired(compass, get("/api/cards", date=busiest)), R("GET", "/api/cards")),
+        Case("endpoints", "GET /api/cards/{date}/{filename}/related", get(f"/api/cards/{busiest}/{card_name}/related"),
+             R("GET", "/api/cards/{date}/{filename}/related")),
+        Case("endpoints", "GET /api/charts?limit=30", get("/api/charts", limit=30), R("GET", "/api/charts")),
+        Case("endpoints", "GET /api/charts?fields=date,filename", get("/api/charts", fields="date,filename"),
+             R("GET", "/api/charts")),
+        Case("endpoints", "GET /api/charts/<today>", get(f"/api/charts/{today}"), R("GET", "/api/charts/{date}")),
+        Case("endpoints", "GET /api/charts/<today>?raw", get(f"/api/charts/{today}", raw="true"),
+             R("GET", "/api/charts/{date}")),
+        Case("endpoints", "GET /api/courses?limit=30", get("/api/courses", limit=30), R("GET", "/api/courses")),
+        Case("endpoints", "GET /api/courses", get("/api/courses"), R("GET", "/api/courses")),
+        Case("endpoints", "GET /api/courses/<today>", get(f"/api/courses/{today}"), R("GET", "/api/courses/{date}")),
+        Case("endpoints", "GET /api/search?q=英伟达", get("/api/search", q="英伟达"), R("GET", "/api/search")),
+        Case("endpoints", "GET /api/search?q=GPU&kind=card&tags=ai",
+             get("/api/search", q="GPU", kind="card", tags="ai"), R("GET", "/api/search")),
+        Case("endpoints", "GET /api/harbor", get("/api/harbor"), R("GET", "/api/harbor")),
+        Case("endpoints", "GET /api/harbor (304)", revalidate("/api/harbor"), R("GET", "/api/harbor")),
+        Case("endpoints", "GET /api/harbor (throttle expired)", expired(compass, get("/api/harbor")),
+             R("GET", "/api/harbor")),
+        Case("endpoints", "GET /api/harbor/{category}/{filename}", get(f"/api/harbor/{category}/{filename}"),
+             R("GET", "/api/harbor/{category}/{filename}")),
+        Case("endpoints", "GET /api/templates", get("/api/templates"), R("GET", "/api/templates")),
+        Case("endpoints", "GET /api/map?date=<busiest day>", get("/api/map", date=busiest), R("GET", "/api/map")),
+        Case("endpoints", "POST /api/map/generate (dry run)",
+             send("POST", "/api/map/generate", json={"date": busiest, "dry_run": True}),
+             R("POST", "/api/map/generate")),
+        Case("endpoints", "GET /api/context", get("/api/context"), R("GET", "/api/context")),
+        Case("endpoints", "GET /api/rollups?kind=week&limit=4", get("/api/rollups", kind="week", limit=4),
+             R("GET", "/api/rollups")),
+        Case("endpoints", "GET /api/rollups (304)", revalidate("/api/rollups"), R("GET", "/api/rollups")),
+        Case("endpoints", "GET /api/rollups/{kind}/{period}", get(f"/api/rollups/month/{busiest[:7]}"),
+             R("GET", "/api/rollups/{kind}/{period}")),
+        # 写入类用例放在最后
+        Case("writes", "POST /api/navigation/generate", send("POST", "/api/navigation/generate"),
+             R("POST", "/api/navigation/generate")),
+        Case("writes", "POST /api/cards/fleeting", fleeting, R("POST", "/api/cards/fleeting")),
+        Case("writes", "POST /api/cards/batch (100 lines)",
+             send("POST", "/api/cards/batch", content=batch_body), R("POST", "/api/cards/batch")),
+        Case("writes", "PATCH /api/today", patch_today, R("PATCH", "/api/today")),
+    ]
+
+
+def uncovered_routes(app, cases):
+    """server/main.py中没有用例（也不在SKIPPED_ROUTES中）的路由"""
+    from fastapi.routing import APIRoute
+
+    covered = {case.route for case in cases if case.route}
+    missing = []
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        for method in sorted(route.methods - {"HEAD"}):
+            key = (method, route.path)
+            if key not in covered and key not in SKIPPED_ROUTES:
+                missing.append(f"{method} {route.path}")
+    return missing
+
+
+# ---------------------------------------------------------------------------
+# 基线对比
+# ---------------------------------------------------------------------------
+
+def compare(results, baseline, tolerance):
+    """返回回归列表 [(用例, 说明)]"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None or current.get("runs", 1) == 1:
+            continue
+        p50, base_p50 = current["p50_ms"], base["p50_ms"]
+        if p50 > base_p50 * (1 + tolerance) and p50 - base_p50 > MIN_LATENCY_DELTA_MS:
+            regressions.append((name, f"p50 {base_p50:.2f}ms -> {p50:.2f}ms"))
+        peak, base_peak = current.get("peak_kb"), base.get("peak_kb")
+        if peak and base_peak and peak > base_peak * (1 + tolerance) and peak - base_peak > MIN_MEMORY_DELTA_KB:
+            regressions.append((name, f"peak {base_peak:.0f}KB -> {peak:.0f}KB"))
+        for field in ("reads", "stats", "globs", "opens"):
+            if current[field] > base.get(field, 0) * (1 + tolerance) + 1:
+                regressions.append((name, f"{field} {base.get(field, 0)} -> {current[field]}"))
+    return regressions
+
+
+def print_table(results, baseline):
+    header = f"{'case':<48} {'p50 ms':>9} {'p99 ms':>9} {'base p50':>9} {'peak KB':>9} " \
+             f"{'reads':>7} {'KB read':>8} {'stats':>7} {'globs':>6} {'opens':>6}"
+    print(header)
+    print("-" * len(header))
+    group = None
+    for name, r in results.items():
+        if r["group"] != group:
+            group = r["group"]
+            print(f"[{group}]")
+        base = baseline.get(name, {}).get("p50_ms")
+        base_text = f"{base:9.2f}" if base is not None else f"{'-':>9}"
+        peak = f"{r['peak_kb']:9.0f}" if r["peak_kb"] is not None else f"{'-':>9}"
+        print(f"{name[:48]:<48} {r['p50_ms']:9.2f} {r['p99_ms']:9.2f} {base_text} {peak} "
+              f"{r['reads']:7} {r['bytes'] / 1024:8.1f} {r['stats']:7} {r['globs']:6} {r['opens']:6}")
+
+
+# ---------------------------------------------------------------------------
+# 入口
+# ---------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compass基准测试")
+    parser.add_argument("--dir", default=None, help="合成vault所在目录（默认 /tmp/compass-bench-<size>）")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small", help="合成vault规模（默认small）")
+    parser.add_argument("--reuse", action="store_true",
+                        help="复用已有的合成vault（写入类用例会改动vault，对比基线时不要使用）")
+    parser.add_argument("--repeat", type=int, default=20, help="每个用例的计时次数（默认20）")
+    parser.add_argument("--warmup", type=int, default=2, help="每个用例的预热次数（默认2）")
+    parser.add_argument("--filter", default=None, help="只运行名称包含该字符串的用例")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="基线文件（默认benchmarks/baseline.json）")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果写入基线文件")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的相对退化（默认0.25）")
+    parser.add_argument("--output", default=None, help="把本次结果另存为JSON")
+    args = parser.parse_args(argv)
+
+    target = Path(args.dir or f"/tmp/compass-bench-{args.size}")
+    years, cards, harbor = SIZES[args.size]
+    if not args.reuse or not (target / "config.json").exists():
+        print(f"生成合成vault: {target} (years={years}, cards={cards}, harbor={harbor})")
+        stats = synth_vault.generate(target, years, cards, harbor, force=True)
+        print(f"  完成，用时 {stats['seconds']}s")
+
+    # 索引和会话状态保存在config.json旁边，不影响项目自己的文件
+    os.environ["COMPASS_CONFIG"] = str(target / "config.json")
+    for leftover in target.glob(".vault_index.sqlite*"):
+        leftover.unlink()
+    sys.addaudithook(_audit)
+
+    from compass import CompassAssistant
+    sys.path.insert(0, str(ROOT / "server"))
+    from fastapi.testclient import TestClient
+    import main as server
+
+    results = {}
+
+    def record(case):
+        if args.filter and args.filter not in case.name:
+            return
+        results[case.name] = run_case(case, args.repeat, args.warmup)
+        r = results[case.name]
+        print(f"  {case.name:<48} p50={r['p50_ms']:.2f}ms p99={r['p99_ms']:.2f}ms", flush=True)
+
+    compass = CompassAssistant()
+    record(Case("index", "index.refresh (cold build)", lambda: compass.index.refresh(), once=True))
+    for case in method_cases(compass):
+        record(case)
+
+    with TestClient(server.app) as client:
+        cases = endpoint_cases(client, server.get_compass())
+        for case in cases:
+            record(case)
+        missing = uncovered_routes(server.app, cases)
+
+    baseline_path = Path(args.baseline)
+    baseline = {}
+    if baseline_path.exists():
+        saved = json.loads(baseline_path.read_text(encoding="utf-8"))
+        if saved.get("meta", {}).get("size") == args.size:
+            baseline = saved["results"]
+        else:
+            print(f"\n基线规模为 {saved.get('meta', {}).get('size')}，与本次 {args.size} 不同，跳过对比")
+
+    print()
+    print_table(results, baseline)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    print(f"\n进程最大RSS: {usage.ru_maxrss / 1024:.0f} MB")
+    if missing:
+        print("未覆盖的端点: " + ", ".join(missing))
+
+    report = {
+        "meta": {
+            "size": args.size,
+            "years": years, "cards": cards, "harbor": harbor,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"基线已保存: {baseline_path}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n发现 {len(regressions)} 项退化（容差 {args.tolerance:.0%}）:")
+        for name, detail in regressions:
+            print(f"  {name}: {detail}")
+        return 1
+    if baseline:
+        print("\n与基线相比没有退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
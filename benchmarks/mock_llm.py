@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+OpenAI-compatible stand-in server for running API mode offline
+
+Answers POST /v1/chat/completions (and /chat/completions) with a
+deterministic reply built from the prompt: one "## News Update" and one
+"## Analysis Update" section listing the Focus lines it finds (or the
+first line of the prompt, for single-topic prompts). Latency,
+jitter and failures can be injected to exercise llm.py's pooling, fan-out
+and retry:
+- --latency / --jitter: seconds to wait before answering
+- --fail-rate: share of requests answered with 503 and Retry-After
+
+GET /stats returns the request counters. Point Compass at it with
+
+    "api": {"enabled": true, "provider": "custom",
+            "base_url": "http://127.0.0.1:8765/v1", "model": "mock"}
+
+Usage:
+    python benchmarks/mock_llm.py --port 8765 --latency 0.5
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_FOCUS_RE = re.compile(r"^## Focus\n(.*?)(?:\n## |\Z)", re.S | re.M)
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def reply_for(prompt):
+    """根据提示词生成确定性的回复"""
+    match = _FOCUS_RE.search(prompt)
+    if match:
+        lines = [l.strip().lstrip("-* ").strip() for l in match.group(1).splitlines()]
+        topics = [l for l in lines if l][:10]
+    else:
+        # 单个话题的提示词：取第一行
+        topics = [prompt.strip().split("\n", 1)[0]]
+    news = "\n".join(f"- {t}: mock news item" for t in topics)
+    analysis = "\n".join(f"- {t}: mock analysis" for t in topics)
+    return f"## News Update\n{news}\n\n## Analysis Update\n{analysis}\n"
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, fail_rate=0.0, seed=0):
+        super().__init__(address, Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "failed": 0, "in_flight": 0, "max_in_flight": 0, "connections": 0}
+
+    def count(self, name, delta=1):
+        with self.lock:
+            self.counters[name] += delta
+            if name == "in_flight":
+                self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self.counters["in_flight"])
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.server.lock:
+                self._send_json(200, dict(self.server.counters))
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        try:
+            request = json.loads(raw)
+            messages = request["messages"]
+        except (ValueError, KeyError):
+            self._send_json(400, {"error": {"message": "invalid request"}})
+            return
+
+        server = self.server
+        server.count("requests")
+        server.count("in_flight")
+        try:
+            with server.lock:
+                delay = server.latency + server.random.uniform(0, server.jitter)
+                fail = server.random.random() < server.fail_rate
+            time.sleep(delay)
+            if fail:
+                server.count("failed")
+                self._send_json(503, {"error": {"message": "overloaded"}}, {"Retry-After": "0.05"})
+                return
+            prompt = "\n".join(m.get("content", "") for m in messages if m.get("role") == "user")
+            text = reply_for(prompt)
+            self._send_json(200, {
+                "id": f"mock-{int(time.time() * 1000)}",
+                "object": "chat.completion",
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": sum(estimate_tokens(m.get("content", "")) for m in messages),
+                    "completion_tokens": estimate_tokens(text),
+                },
+            })
+        finally:
+            server.count("in_flight", -1)
+
+
+def serve(host="127.0.0.1", port=8765, **options):
+    """启动服务器（后台线程），返回MockServer；port=0时使用随机端口（server.server_address）"""
+    server = MockServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI兼容的本地模拟模型服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="额外的随机延迟上限（秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回503的请求比例（0-1）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args(argv)
+
+    server = MockServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                        fail_rate=args.fail_rate, seed=args.seed)
+    print(f"mock LLM server: http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Synthetic vault generator for the benchmark suite
+
+Builds a Compass vault of configurable size with the same layout and file
+formats CompassAssistant writes: daily courses and soundings, insight and
+fleeting cards (tags and [[links]] included), and harbor documents, with mixed
+Chinese/English markdown. Output is deterministic for a given seed and end
+date, so benchmark runs on different machines measure the same data.
+
+Usage:
+    python benchmarks/synth_vault.py /tmp/compass-bench --years 5 --cards 50000 --harbor 5000
+
+The target directory receives vault/ and a config.json pointing at it. Run
+the CLI or server against it with COMPASS_CONFIG=<dir>/config.json; the
+index and session state are then kept next to that config, away from the
+project's own.
+"""
+
+import argparse
+import json
+import random
+import shutil
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from vault_index import HARBOR_CATEGORIES  # noqa: E402
+
+# 主题词（中英混合，保证检索、图谱和相似度计算有足够的共现）
+TOPICS = [
+    ("英伟达", "Nvidia"), ("GPU", "GPU"), ("大模型", "LLM"), ("智能体", "agents"),
+    ("半导体", "semiconductor"), ("台积电", "TSMC"), ("数据中心", "data center"),
+    ("推理成本", "inference cost"), ("开源模型", "open-source models"), ("机器人", "robotics"),
+    ("电动车", "EV"), ("储能", "energy storage"), ("利率", "interest rates"), ("美联储", "Fed"),
+    ("估值", "valuation"), ("现金流", "cash flow"), ("供应链", "supply chain"), ("出口管制", "export controls"),
+    ("云计算", "cloud"), ("网络安全", "cybersecurity"), ("生物科技", "biotech"), ("量子计算", "quantum"),
+    ("消费电子", "consumer electronics"), ("广告市场", "ad market"), ("搜索", "search"),
+    ("编程助手", "coding assistants"), ("芯片设计", "chip design"), ("光模块", "optical modules"),
+    ("HBM", "HBM"), ("先进封装", "advanced packaging"),
+]
+
+TAGS = [
+    "ai", "chips", "llm", "agents", "macro", "investing", "cloud", "energy", "robotics",
+    "security", "biotech", "valuation", "supply-chain", "policy", "research", "reading",
+]
+
+CN_SENTENCES = [
+    "{a}的需求在过去两个季度持续超出预期，主要驱动力来自{b}。",
+    "从产业链角度看，{a}的瓶颈正在从产能转向{b}。",
+    "如果{a}的价格继续下降，{b}的商业模式需要重新评估。",
+    "市场对{a}的讨论集中在短期波动，而忽略了{b}的长期结构性变化。",
+    "今天重新梳理了{a}和{b}之间的关系，结论是两者的相关性被高估了。",
+    "关于{a}，值得跟踪的指标包括出货量、毛利率和客户集中度。",
+    "{a}领域的竞争格局仍在变化，{b}可能成为新的分水岭。",
+    "一个反直觉的观察：{a}的增长并没有带动{b}的同步增长。",
+]
+
+EN_SENTENCES = [
+    "Demand for {a} keeps outrunning supply, and {b} is the main reason.",
+    "The bottleneck for {a} is shifting from capacity to {b}.",
+    "If {a} keeps getting cheaper, the economics of {b} need another look.",
+    "Most coverage of {a} focuses on the quarter, not on how {b} changes the long-term picture.",
+    "Key metrics to watch for {a}: shipments, gross margin and customer concentration.",
+    "Competition in {a} is still fluid; {b} could become the dividing line.",
+    "Counter-intuitive: growth in {a} has not pulled {b} along with it.",
+]
+
+
+def _sentence(rng):
+    (a_cn, a_en), (b_cn, b_en) = rng.sample(TOPICS, 2)
+    if rng.random() < 0.6:
+        return rng.choice(CN_SENTENCES).format(a=a_cn, b=b_cn)
+    return rng.choice(EN_SENTENCES).format(a=a_en, b=b_en)
+
+
+def _paragraph(rng, sentences):
+    return "".join(_sentence(rng) + ("" if i % 3 else " ") for i in range(sentences)).strip()
+
+
+def _bullets(rng, n):
+    return "\n".join(f"- {_sentence(rng)}" for _ in range(n))
+
+
+def _focus(rng):
+    picked = rng.sample(TOPICS, 3)
+    return "\n".join(f"- {cn} / {en}" for cn, en in picked)
+
+
+def _course(rng, date):
+    return f"""## Goal
+Build a long-term view on AI infrastructure and the companies around it
+
+## Focus
+{_focus(rng)}
+
+## Note
+{_paragraph(rng, rng.randint(1, 4))}
+
+## Reference
+- harbor/companies/{rng.choice(TOPICS)[1].replace(' ', '-').lower()}.md
+
+---
+## Today's Summary
+{_paragraph(rng, rng.randint(6, 14))}
+
+## What's Next
+{_bullets(rng, rng.randint(1, 2))}
+"""
+
+
+def _sounding(rng, date):
+    return f"""## Focus
+{_focus(rng)}
+
+## News Update
+{_bullets(rng, rng.randint(4, 10))}
+
+## Analysis Update
+{_paragraph(rng, rng.randint(4, 12))}
+"""
+
+
+def _card(rng, title, date, card_type, links):
+    tags = " ".join(f"#{t}" for t in rng.sample(TAGS, rng.randint(1, 4)))
+    related = "\n".join(f"- [[{link}]]" for link in links) or "-"
+    return f"""# {title}
+
+## 时间
+{date} {rng.randint(8, 23):02d}:{rng.randint(0, 59):02d}
+
+## 类型
+{card_type}
+
+## 内容
+{_paragraph(rng, rng.randint(2, 9))}
+
+## 标签
+{tags}
+
+## 相关链接
+{related}
+
+## 来源
+通过Compass助手生成
+"""
+
+
+def _harbor_doc(rng, title):
+    sections = []
+    for i in range(rng.randint(2, 12)):
+        sections.append(f"## {i + 1}. {rng.choice(TOPICS)[rng.randint(0, 1)]}\n\n{_paragraph(rng, rng.randint(3, 20))}")
+    return f"# {title}\n\n" + "\n\n".join(sections) + "\n"
+
+
+def _write(path, content):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def generate(target, years=5, cards=50000, harbor=5000, seed=42, end_date=None, force=False):
+    """
+    在target下生成vault/和config.json，返回各类文件数量
+
+    - years: 每天一份course和sounding，覆盖截至end_date（含当天）的years*365天
+    - cards: 卡片总数（约30% insights，其余fleeting），随机分布在这些日期上
+    - harbor: harbor文档总数，平均分布在各分类中
+    """
+    started = time.perf_counter()
+    target = Path(target).resolve()
+    vault = target / "vault"
+    if vault.exists():
+        if not force:
+            raise FileExistsError(f"{vault} 已存在（使用 --force 重新生成）")
+        shutil.rmtree(vault)
+
+    rng = random.Random(seed)
+    end = datetime.strptime(end_date, "%Y-%m-%d") if end_date else datetime.now()
+    days = [(end - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(years * 365 - 1, -1, -1)]
+
+    folders = ["charts", "logbook", "navigation", "template"] + [f"harbor/{c}" for c in HARBOR_CATEGORIES]
+    for folder in folders:
+        (vault / folder).mkdir(parents=True, exist_ok=True)
+
+    for day in days:
+        _write(vault / "navigation" / f"{day}_course.md", _course(rng, day))
+        _write(vault / "charts" / f"{day}_sounding.md", _sounding(rng, day))
+
+    # 卡片：标题在同一天内唯一，链接指向之前已生成的卡片标题
+    titles = []
+    made_dirs = set()
+    for n in range(cards):
+        day = rng.choice(days)
+        card_type = "insight" if rng.random() < 0.3 else "fleeting"
+        cn, en = rng.choice(TOPICS)
+        title = f"{cn} {en} {n}"
+        links = rng.sample(titles, min(len(titles), rng.randint(0, 3))) if titles else []
+        directory = vault / "logbook" / day / ("insights" if card_type == "insight" else "fleeting")
+        if directory not in made_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            made_dirs.add(directory)
+        _write(directory / f"{title}_{day}.md", _card(rng, title, day, card_type, links))
+        titles.append(title)
+        if len(titles) > 2000:
+            titles = titles[-1000:]
+
+    for n in range(harbor):
+        category = HARBOR_CATEGORIES[n % len(HARBOR_CATEGORIES)]
+        cn, en = rng.choice(TOPICS)
+        title = f"{en} {cn} {n}"
+        _write(vault / "harbor" / category / f"{title.replace(' ', '-').lower()}.md", _harbor_doc(rng, title))
+
+    config = json.loads((ROOT / "config.example.json").read_text(encoding="utf-8"))
+    config["obsidian_path"] = str(vault)
+    config["user"] = {"name": "Benchmark"}
+    _write(target / "config.json", json.dumps(config, ensure_ascii=False, indent=2))
+
+    return {
+        "vault": str(vault),
+        "config": str(target / "config.json"),
+        "days": len(days),
+        "courses": len(days),
+        "soundings": len(days),
+        "cards": cards,
+        "harbor": harbor,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成用于基准测试的合成vault")
+    parser.add_argument("target", help="输出目录（生成 vault/ 和 config.json）")
+    parser.add_argument("--years", type=int, default=5, help="每日course/sounding覆盖的年数（默认5）")
+    parser.add_argument("--cards", type=int, default=50000, help="卡片数量（默认50000）")
+    parser.add_argument("--harbor", type=int, default=5000, help="harbor文档数量（默认5000）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end-date", help="最后一天（默认今天），YYYY-MM-DD")
+    parser.add_argument("--force", action="store_true", help="覆盖已存在的vault")
+    args = parser.parse_args(argv)
+
+    stats = generate(args.target, args.years, args.cards, args.harbor, args.seed, args.end_date, args.force)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Bulk card import - JSON Lines in, per-item results out
+
+Used by POST /api/cards/batch and `python compass.py --import`. Each line is
+one JSON object:
+
+    {"title": "...", "content": "...", "type": "fleeting", "tags": ["ai"], "date": "2026-10-17"}
+
+- title, content: required strings
+- type: "fleeting" (default, imports are unprocessed material) or "insight"
+- tags: optional list of strings (a leading # is stripped)
+- date: optional YYYY-MM-DD, the logbook day to file the card under (default today)
+
+Bad lines never abort the import: parse_jsonl() and validate_item() turn them
+into per-line errors, and CompassAssistant.import_cards() writes the rest.
+"""
+
+import json
+from datetime import datetime
+
+IMPORT_TYPES = {"insight": "insight", "insights": "insight", "fleeting": "fleeting"}
+DEFAULT_IMPORT_TYPE = "fleeting"
+MAX_TITLE_CHARS = 200
+
+
+def parse_jsonl(lines):
+    """
+    逐行解析JSON Lines（空行跳过）
+    返回 [(行号, 对象)]，解析失败的行对象为ValueError
+    """
+    parsed = []
+    for lineno, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            parsed.append((lineno, json.loads(line)))
+        except ValueError as e:
+            parsed.append((lineno, ValueError(f"invalid JSON: {e}")))
+    return parsed
+
+
+def validate_item(obj):
+    """
+    校验并规范化一条导入记录
+    返回 {'title', 'content', 'type', 'tags', 'date'}，不合法时抛出ValueError
+    """
+    if isinstance(obj, ValueError):
+        raise obj
+    if not isinstance(obj, dict):
+        raise ValueError("expected a JSON object")
+
+    title = obj.get("title")
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError("title is required")
+    title = title.strip()
+    if len(title) > MAX_TITLE_CHARS:
+        raise ValueError(f"title is longer than {MAX_TITLE_CHARS} characters")
+    if not any(c.isalnum() for c in title):
+        raise ValueError("title must contain letters or digits")
+
+    content = obj.get("content")
+    if not isinstance(content, str):
+        raise ValueError("content is required")
+
+    card_type = IMPORT_TYPES.get(obj.get("type") or DEFAULT_IMPORT_TYPE)
+    if card_type is None:
+        raise ValueError("type must be 'insight' or 'fleeting'")
+
+    tags = obj.get("tags") or []
+    if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+        raise ValueError("tags must be a list of strings")
+    tags = [t.strip().lstrip("#") for t in tags if t.strip().lstrip("#")]
+
+    date = obj.get("date")
+    if date is not None:
+        try:
+            if not isinstance(date, str) or datetime.strptime(date, "%Y-%m-%d").strftime("%Y-%m-%d") != date:
+                raise ValueError
+        except ValueError:
+            raise ValueError("date must be YYYY-MM-DD")
+
+    return {"title": title, "content": content, "type": card_type, "tags": tags, "date": date}
@@ -12,9 +12,37 @@ Knowledge Compass - 你的日常知识管理助手
 import os
 import sys
 import json
+import argparse
+import asyncio
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from vault_index import VaultIndex, HARBOR_CATEGORIES, CARD_TYPES
+from course_doc import CourseDocument, load_course
+import search
+from vault_io import atomic_write, file_lock, fsync_dir
+import card_import
+import knowledge_map
+import context_pack
+import llm
+import sounding_pipeline
+from rollups import RollupEngine, PERIOD_KINDS
+from similarity import SimilarityIndex, PREFILL_LINKS
+from digest import DailyDigest
+import instrumentation
+import quick_status
+import content_cache
+
+
+def _date_arg(value):
+    """argparse的日期参数类型：必须是YYYY-MM-DD"""
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的日期: {value}（格式为YYYY-MM-DD）")
+    return value
+
 
 class CompassAssistant:
     """
@@ -40,6 +68,7 @@ class CompassAssistant:
        - 不需要包含所有卡片，只选择与Focus最相关的
        - 节点数控制在5-10个左右
        - 突出核心主题和关键连接
+       - generate_map()按以上原则自动生成（见knowledge_map.py）
 
     3. 内容筛选逻辑：
        - 优先级：insights > fleeting
@@ -64,24 +93,49 @@ class CompassAssistant:
        - 创建sounding时优先参考template/sounding-template.md
        - @analysis深度报告优先参考harbor/frameworks中的分析模板
        - 执行@analysis前应主动列出可用模板并询问用户选择
+
+    7. API模式（config.api.enabled）：
+       - @navigation生成草稿后调用fill_sounding()，按Focus中的话题并发由模型填写News Update和Analysis Update
+       - 模型调用、缓存和重试见llm.py
     """
 
-    def __init__(self, config_path=None):
-        """初始化助手"""
+    def __init__(self, config_path=None, bootstrap=True):
+        """
+        初始化助手
+
+        参数:
+        - config_path: 配置文件路径，默认为环境变量COMPASS_CONFIG，其次为项目目录下的config.json
+        - bootstrap: 是否创建文件夹结构和初始模板（长驻进程只需在启动时执行一次）
+        """
         # 加载配置文件
         if config_path is None:
-            config_path = Path(__file__).parent / "config.json"
-        else:
-            config_path = Path(config_path)
+            config_path = os.environ.get("COMPASS_CONFIG") or Path(__file__).parent / "config.json"
+        self.config_path = Path(config_path)
+        self.load_config()
+
+        # 会话状态（与config.json放在同一目录）
+        self.state_file = self.config_path.parent / ".state.json"
+        self.state = self.load_state()
+
+        # vault元数据索引（SQLite，与config.json放在同一目录，首次使用时打开）
+        self.index_file = self.config_path.parent / ".vault_index.sqlite"
 
-        if not config_path.exists():
+        # 确保所有必要的文件夹存在
+        if bootstrap:
+            self._ensure_folders_exist()
+
+    def load_config(self):
+        """读取config.json并设置路径和API配置"""
+        if not self.config_path.exists():
             raise FileNotFoundError(
-                f"配置文件未找到: {config_path}\n"
+                f"配置文件未找到: {self.config_path}\n"
                 f"请复制 config.example.json 为 config.json 并填写你的配置"
             )
 
-        with open(config_path, 'r', encoding='utf-8') as f:
+        config_mtime = self.config_path.stat().st_mtime_ns
+        with open(self.config_path, 'r', encoding='utf-8') as f:
             self.config = json.load(f)
+        self.config_mtime = config_mtime
 
         # 设置路径
         self.obsidian_path = Path(self.config['obsidian_path'])
@@ -91,20 +145,67 @@ class CompassAssistant:
         self.navigation = self.obsidian_path / self.config['folders']['navigation']
         self.template = self.obsidian_path / self.config['folders']['template']
 
-        # 日期
-        self.today = datetime.now().strftime("%Y-%m-%d")
-        self.yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-
-        # 会话状态（保存在项目目录）
-        self.state_file = Path(__file__).parent / ".state.json"
-        self.state = self.load_state()
+        # vault或目录配置可能已变化，索引和模型客户端在下次使用时重新创建
+        # 旧对象不主动close：长驻进程中其他请求可能仍在使用，不再被引用时自然释放（SQLite连接和HTTP连接随之关闭）
+        self._index = None
+        self._similarity = None
+        self._llm = None
 
         # API配置（可选）
         self.api_config = self.config.get('api', {})
         self.use_api = self.api_config.get('enabled', False)
 
-        # 确保所有必要的文件夹存在
-        self._ensure_folders_exist()
+    def reload_config_if_changed(self):
+        """
+        config.json的mtime变化时重新加载配置（供长驻进程使用）
+        vault路径变化时会重新创建文件夹结构，返回是否发生了重新加载
+        """
+        if not self.config_path.exists():
+            raise FileNotFoundError(f"配置文件未找到: {self.config_path}")
+        if self.config_path.stat().st_mtime_ns == self.config_mtime:
+            return False
+
+        old_vault = self.obsidian_path
+        self.load_config()
+        if self.obsidian_path != old_vault:
+            self._ensure_folders_exist()
+        return True
+
+    @property
+    def today(self):
+        """今日日期（实时计算，长驻进程跨天后依然正确）"""
+        return datetime.now().strftime("%Y-%m-%d")
+
+    @property
+    def yesterday(self):
+        """昨日日期"""
+        return (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    @property
+    def index(self):
+        """vault元数据索引（VaultIndex）"""
+        if self._index is None:
+            self._index = VaultIndex(
+                self.index_file,
+                self.obsidian_path,
+                self.config['folders'],
+                parse_course=self.parse_course,
+            )
+        return self._index
+
+    @property
+    def similarity(self):
+        """相关文档推荐（SimilarityIndex，首次查询时构建）"""
+        if self._similarity is None:
+            self._similarity = SimilarityIndex(self.index, cache_path=self.config_path.parent / '.similarity_cache')
+        return self._similarity
+
+    @property
+    def llm(self):
+        """模型客户端（LLMClient，响应缓存在config.json同目录的.llm_cache/）"""
+        if self._llm is None:
+            self._llm = llm.LLMClient(self.api_config, cache_dir=self.config_path.parent / '.llm_cache')
+        return self._llm
 
     def load_state(self):
         """加载会话状态"""
@@ -120,8 +221,7 @@ class CompassAssistant:
 
     def save_state(self):
         """保存会话状态"""
-        with open(self.state_file, 'w', encoding='utf-8') as f:
-            json.dump(self.state, f, indent=2, ensure_ascii=False)
+        atomic_write(self.state_file, json.dumps(self.state, indent=2, ensure_ascii=False))
 
     def _ensure_folders_exist(self):
         """确保所有必要的文件夹存在（适配空vault）"""
@@ -136,13 +236,7 @@ class CompassAssistant:
         ]
 
         # 创建harbor子文件夹
-        harbor_subfolders = [
-            self.harbor / 'concepts',
-            self.harbor / 'frameworks',
-            self.harbor / 'companies',
-            self.harbor / 'people',
-            self.harbor / 'skills',
-        ]
+        harbor_subfolders = [self.harbor / cat for cat in HARBOR_CATEGORIES]
 
         folders_to_create.extend(harbor_subfolders)
 
@@ -218,7 +312,7 @@ Generated by Compass
 
         # 创建初始course文档（如果不存在任何course）
         # 使用昨天日期，这样第一次执行@navigation时能正常读取
-        courses = list(self.navigation.glob("*course.md"))
+        courses = self._course_files()
         if not courses:
             initial_course = self.navigation / f"{self.yesterday}_course.md"
             template = self.read_file(course_template)
@@ -229,93 +323,73 @@ Generated by Compass
                 print(f"填写完成后，即可执行 @navigation 开始今日工作\n")
 
     def read_file(self, filepath):
-        """读取文件内容"""
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return f.read()
-        except FileNotFoundError:
-            return None
+        """读取文件内容（经过content_cache，文件未变化时不重复读取），文件不存在时返回None"""
+        return content_cache.read(filepath)
+
+    def _course_files(self):
+        """navigation中所有course文件（倒序，最新的在前）"""
+        instrumentation.record_glob()
+        return sorted(self.navigation.glob("*course.md"), reverse=True)
 
     def write_file(self, filepath, content):
-        """写入文件"""
-        filepath.parent.mkdir(parents=True, exist_ok=True)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
+        """写入文件（加锁 + 原子替换，读者不会看到写了一半的文件）"""
+        atomic_write(filepath, content)
+        self._index_touch(filepath)
+
+    def _index_touch(self, *filepaths):
+        """写入后同步索引（索引尚未打开时无需处理）"""
+        if self._index is not None:
+            self._index.touch(*filepaths)
 
     def get_latest_course(self):
         """获取最新的course文档"""
-        courses = sorted(self.navigation.glob("*course.md"), reverse=True)
+        courses = self._course_files()
         if courses:
             return self.read_file(courses[0])
         return None
 
     def get_latest_course_path(self):
         """获取最新的course文档路径"""
-        courses = sorted(self.navigation.glob("*course.md"), reverse=True)
+        courses = self._course_files()
         if courses:
             return courses[0]
         return None
 
     def get_latest_courses(self, n=3):
         """获取最新的n个course文档"""
-        courses = sorted(self.navigation.glob("*course.md"), reverse=True)
+        courses = self._course_files()
         return courses[:n]
 
+    def get_latest_course_doc(self):
+        """获取最新course文档的解析结果（CourseDocument，按mtime缓存）"""
+        path = self.get_latest_course_path()
+        return load_course(path) if path else None
+
     def parse_course(self, content):
-        """解析course内容"""
-        if not content:
-            return {}
-
-        sections = {
-            'task': '',
-            'focus': '',
-            'note': '',
-            'reference': '',
-            'summary': '',
-            'next': ''
-        }
-        current = None
-        lines = content.split('\n')
-
-        for line in lines:
-            if '## Goal' in line:
-                current = 'task'
-            elif '## Focus' in line:
-                current = 'focus'
-            elif '## Note' in line:
-                current = 'note'
-            elif '## Reference' in line:
-                current = 'reference'
-            elif '## Today' in line and 'Summary' in line:
-                current = 'summary'
-            elif '## What' in line and 'Next' in line:
-                current = 'next'
-            elif line.strip() == '---':
-                current = None
-            elif current and line.strip() and not line.startswith('#'):
-                sections[current] += line + '\n'
-
-        return sections
+        """解析course内容（见course_doc.CourseDocument）"""
+        return CourseDocument.parse(content).to_dict()
+
+    def get_digest(self, date=None):
+        """某天（默认今天）的快照，来源文件未变化时不重新读取（见digest.py）"""
+        return DailyDigest(self).get(date or self.today)
 
     def get_context_info(self):
         """获取当前上下文信息（供Claude使用）"""
-        course = self.get_latest_course()
-        parsed = self.parse_course(course)
-        latest_course_path = self.get_latest_course_path()
+        digest = self.get_digest()
 
         context = {
             'date': self.today,
-            'task': parsed.get('task', '').strip(),
-            'focus': parsed.get('focus', '').strip(),
-            'note': parsed.get('note', '').strip(),
-            'reference': parsed.get('reference', '').strip(),
-            'last_summary': parsed.get('summary', '').strip(),
-            'next_actions': parsed.get('next', '').strip(),
-            'sounding_exists': (self.charts / f"{self.today}_sounding.md").exists(),
-            'course_exists': (self.navigation / f"{self.today}_course.md").exists(),
+            'task': digest['task'],
+            'focus': digest['focus'],
+            'note': digest['note'],
+            'reference': digest['reference'],
+            'last_summary': digest['last_summary'],
+            'next_actions': digest['next_actions'],
+            'sounding_exists': digest['sounding_exists'],
+            'course_exists': digest['course_exists'],
             'logbook_path': str(self.logbook / self.today),
-            'latest_course_date': latest_course_path.stem.replace('_course', '') if latest_course_path else None,
-            'focus_confirmation_needed': not (self.navigation / f"{self.today}_course.md").exists(),
+            'latest_course_date': digest['latest_course_date'],
+            'focus_confirmation_needed': not digest['course_exists'],
             'output_preferences': self.config.get('output_preferences', {
                 'use_emoji': False,
                 'style': 'professional',
@@ -329,8 +403,8 @@ Generated by Compass
     def create_sounding_draft(self, focus_text=None):
         """创建sounding草稿（优先使用template/sounding-template.md格式）"""
         if focus_text is None:
-            course = self.get_latest_course()
-            parsed = self.parse_course(course)
+            doc = self.get_latest_course_doc()
+            parsed = doc.to_dict() if doc else {}
             focus_text = parsed.get('focus', '未找到Focus信息')
 
         # 读取模板文件
@@ -339,10 +413,9 @@ Generated by Compass
 
         if template_content:
             # 使用模板格式，替换Focus部分
-            content = template_content.replace(
-                '[从course文档中自动提取]',
-                focus_text
-            )
+            content = template_content
+            for placeholder in ('[从course文档中自动提取]', '[Auto-extracted from the course document]'):
+                content = content.replace(placeholder, focus_text)
             # 添加生成时间
             content += f"\n\n---\n生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n"
         else:
@@ -363,51 +436,93 @@ Generated by Compass
         self.write_file(filepath, content)
         return str(filepath)
 
-    def create_knowledge_card(self, title, content, card_type='insight', tags=None):
-        """创建知识卡片（优先使用template/card-template.md格式）"""
-        today_log = self.logbook / self.today
-
-        # 确定卡片目录
-        if card_type == 'insight':
-            card_dir = today_log / 'insights'
-        else:
-            card_dir = today_log / 'fleeting'
-
-        card_dir.mkdir(parents=True, exist_ok=True)
-
+    def fill_sounding(self, date=None, concurrency=sounding_pipeline.DEFAULT_CONCURRENCY, timeout=None,
+                      use_cache=True, fetch=None, summarize=None):
+        """
+        按Focus中的话题并发填写sounding的News Update和Analysis Update（规则见sounding_pipeline.py）
+        API模式下由模型撰写，否则列出本地相关笔记；fetch/summarize可替换默认的两个阶段
+        返回 {'path', 'topics': [每个话题的耗时], 'writes', 'took_ms'}；sounding不存在时抛出FileNotFoundError
+        （在事件循环中调用时请直接await SoundingPipeline(...).run()）
+        """
+        pipeline = sounding_pipeline.SoundingPipeline(
+            self, fetch=fetch, summarize=summarize, concurrency=concurrency, timeout=timeout, use_cache=use_cache,
+        )
+        return asyncio.run(pipeline.run(date))
+
+    def card_path(self, title, card_type='insight', date=None):
+        """卡片文件路径：logbook/<日期>/<insights|fleeting>/<标题>_<日期>.md"""
+        date = date or self.today
+        card_dir = self.logbook / date / ('insights' if card_type == 'insight' else 'fleeting')
         # 生成文件名（使用日期格式，不使用时间戳）
         safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
-        filename = f"{safe_title}_{self.today}.md"
-        filepath = card_dir / filename
+        return card_dir / f"{safe_title}_{date}.md"
 
-        # 如果同名文件已存在，追加内容而不是覆盖
-        existing_content = self.read_file(filepath) if filepath.exists() else None
+    @staticmethod
+    def _tags_line(tags):
+        return ' '.join([f"#{tag}" for tag in tags]) if tags else '#待补充'
 
-        tags_str = ' '.join([f"#{tag}" for tag in tags]) if tags else '#待补充'
-
-        if existing_content:
-            # 追加新内容
-            timestamp = datetime.now().strftime("%H:%M")
-            card_content = f"""
+    @staticmethod
+    def _update_block(content, timestamp=None):
+        """追加到已有卡片末尾的更新段落"""
+        timestamp = timestamp or datetime.now().strftime("%H:%M")
+        return f"""
 
 ---
 ## 更新 {timestamp}
 
 {content}
 """
-            with open(filepath, 'a', encoding='utf-8') as f:
-                f.write(card_content)
-        else:
-            # 读取模板文件
-            template_path = self.template / 'card-template.md'
-            template_content = self.read_file(template_path)
 
-            if template_content:
-                # 使用模板格式
-                card_content = f"""# {title}
+    def create_knowledge_card(self, title, content, card_type='insight', tags=None):
+        """创建知识卡片（优先使用template/card-template.md格式）"""
+        filepath = self.card_path(title, card_type)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        tags_str = self._tags_line(tags)
+
+        # 新卡片的正文（含相似度检索）在加锁前生成，锁内只做存在检查和写入
+        card_content = None
+        if not filepath.exists():
+            template_content = self.read_file(self.template / 'card-template.md')
+            related = self.related_links(f"{title}\n{content}")
+            card_content = self._render_card(title, content, card_type, tags_str, template_content, related=related)
+
+        # 存在检查、追加和新建在同一把文件锁内完成，避免并发写入互相覆盖
+        with file_lock(filepath):
+            # 如果同名文件已存在，追加内容而不是覆盖
+            existing_content = self.read_file(filepath) if filepath.exists() else None
+
+            if existing_content:
+                # 追加新内容
+                atomic_write(filepath, existing_content + self._update_block(content))
+                self._index_touch(filepath)
+            else:
+                if card_content is None:
+                    # 加锁前已存在、期间被删除：不再检索相关链接
+                    template_content = self.read_file(self.template / 'card-template.md')
+                    card_content = self._render_card(title, content, card_type, tags_str, template_content)
+                self.write_file(filepath, card_content)
+
+        return str(filepath)
+
+    def related_links(self, text, limit=PREFILL_LINKS):
+        """与text最相似的已有卡片和harbor文件，返回可用于[[链接]]的文件名（不含.md）"""
+        found = self.similarity.similar(text, k=limit)['results']
+        return [Path(r['name']).stem for r in found if r['score'] >= knowledge_map.MIN_SIMILARITY]
+
+    def _render_card(self, title, content, card_type, tags_str, template_content, created=None, related=None):
+        """
+        生成新卡片的正文（有模板时使用模板格式）
+        created为"时间"一栏的内容，related为预先填入"相关链接"的文件名
+        """
+        created = created or datetime.now().strftime("%Y-%m-%d %H:%M")
+        links = "\n".join(f"- [[{name}]]" for name in related or [])
+        links_block = f"\n**相关链接**：\n{links}\n" if links else ""
+        if template_content:
+            # 使用模板格式
+            card_content = f"""# {title}
 
 ## 时间
-{datetime.now().strftime("%Y-%m-%d %H:%M")}
+{created}
 
 ## 类型
 {card_type}
@@ -418,16 +533,16 @@ Generated by Compass
 {content}
 
 **标签**：{tags_str}
-
+{links_block}
 ---
 通过Compass助手生成
 """
-            else:
-                # 模板不存在时使用默认格式
-                card_content = f"""# {title}
+        else:
+            # 模板不存在时使用默认格式
+            card_content = f"""# {title}
 
 ## 时间
-{datetime.now().strftime("%Y-%m-%d %H:%M")}
+{created}
 
 ## 类型
 {card_type}
@@ -439,26 +554,95 @@ Generated by Compass
 {tags_str}
 
 ## 相关链接
--
+{links or "-"}
 
 ## 来源
 通过Compass助手生成
 """
-            self.write_file(filepath, card_content)
+        return card_content
 
-        return str(filepath)
+    def import_cards(self, records):
+        """
+        批量导入卡片（JSON Lines导入、POST /api/cards/batch）
 
-    def get_today_cards(self):
-        """获取今日所有卡片路径"""
-        cards = {'insights': [], 'fleeting': []}
-        today_log = self.logbook / self.today
+        records: card_import.parse_jsonl() 的结果 [(行号, 对象)]
+        - 全部记录先校验，card-template.md只读取一次
+        - 写到同一文件的记录在内存中合并，每个文件只加锁、写入一次
+        - 按日期目录分组，每个目录只创建/fsync一次，索引在一个事务内更新
 
-        if today_log.exists():
-            for card_type in ['insights', 'fleeting']:
-                card_dir = today_log / card_type
-                if card_dir.exists():
-                    cards[card_type] = list(card_dir.glob("*.md"))
+        返回 {'total', 'created', 'appended', 'failed', 'took_ms', 'results'}
+        results按输入顺序，每项为 {'line', 'ok', 'action', 'path'} 或 {'line', 'ok': False, 'error'}
+        """
+        started = time.perf_counter()
+        results = []
+        by_path = {}
+        for lineno, obj in records:
+            try:
+                item = card_import.validate_item(obj)
+            except ValueError as e:
+                results.append({'line': lineno, 'ok': False, 'error': str(e)})
+                continue
+            result = {'line': lineno, 'ok': True}
+            results.append(result)
+            path = self.card_path(item['title'], item['type'], item['date'])
+            by_path.setdefault(path, []).append((item, result))
+
+        template_content = self.read_file(self.template / 'card-template.md')
+        now = datetime.now()
+        timestamp = now.strftime("%H:%M")
+        written = []
+        dirs = set()
+
+        for path in sorted(by_path, key=str):
+            group = by_path[path]
+            try:
+                if path.parent not in dirs:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    dirs.add(path.parent)
+                with file_lock(path):
+                    existing = self.read_file(path)
+                    parts = [existing] if existing else []
+                    for item, result in group:
+                        if parts:
+                            parts.append(self._update_block(item['content'], timestamp))
+                            result['action'] = 'appended'
+                        else:
+                            date = item['date'] or self.today
+                            created = now.strftime("%Y-%m-%d %H:%M") if date == self.today else date
+                            parts.append(self._render_card(
+                                item['title'], item['content'], item['type'],
+                                self._tags_line(item['tags']), template_content, created,
+                            ))
+                            result['action'] = 'created'
+                    atomic_write(path, ''.join(parts), sync_dir=False)
+            except OSError as e:
+                for _, result in group:
+                    result.pop('action', None)
+                    result.update(ok=False, error=str(e))
+                continue
+            written.append(path)
+            for _, result in group:
+                result['path'] = str(path)
+
+        for directory in dirs:
+            fsync_dir(directory)
+        self._index_touch(*written)
+
+        ok = [r for r in results if r['ok']]
+        return {
+            'total': len(results),
+            'created': sum(1 for r in ok if r['action'] == 'created'),
+            'appended': sum(1 for r in ok if r['action'] == 'appended'),
+            'failed': len(results) - len(ok),
+            'took_ms': round((time.perf_counter() - started) * 1000, 2),
+            'results': results,
+        }
 
+    def get_today_cards(self):
+        """获取今日所有卡片路径"""
+        cards = {ct: [] for ct in CARD_TYPES}
+        for entry in self.index.list('card', date=self.today):
+            cards[entry['category']].append(self.obsidian_path / entry['path'])
         return cards
 
     def create_course_summary(self, summary, next_actions, focus_text=None):
@@ -474,8 +658,8 @@ Generated by Compass
         - next_actions: 下一步行动
         - focus_text: 新的focus内容（如果提供，会更新focus部分）
         """
-        course = self.get_latest_course()
-        parsed = self.parse_course(course)
+        doc = self.get_latest_course_doc()
+        parsed = doc.to_dict() if doc else {}
 
         # 读取模板文件
         template_path = self.template / 'course-template.md'
@@ -533,98 +717,260 @@ Generated by Compass
         获取harbor/frameworks中的分析模板列表
         供@analysis命令使用
         """
-        frameworks_dir = self.harbor / 'frameworks'
         templates = []
 
-        if frameworks_dir.exists():
-            # 获取所有markdown文件
-            for template_file in frameworks_dir.glob("*.md"):
-                template_info = {
-                    'name': template_file.stem,
-                    'path': str(template_file),
-                    'full_name': template_file.name
-                }
-                # 尝试读取文件的第一行作为描述
-                content = self.read_file(template_file)
-                if content:
-                    first_line = content.split('\n')[0].strip()
-                    # 如果第一行是标题，去掉#号
-                    if first_line.startswith('#'):
-                        template_info['description'] = first_line.lstrip('#').strip()
-                    else:
-                        template_info['description'] = first_line[:100]  # 前100个字符
-                templates.append(template_info)
+        for entry in self.index.list('harbor', category='frameworks'):
+            template_file = self.obsidian_path / entry['path']
+            template_info = {
+                'name': template_file.stem,
+                'path': str(template_file),
+                'full_name': template_file.name
+            }
+            # 使用文件的第一行作为描述
+            first_line = entry['first_line']
+            if entry['size']:
+                # 如果第一行是标题，去掉#号
+                if first_line.startswith('#'):
+                    template_info['description'] = first_line.lstrip('#').strip()
+                else:
+                    template_info['description'] = first_line[:100]  # 前100个字符
+            templates.append(template_info)
 
         return templates
 
     def get_status(self):
         """获取当前状态"""
+        digest = self.get_digest()
         status = {
             'date': self.today,
-            'sounding_exists': (self.charts / f"{self.today}_sounding.md").exists(),
-            'course_exists': (self.navigation / f"{self.today}_course.md").exists(),
-            'logbook_exists': (self.logbook / self.today).exists(),
+            'sounding_exists': digest['sounding_exists'],
+            'course_exists': digest['course_exists'],
+            'logbook_exists': digest['logbook_exists'],
             'recent_cards': []
         }
 
         # 获取今日已创建的卡片
-        today_log = self.logbook / self.today
-        if today_log.exists():
-            for card_type in ['insights', 'fleeting']:
-                card_dir = today_log / card_type
-                if card_dir.exists():
-                    cards = list(card_dir.glob("*.md"))
-                    status['recent_cards'].extend([c.name for c in cards])
+        for card_type in CARD_TYPES:
+            status['recent_cards'].extend(digest['cards'][card_type])
+
+        # 本进程的内容缓存命中情况（长驻的API服务中才有意义）
+        status['content_cache'] = content_cache.stats()
+        status['similarity'] = self.similarity.stats()
 
         return status
 
-    def show_status(self):
-        """显示当前状态（命令行界面）"""
-        context = self.get_context_info()
+    def search(self, query, kinds=None, tags=None, date_from=None, date_to=None,
+               limit=20, offset=0, highlight=("<mark>", "</mark>")):
+        """
+        全文检索卡片、sounding、course和harbor文件（BM25排序）
+        参数与返回值见search.search()
+        """
+        return search.search(
+            self.index, query, kinds=kinds, tags=tags, date_from=date_from,
+            date_to=date_to, limit=limit, offset=offset, highlight=highlight,
+        )
+
+    def search_command(self, argv):
+        """执行--search命令"""
+        parser = argparse.ArgumentParser(prog='compass.py --search', description='全文检索知识库')
+        parser.add_argument('query', nargs='*', help='查询内容（中英文均可）')
+        parser.add_argument('--kind', action='append', choices=search.SEARCH_KINDS, help='限定类型，可重复')
+        parser.add_argument('--tag', action='append', help='必须包含的标签，可重复')
+        parser.add_argument('--from', dest='date_from', help='开始日期 YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', help='结束日期 YYYY-MM-DD')
+        parser.add_argument('--limit', type=int, default=10, help='返回条数（默认10）')
+        args = parser.parse_args(argv)
+
+        query = ' '.join(args.query)
+        result = self.search(
+            query, kinds=args.kind, tags=args.tag, date_from=args.date_from,
+            date_to=args.date_to, limit=args.limit, highlight=('[', ']'),
+        )
+
+        print(f"\n检索: {query or '(仅标签过滤)'}  共 {result['total']} 条结果  用时 {result['took_ms']} ms\n")
+        for i, item in enumerate(result['results'], 1):
+            label = item['date'] or item['category'] or ''
+            print(f"{i}. [{item['kind']}] {item['title'] or item['name']}  {label}")
+            print(f"   {item['path']}")
+            if item['snippet']:
+                print(f"   {item['snippet']}")
+        print()
+        return result
+
+    def focus_for_date(self, date):
+        """某天适用的Focus：当天或之前最近一份course的Focus部分"""
+        courses = self.index.list('course', date_to=date, descending=True, limit=1)
+        if courses and courses[0]['sections']:
+            return courses[0]['sections'].get('focus', '')
+        return ''
+
+    def build_context(self, focus=None, date=None, budget=context_pack.DEFAULT_BUDGET, use_cache=True):
+        """
+        组装token预算内的提示词上下文（规则见context_pack.py）
+        focus为None时使用date当天适用的Focus；结果按 (日期, Focus, 预算) 缓存在索引数据库中
+        """
+        return context_pack.ContextPackBuilder(self).build(focus=focus, date=date, budget=budget, use_cache=use_cache)
 
-        print("\n" + "="*60)
-        print("Knowledge Compass - 知识管理助手")
-        print("="*60)
-        print(f"日期: {self.today}")
-        print(f"Obsidian路径: {self.obsidian_path}")
-        print(f"运行模式: {'API模式' if self.use_api else 'Claude Code模式'}")
-
-        # 检查是否有任何course文档
-        all_courses = list(self.navigation.glob("*_course.md"))
-        if not all_courses:
-            print("\n[首次使用提示]")
-            print("   未找到任何course文档。")
-            print("   系统会在初始化时自动创建昨天日期的course模板。")
-            print("   请打开 navigation/ 文件夹中的course文档，")
-            print("   fill in your Goal (long-term goals) and Focus (current priorities), then")
-            print("   再执行 @navigation 开始使用。")
-
-        # 检查昨天的course是否存在且已填写
-        yesterday_course = self.navigation / f"{self.yesterday}_course.md"
-        if yesterday_course.exists():
-            content = self.read_file(yesterday_course)
-            if content and '[在这里填写' in content:
-                print("\n[初始化未完成]")
-                print(f"   发现昨日course文档: {yesterday_course.name}")
-                print("   But Goal and Focus are not filled in yet. Please complete them first.")
-
-        print(f"\n今日状态:")
-        print(f"   Sounding: {'已创建' if context['sounding_exists'] else '未创建'}")
-        print(f"   Course: {'已创建' if context['course_exists'] else '未创建'}")
+    def generate_map(self, date=None, max_nodes=knowledge_map.MAX_NODES, write=True):
+        """
+        生成知识图谱 logbook/{date}/map.canvas（规则见knowledge_map.py）
+        返回 {'path', 'canvas', 'stats'}；write=False时只生成不写入
+        """
+        date = date or self.today
+        result = knowledge_map.build_map(self.index, date, self.focus_for_date(date), max_nodes=max_nodes)
+        path = self.logbook / date / 'map.canvas'
+        if write:
+            self.write_file(path, json.dumps(result['canvas'], indent='\t', ensure_ascii=False))
+        return {'path': str(path), **result}
+
+    def map_command(self, argv):
+        """执行--map命令"""
+        parser = argparse.ArgumentParser(prog='compass.py --map', description='生成知识图谱map.canvas')
+        parser.add_argument('date', nargs='?', help='日期 YYYY-MM-DD（默认今天）')
+        parser.add_argument('--max-nodes', type=int, default=knowledge_map.MAX_NODES,
+                            help=f'最多包含的卡片数（默认{knowledge_map.MAX_NODES}）')
+        parser.add_argument('--dry-run', action='store_true', help='只输出结果，不写入文件')
+        args = parser.parse_args(argv)
+
+        result = self.generate_map(args.date, max_nodes=args.max_nodes, write=not args.dry_run)
+        stats = result['stats']
+        print(f"\n知识图谱 {stats['date']}: {stats['nodes']} 个卡片节点, {stats['edges']} 条连线 "
+              f"(候选 {stats['candidates']}, 用时 {stats['took_ms']} ms)")
+        for node in result['canvas']['nodes'][1:]:
+            print(f"   {node['file']}")
+        print(f"{'未写入' if args.dry_run else '已写入'}: {result['path']}\n")
+        return result
+
+    def context_command(self, argv):
+        """执行--context命令：上下文输出到标准输出，统计信息输出到标准错误"""
+        parser = argparse.ArgumentParser(prog='compass.py --context', description='组装供@insight/@analysis使用的上下文')
+        parser.add_argument('date', nargs='?', type=_date_arg, help='日期 YYYY-MM-DD（默认今天）')
+        parser.add_argument('--focus', help='Focus内容（默认使用当天适用的Focus）')
+        parser.add_argument('--budget', type=int, default=context_pack.DEFAULT_BUDGET,
+                            help=f'token预算（默认{context_pack.DEFAULT_BUDGET}）')
+        parser.add_argument('--no-cache', action='store_true', help='忽略缓存重新组装')
+        parser.add_argument('--json', action='store_true', help='输出完整的JSON结果')
+        args = parser.parse_args(argv)
+
+        pack = self.build_context(args.focus, args.date, budget=args.budget, use_cache=not args.no_cache)
+        if args.json:
+            print(json.dumps(pack, indent=2, ensure_ascii=False))
+        else:
+            print(pack['text'])
+        print(f"上下文 {pack['date']}: {len(pack['items'])} 项, 约 {pack['tokens']}/{pack['budget']} tokens "
+              f"({'缓存' if pack['cached'] else '新组装'}, 用时 {pack['took_ms']} ms)", file=sys.stderr)
+        return pack
 
-        print(f"\n当前Focus:")
-        print(context['focus'] if context['focus'] else "   未找到")
-
-        print("\n可用命令:")
-        print("   @navigation - 生成今日sounding")
-        print("   @insight - 探讨重点话题")
-        print("   @fleeting - 探讨临时话题")
-        print("   @card - 记录知识卡片")
-        print("   @map - 生成知识图谱")
-        print("   @harbor - 归档到长期知识库")
-        print("   @analysis - 生成分析报告")
-        print("   @course - 生成今日course文档")
-        print("="*60 + "\n")
+    def rollups(self, kind='week', date_from=None, date_to=None, limit=None):
+        """
+        周/月rollup（course的Today's Summary和What's Next汇总，规则见rollups.py）
+        只重新生成输入的course发生变化的周期；返回与 [date_from, date_to] 有交集的rollup（新的在前，最多limit个）
+        """
+        return RollupEngine(self.index).list(kind, date_from=date_from, date_to=date_to, limit=limit)
+
+    def rollup_command(self, argv):
+        """执行--rollup命令"""
+        parser = argparse.ArgumentParser(prog='compass.py --rollup', description='生成周/月course汇总')
+        parser.add_argument('kind', nargs='?', choices=PERIOD_KINDS, default='week', help='week或month（默认week）')
+        parser.add_argument('--from', dest='date_from', help='开始日期 YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', help='结束日期 YYYY-MM-DD')
+        parser.add_argument('--limit', type=int, default=1, help='输出最近几个周期（默认1）')
+        parser.add_argument('--json', action='store_true', help='输出完整的JSON结果')
+        args = parser.parse_args(argv)
+
+        engine = RollupEngine(self.index)
+        stats = engine.update([args.kind])
+        result = engine.list(args.kind, date_from=args.date_from, date_to=args.date_to, limit=args.limit, update=False)
+        if args.json:
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+        else:
+            for rollup in result:
+                print(rollup['text'])
+        print(f"rollup({args.kind}): 共 {stats['periods']} 个周期, 重新生成 {stats['recomputed']}, "
+              f"删除 {stats['removed']}, 用时 {stats['took_ms']} ms", file=sys.stderr)
+        return result
+
+    def _print_sounding_result(self, result):
+        print(f"已更新sounding: {len(result['topics'])} 个话题, 写入 {result['writes']} 次, 用时 {result['took_ms']} ms")
+        for t in result['topics']:
+            status = f"{t['total_ms']} ms" if t['ok'] else f"失败: {t['error']}"
+            print(f"   {t['topic']}: {status}")
+
+    def sounding_command(self, argv):
+        """执行--sounding命令"""
+        parser = argparse.ArgumentParser(prog='compass.py --sounding', description='按Focus话题并发填写sounding')
+        parser.add_argument('date', nargs='?', help='日期 YYYY-MM-DD（默认今天）')
+        parser.add_argument('--concurrency', type=int, default=sounding_pipeline.DEFAULT_CONCURRENCY,
+                            help=f'同时处理的话题数（默认{sounding_pipeline.DEFAULT_CONCURRENCY}）')
+        parser.add_argument('--timeout', type=float, default=None, help='单个话题的超时（秒）')
+        parser.add_argument('--no-cache', action='store_true', help='不使用模型响应缓存')
+        args = parser.parse_args(argv)
+
+        date = args.date or self.today
+        if not (self.charts / f"{date}_sounding.md").exists():
+            if date != self.today:
+                print(f"sounding不存在: {self.charts / f'{date}_sounding.md'}")
+                return None
+            print(f"已生成今日sounding草稿: {self.create_sounding_draft()}")
+        result = self.fill_sounding(date, concurrency=args.concurrency, timeout=args.timeout,
+                                    use_cache=not args.no_cache)
+        self._print_sounding_result(result)
+        return result
+
+    def import_command(self, argv):
+        """执行--import命令"""
+        parser = argparse.ArgumentParser(prog='compass.py --import', description='从JSON Lines文件批量导入卡片')
+        parser.add_argument('files', nargs='*', default=['-'], help='JSONL文件，- 表示标准输入（默认）')
+        parser.add_argument('--json', action='store_true', help='输出完整的JSON结果')
+        args = parser.parse_args(argv)
+
+        records = []
+        for name in args.files:
+            if name == '-':
+                records.extend(card_import.parse_jsonl(sys.stdin))
+            else:
+                with open(name, 'r', encoding='utf-8') as f:
+                    records.extend(card_import.parse_jsonl(f))
+
+        result = self.import_cards(records)
+
+        if args.json:
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+            return result
+        print(f"\n导入完成: 共 {result['total']} 条  新建 {result['created']}  追加 {result['appended']}  "
+              f"失败 {result['failed']}  用时 {result['took_ms']} ms")
+        for item in result['results']:
+            if not item['ok']:
+                print(f"   第{item['line']}行: {item['error']}")
+        print()
+        return result
+
+    def show_status(self):
+        """显示当前状态（命令行界面），并刷新quick_status使用的状态缓存"""
+        if not self.navigation.exists():
+            print(f"\nvault尚未初始化: {self.obsidian_path}")
+            print("运行 compass init（或 python compass.py init）创建文件夹结构和初始模板\n")
+            return
+
+        date = self.today
+        signature, digest = DailyDigest(self).snapshot(date)
+        print(quick_status.render_status(date, self.obsidian_path, self.use_api, digest))
+
+        entry = quick_status.cache_entry(self.config_path, self.config_mtime, self.config, date, signature, digest)
+        if quick_status.load_cache(self.config_path) != entry:
+            try:
+                atomic_write(quick_status.cache_file(self.config_path), quick_status.dump_cache(entry))
+            except OSError:
+                # 缓存只用于加速，写入失败（如只读目录）不影响状态显示
+                pass
+
+    def init_command(self):
+        """compass init：创建文件夹结构和初始模板（其他命令不再自动执行）"""
+        print(f"\n初始化vault: {self.obsidian_path}")
+        self._ensure_folders_exist()
+        for folder in ('charts', 'logbook', 'harbor', 'navigation', 'template'):
+            print(f"   {folder}/: {getattr(self, folder)}")
+        self.show_status()
 
     def navigation_command(self):
         """执行@navigation命令"""
@@ -639,8 +985,13 @@ Generated by Compass
         print(f"\n已生成今日sounding草稿: {sounding_path}")
 
         if self.use_api:
-            print("\n下一步：需要AI搜索Focus相关的最新信息并更新sounding")
-            print("（API模式下需要实现搜索功能）")
+            print(f"\n调用模型按话题填写News Update和Analysis Update（{self.api_config.get('provider', llm.DEFAULT_PROVIDER)}）...")
+            try:
+                result = self.fill_sounding()
+            except llm.LLMError as e:
+                print(f"模型调用失败，保留草稿: {e}")
+            else:
+                self._print_sounding_result(result)
         else:
             print("\n接下来建议：")
             print("   1. 在Claude Code中告诉我你想探讨的话题")
@@ -652,15 +1003,29 @@ Generated by Compass
 def main():
     """主函数 - 命令行入口"""
     try:
-        assistant = CompassAssistant()
-
-        if len(sys.argv) > 1:
-            command = sys.argv[1]
-
-            if command == '@navigation':
+        command = sys.argv[1] if len(sys.argv) > 1 else None
+        # 文件夹结构和初始模板只在 init 时创建，其余命令不做这项检查
+        assistant = CompassAssistant(bootstrap=command in ('init', '--init'))
+
+        if command is not None:
+            if command in ('init', '--init'):
+                assistant.init_command()
+            elif command == '@navigation':
                 assistant.navigation_command()
             elif command == '--status' or command == '-s':
                 assistant.show_status()
+            elif command == '--search':
+                assistant.search_command(sys.argv[2:])
+            elif command == '--import':
+                assistant.import_command(sys.argv[2:])
+            elif command == '--map':
+                assistant.map_command(sys.argv[2:])
+            elif command == '--context':
+                assistant.context_command(sys.argv[2:])
+            elif command == '--sounding':
+                assistant.sounding_command(sys.argv[2:])
+            elif command == '--rollup':
+                assistant.rollup_command(sys.argv[2:])
             elif command == '--help' or command == '-h':
                 print("""
 Knowledge Compass - 你的日常知识管理助手
@@ -670,8 +1035,15 @@ Knowledge Compass - 你的日常知识管理助手
    直接说 "hi compass" 或 "@navigation" 等命令
 
 2. 命令行使用：
+   python compass.py init         # 初始化vault（文件夹结构和模板）
    python compass.py @navigation  # 生成今日sounding
    python compass.py --status     # 查看状态
+   python compass.py --search 英伟达 --tag ai  # 全文检索
+   python compass.py --import cards.jsonl  # 批量导入卡片（JSON Lines）
+   python compass.py --map        # 生成今日知识图谱map.canvas
+   python compass.py --context --budget 4000  # 组装token预算内的提示词上下文
+   python compass.py --sounding   # 按Focus话题并发填写今日sounding
+   python compass.py --rollup month --limit 3  # 最近3个月的course汇总
    python compass.py --help       # 显示帮助
 
 更多信息请查看 README.md 和 QUICKSTART.md
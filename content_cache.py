@@ -0,0 +1,142 @@
+"""
+Content cache - shared in-memory LRU cache for markdown reads
+
+CompassAssistant.read_file() and the server's async readers both go through
+read(). The same files are read again and again, both within one request
+and across requests: the latest course, today's sounding, card-template.md
+on every card creation. Entries are keyed by path and validated by
+(mtime_ns, size) on every hit, so a hit costs one stat() and no read. Edits
+made outside Compass (e.g. in Obsidian) are therefore picked up on the next
+read. vault_io.atomic_write() also invalidates the path it replaces.
+
+The cache is bounded by a byte budget (COMPASS_CACHE_MB, default 32; 0
+disables it). It is measured with sys.getsizeof of the cached strings, and
+least recently used entries are evicted first. Files larger than a quarter
+of the budget are never cached, so one long harbor report cannot flush
+everything else.
+
+stats() returns the hit/miss counters shown by /api/status and /api/metrics.
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import instrumentation
+
+DEFAULT_BUDGET_MB = 32
+
+
+def _budget_from_env():
+    try:
+        return int(float(os.environ.get("COMPASS_CACHE_MB", DEFAULT_BUDGET_MB)) * 1024 * 1024)
+    except ValueError:
+        return DEFAULT_BUDGET_MB * 1024 * 1024
+
+
+class ContentCache:
+    """
+    按 (路径, mtime, 大小) 缓存文件内容，按字节预算LRU淘汰
+
+    参数:
+    - max_bytes: 字节预算（0表示不缓存）
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = _budget_from_env() if max_bytes is None else max_bytes
+        self._entries = OrderedDict()  # path -> (signature, content, cost)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def read(self, path):
+        """读取UTF-8文件内容（命中时不读文件），文件不存在时返回None"""
+        path = os.fspath(path)
+        instrumentation.record_stat()
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.invalidate(path)
+            return None
+        signature = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+                # 以打开后的fstat为准：stat与open之间文件被替换时，缓存的是实际读到的版本
+                st = os.fstat(f.fileno())
+        except FileNotFoundError:
+            self.invalidate(path)
+            return None
+        instrumentation.record_read(st.st_size)
+        self._store(path, (st.st_mtime_ns, st.st_size), content)
+        return content
+
+    def _store(self, path, signature, content):
+        cost = sys.getsizeof(content)
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.bytes -= old[2]
+            if cost > self.max_bytes // 4:
+                return
+            self._entries[path] = (signature, content, cost)
+            self.bytes += cost
+            while self.bytes > self.max_bytes and self._entries:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self, path):
+        """移除某个文件的缓存（写入后调用）"""
+        path = os.fspath(path)
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.bytes -= old[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """命中/未命中计数和当前占用"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+_cache = ContentCache()
+
+
+def read(path):
+    """读取文件内容（经过进程内共享的缓存），文件不存在时返回None"""
+    return _cache.read(path)
+
+
+def invalidate(path):
+    _cache.invalidate(path)
+
+
+def stats():
+    return _cache.stats()
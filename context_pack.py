@@ -0,0 +1,312 @@
+"""
+Context packs - token-budgeted prompt context for @insight and @analysis
+
+A context pack is the vault material worth sending to a model for the
+current Focus. It is assembled under a token budget from three sources:
+- the latest soundings (up to SOUNDING_DAYS, newest first)
+- the cards most similar to the Focus (similarity.py), weighted towards
+  recent ones
+- the harbor files most similar to the Focus, reduced to their best
+  matching sections
+
+Each source gets a share of the budget (SHARES) and each item a cap
+(ITEM_MAX_TOKENS). Items are truncated on line boundaries to fit, and
+budget left over by one source goes to the others. Only the items that
+are selected are read, through content_cache. Token counts are estimates
+(about one token per CJK character and per four other characters), since
+no tokenizer is bundled; the pack stays within the budget by that estimate.
+
+Packs are cached in the vault index database per (date, Focus hash,
+budget). A cached pack is reused while its signature still matches: the
+position in the term_changes log (any card or harbor change) and the
+soundings fingerprint. Packs older than CACHE_DAYS are pruned.
+"""
+
+import hashlib
+import math
+import re
+import time
+from datetime import datetime, timedelta
+
+import instrumentation
+from knowledge_map import extract_terms
+from search import count_cjk, tokenize
+
+DEFAULT_BUDGET = 6000
+MIN_BUDGET = 500
+MAX_BUDGET = 200000
+
+# 各来源占预算的比例（某一来源用不完的部分让给其他来源）
+SHARES = {"sounding": 0.3, "card": 0.45, "harbor": 0.25}
+# 单个条目的token上限
+ITEM_MAX_TOKENS = {"sounding": 1500, "card": 400, "harbor": 600}
+# 剩余预算不足该值时不再加入被截断的条目
+MIN_ITEM_TOKENS = 60
+# Focus最多占预算的比例
+FOCUS_SHARE = 0.1
+
+SOUNDING_DAYS = 3
+CARD_CANDIDATES = 40
+HARBOR_CANDIDATES = 12
+# 卡片相关度按天数衰减的半衰期（天）；衰减只作用于一半权重，旧卡片仍可入选
+CARD_HALF_LIFE = 30.0
+# 无Focus时使用最近几天的卡片
+RECENT_CARD_DAYS = 3
+# 缓存的pack保留天数
+CACHE_DAYS = 14
+# 选择规则变化时递增，使旧缓存失效
+PACK_VERSION = 1
+
+KIND_TITLES = {"sounding": "Soundings", "card": "Cards", "harbor": "Harbor"}
+
+_HEADING_RE = re.compile(r"^#{1,6}\s")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def estimate_tokens(text):
+    """估计token数：中日韩字符约1个token，其他字符约4个字符1个token"""
+    if not text:
+        return 0
+    cjk = count_cjk(text)
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def truncate_tokens(text, max_tokens):
+    """
+    截断到max_tokens以内（尽量在行尾截断）
+    返回 (文本, 是否被截断)
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text, False
+    lines, used = [], 0
+    for line in text.split("\n"):
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            if not lines:
+                # 第一行就超出：按字符截断
+                cut = line
+                while cut and estimate_tokens(cut) > max_tokens - 1:
+                    cut = cut[: int(len(cut) * 0.9)]
+                lines.append(cut)
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines).rstrip() + " …", True
+
+
+def focus_hash(focus_text):
+    """Focus的哈希（忽略空白差异）"""
+    normalized = " ".join((focus_text or "").split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def _compact(content):
+    """去掉标题行之外多余的空行"""
+    return _BLANK_LINES_RE.sub("\n\n", content.strip())
+
+
+def best_sections(content, terms, max_tokens):
+    """
+    长文档中与terms重合最多的章节（按原文顺序拼接，不超过max_tokens）
+    文档标题（第一行）始终保留
+    """
+    sections, current = [], []
+    for line in content.strip().split("\n"):
+        if _HEADING_RE.match(line) and current:
+            sections.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+    if current:
+        sections.append("\n".join(current).strip())
+    if len(sections) <= 1:
+        return truncate_tokens(content.strip(), max_tokens)
+
+    head, body = sections[0], sections[1:]
+    scored = sorted(
+        range(len(body)),
+        key=lambda i: (-sum(1 for t in tokenize(body[i]) if t in terms), i),
+    )
+    chosen, used = [], estimate_tokens(head)
+    for i in scored:
+        cost = estimate_tokens(body[i]) + 1
+        if used + cost > max_tokens:
+            continue
+        chosen.append(i)
+        used += cost
+    truncated = len(chosen) < len(body)
+    if not chosen:
+        text, _ = truncate_tokens(f"{head}\n\n{body[scored[0]]}", max_tokens)
+        return text, True
+    return "\n\n".join([head] + [body[i] for i in sorted(chosen)]), truncated
+
+
+def _days_between(a, b):
+    try:
+        return abs((datetime.strptime(a, "%Y-%m-%d") - datetime.strptime(b, "%Y-%m-%d")).days)
+    except (TypeError, ValueError):
+        return 0
+
+
+class ContextPackBuilder:
+    """
+    按Focus和token预算组装上下文
+
+    参数:
+    - assistant: CompassAssistant（提供索引、相似度索引和文件读取）
+    """
+
+    def __init__(self, assistant):
+        self.assistant = assistant
+
+    def build(self, focus=None, date=None, budget=DEFAULT_BUDGET, use_cache=True):
+        """
+        返回context pack：
+        {'date', 'focus', 'focus_hash', 'budget', 'tokens', 'items': [...], 'text', 'cached', 'took_ms'}
+        items中每项为 {'kind', 'path', 'title', 'date', 'score', 'tokens', 'truncated', 'text'}
+        focus为None时使用date当天适用的Focus
+        """
+        started = time.perf_counter()
+        a = self.assistant
+        date = date or a.today
+        budget = max(MIN_BUDGET, min(int(budget), MAX_BUDGET))
+        if focus is None:
+            focus = a.focus_for_date(date)
+        focus = focus.strip()
+        key = f"{date}:{focus_hash(focus)}:{budget}"
+
+        with instrumentation.span("context"):
+            signature = self._signature()
+            stored = a.index.get_context_pack(key) if use_cache else None
+            if stored is not None and stored[0] == signature:
+                pack = stored[1]
+                cached = True
+            else:
+                pack = self._build(focus, date, budget)
+                keep_from = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=CACHE_DAYS)).strftime("%Y-%m-%d")
+                a.index.put_context_pack(key, date, signature, pack, keep_from=keep_from)
+                cached = False
+        return {**pack, "cached": cached, "took_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    def _signature(self):
+        """缓存有效性：卡片/harbor的词频变化序号 + sounding指纹"""
+        index = self.assistant.index
+        index.refresh(["card", "harbor"])
+        seq, _ = index.term_changes()
+        return f"{PACK_VERSION}|{index.generation()}|{seq}|{index.fingerprint('sounding')}"
+
+    # ------------------------------------------------------------------
+    # Candidates
+    # ------------------------------------------------------------------
+
+    def _candidates(self, focus, date):
+        """各来源的候选：{kind: [(分数, 索引行)]}，按分数降序"""
+        a = self.assistant
+        index = a.index
+        soundings = index.list("sounding", date_to=date, descending=True, limit=SOUNDING_DAYS)
+        candidates = {"sounding": [(1.0 / (i + 1), e) for i, e in enumerate(soundings)], "card": [], "harbor": []}
+
+        if focus:
+            cards = a.similarity.similar(focus, k=CARD_CANDIDATES, kinds=["card"])["results"]
+            harbor = a.similarity.similar(focus, k=HARBOR_CANDIDATES, kinds=["harbor"])["results"]
+        else:
+            days = index.card_dates(date_to=date)[:RECENT_CARD_DAYS]
+            cards = [{**e, "score": 1.0} for d in days for e in index.list("card", date=d)]
+            harbor = []
+
+        entries = index.get_many([r["path"] for r in cards + harbor])
+        for r in cards:
+            entry = entries.get(r["path"])
+            if entry is None or (entry["date"] or "") > date:
+                continue
+            decay = 0.5 ** (_days_between(entry["date"], date) / CARD_HALF_LIFE)
+            candidates["card"].append((r["score"] * (0.5 + 0.5 * decay), entry))
+        for r in harbor:
+            entry = entries.get(r["path"])
+            if entry is not None:
+                candidates["harbor"].append((r["score"], entry))
+        for items in candidates.values():
+            items.sort(key=lambda item: -item[0])
+        return candidates
+
+    # ------------------------------------------------------------------
+    # Assembly
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _heading(kind, entry):
+        if kind == "sounding":
+            return f"### {entry['date']} sounding"
+        if kind == "card":
+            return f"### {entry['title'] or entry['name']} ({entry['date']}, {entry['category']})"
+        return f"### {entry['title'] or entry['name']} (harbor/{entry['category']})"
+
+    def _item(self, kind, score, entry, max_tokens, terms):
+        """读取并截断一个条目（标题和正文合计不超过max_tokens），文件为空或不存在时返回None"""
+        heading = self._heading(kind, entry)
+        room = max_tokens - estimate_tokens(heading) - 2
+        content = self.assistant.read_file(self.assistant.obsidian_path / entry["path"])
+        if not content:
+            return None
+        room = min(room, ITEM_MAX_TOKENS[kind])
+        if kind == "harbor":
+            text, truncated = best_sections(content, terms, room)
+        else:
+            text, truncated = truncate_tokens(_compact(content), room)
+        return {
+            "kind": kind,
+            "path": entry["path"],
+            "title": entry["title"] or entry["name"],
+            "date": entry["date"],
+            "score": round(score, 4),
+            "tokens": estimate_tokens(heading) + 2 + estimate_tokens(text),
+            "truncated": truncated,
+            "heading": heading,
+            "text": text,
+        }
+
+    def _build(self, focus, date, budget):
+        focus_text, _ = truncate_tokens(focus, int(budget * FOCUS_SHARE)) if focus else ("", False)
+        header = f"# Context {date}\n\n## Focus\n{focus_text or '-'}"
+        # 各来源的小标题各占几个token
+        remaining = budget - estimate_tokens(header) - 4 * len(KIND_TITLES)
+        terms = {t for t, _ in extract_terms(focus, limit=None)}
+        candidates = self._candidates(focus, date)
+
+        chosen = {kind: [] for kind in KIND_TITLES}
+        pending = {kind: list(items) for kind, items in candidates.items()}
+        # 第一轮：每个来源在自己的份额内选取；第二轮：剩余预算按顺序让给其他来源
+        allowances = {kind: int(remaining * SHARES[kind]) for kind in KIND_TITLES}
+        for final in (False, True):
+            for kind in ("card", "sounding", "harbor"):
+                room = remaining if final else min(allowances[kind], remaining)
+                while pending[kind]:
+                    score, entry = pending[kind][0]
+                    if room - estimate_tokens(self._heading(kind, entry)) - 2 < MIN_ITEM_TOKENS:
+                        break
+                    pending[kind].pop(0)
+                    item = self._item(kind, score, entry, room, terms)
+                    if item is None:
+                        continue
+                    chosen[kind].append(item)
+                    room -= item["tokens"]
+                    remaining -= item["tokens"]
+
+        parts = [header]
+        items = []
+        for kind, title in KIND_TITLES.items():
+            if not chosen[kind]:
+                continue
+            parts.append(f"## {title}")
+            for item in chosen[kind]:
+                parts.append(f"{item.pop('heading')}\n{item['text']}")
+                items.append(item)
+        text = "\n\n".join(parts) + "\n"
+        return {
+            "date": date,
+            "focus": focus,
+            "focus_hash": focus_hash(focus),
+            "budget": budget,
+            "tokens": estimate_tokens(text),
+            "items": items,
+            "text": text,
+        }
@@ -0,0 +1,213 @@
+"""
+Course document model - single-pass parser shared by compass.py and the server
+
+A course file is a sequence of "## " sections (Goal, Focus, Note, Reference,
+Today's Summary, What's Next) with a "---" rule between the user part and the
+auto-filled part. CourseDocument.parse() walks the text once, recording for
+every known section the offsets of its header, body and end, so that
+replace_section() can splice new text into a section without re-scanning.
+
+Section rules:
+- a section starts at a level-2 heading whose title matches one of the keys
+  below (Goal -> task, Focus, Note, Reference, Today's Summary -> summary,
+  What's Next -> next)
+- it ends at the next level-1/level-2 heading, a "---" line, or end of file
+- deeper headings (### ...) and blank lines stay inside the section but are
+  left out of its text value
+
+Soundings use the same layout, so their News Update (news) and Analysis
+Update (analysis) sections are recognised too; they are not part of
+SECTION_KEYS and to_dict() leaves them out.
+
+escape_body() rewrites the lines that would end a section (level-1/level-2
+headings and "---"), so generated text can be put into a section body and
+the document still parses the same way afterwards.
+
+load_course() memoizes parsed documents by (path, mtime, size).
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+
+SECTION_KEYS = ['task', 'focus', 'note', 'reference', 'summary', 'next']
+
+_HEADING_RE = re.compile(r'^\s*(#{1,2})\s+(.*?)\s*$')
+
+
+def _section_key(title):
+    """二级标题对应的section键，未知标题返回None"""
+    if title.startswith('Goal'):
+        return 'task'
+    if title.startswith('Focus'):
+        return 'focus'
+    if title.startswith('Note'):
+        return 'note'
+    if title.startswith('Reference'):
+        return 'reference'
+    if title.startswith('Today') and 'Summary' in title:
+        return 'summary'
+    if title.startswith('What') and 'Next' in title:
+        return 'next'
+    if title.startswith('News'):
+        return 'news'
+    if title.startswith('Analysis'):
+        return 'analysis'
+    return None
+
+
+def escape_body(text):
+    """转义text中会结束section的行：一/二级标题降两级（## x -> #### x），分隔线写成\\---"""
+    lines = []
+    for line in (text or '').splitlines():
+        stripped = line.strip()
+        if stripped == '---':
+            line = line.replace('---', '\\---', 1)
+        elif stripped.startswith('#') and _HEADING_RE.match(line):
+            line = line.replace('#', '###', 1)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+class Section:
+    """
+    course中的一个section
+
+    - header_start: 标题行起始偏移
+    - body_start: 标题行之后（正文起始）偏移
+    - end: section结束偏移（下一个标题/分隔线/文件末尾）
+    偏移均为字符串下标
+    """
+
+    __slots__ = ('key', 'title', 'header_start', 'body_start', 'end', 'text')
+
+    def __init__(self, key, title, header_start, body_start):
+        self.key = key
+        self.title = title
+        self.header_start = header_start
+        self.body_start = body_start
+        self.end = body_start
+        self.text = ''
+
+    def __repr__(self):
+        return f"Section({self.key!r}, {self.header_start}:{self.body_start}:{self.end})"
+
+
+class CourseDocument:
+    """解析后的course文档"""
+
+    def __init__(self, text, sections):
+        self.text = text
+        self.sections = sections
+
+    @classmethod
+    def parse(cls, text):
+        """单次遍历解析course文本"""
+        text = text or ''
+        sections = OrderedDict()
+        current = None
+        lines = []
+        offset = 0
+
+        def close(end):
+            current.end = end
+            current.text = ''.join(lines)
+
+        for line in text.splitlines(keepends=True):
+            stripped = line.strip()
+            heading = _HEADING_RE.match(line) if stripped.startswith('#') else None
+
+            if heading or stripped == '---':
+                if current is not None:
+                    close(offset)
+                    current = None
+                key = _section_key(heading.group(2)) if heading and heading.group(1) == '##' else None
+                if key is not None and key not in sections:
+                    current = Section(key, heading.group(2), offset, offset + len(line))
+                    sections[key] = current
+                    lines = []
+            elif current is not None and stripped and not stripped.startswith('#'):
+                lines.append(line.rstrip('\r\n') + '\n')
+
+            offset += len(line)
+
+        if current is not None:
+            close(offset)
+
+        return cls(text, sections)
+
+    def get(self, key, default=''):
+        """section的文本（不含标题、空行和子标题）"""
+        section = self.sections.get(key)
+        return section.text if section else default
+
+    def to_dict(self):
+        """与旧版parse_course()相同格式的字典"""
+        if not self.text:
+            return {}
+        return {key: self.get(key) for key in SECTION_KEYS}
+
+    def replace_section(self, key, new_value):
+        """
+        返回替换指定section正文后的新文本（标题保留）
+        section不存在时抛出KeyError
+        """
+        section = self.sections.get(key)
+        if section is None:
+            raise KeyError(key)
+        body = new_value.strip() + '\n'
+        if section.end < len(self.text):
+            # 与下一个标题/分隔线之间保留一个空行
+            body += '\n'
+        return self.text[:section.body_start] + body + self.text[section.end:]
+
+
+class _CourseCache:
+    """按 (路径, mtime, 大小) 缓存解析结果"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, path):
+        path = os.fspath(path)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        signature = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == signature:
+                self._entries.move_to_end(path)
+                return cached[1]
+
+        with open(path, 'r', encoding='utf-8') as f:
+            doc = CourseDocument.parse(f.read())
+
+        with self._lock:
+            self._entries[path] = (signature, doc)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return doc
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = _CourseCache()
+
+
+def load_course(path):
+    """读取并解析course文件（按mtime缓存），文件不存在时返回None"""
+    return _cache.load(path)
+
+
+def parse_course(content):
+    """解析course文本，返回各section文本的字典"""
+    return CourseDocument.parse(content).to_dict()
@@ -0,0 +1,112 @@
+"""
+Daily digest - a materialized per-day snapshot for /api/today, /api/status and --status
+
+The snapshot holds everything those views show for one date: the Goal,
+Focus, Note and other sections of the latest course, the day's sounding,
+the day's card names and the status flags. It is stored as JSON in the vault
+index database together with a signature of its source files, and is rebuilt
+only when the signature changes.
+
+Checking the signature costs a handful of stat() calls and no reads:
+- the navigation, charts and logbook/{date}/{insights,fleeting} directories
+  (their mtime moves whenever a file is created, deleted or atomically
+  replaced, which is how every write through CompassAssistant lands)
+- the latest course, yesterday's course and the day's sounding files
+  (their mtime moves on in-place edits, e.g. from Obsidian)
+
+The signature helpers live in quick_status.py, which checks the same
+signature to serve `compass --status` from a small cache file.
+"""
+
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import instrumentation
+from course_doc import load_course
+from quick_status import course_names, latest_course, signature, source_paths, stat_key
+from vault_index import CARD_TYPES
+
+# 昨日course中仍是占位内容时的标记
+UNFILLED_MARKER = '[在这里填写'
+
+
+def _card_names(directory):
+    instrumentation.record_glob()
+    try:
+        with os.scandir(directory) as it:
+            return sorted(e.name for e in it if e.name.endswith('.md') and not e.name.startswith('.') and e.is_file())
+    except FileNotFoundError:
+        return []
+
+
+class DailyDigest:
+    """
+    按日期缓存的快照
+
+    参数:
+    - assistant: CompassAssistant（提供目录和索引数据库）
+    """
+
+    def __init__(self, assistant):
+        self.assistant = assistant
+
+    def get(self, date):
+        """返回date的快照（来源文件未变化时直接使用数据库中的快照）"""
+        return self.snapshot(date)[1]
+
+    def snapshot(self, date):
+        """返回 (签名, 快照)，签名见quick_status.signature()"""
+        with instrumentation.span("digest"):
+            return self._get(date)
+
+    def _get(self, date):
+        a = self.assistant
+        paths = source_paths(a.obsidian_path, a.config['folders'], date)
+        index = a.index
+        stored = index.get_digest(date)
+        if stored is not None:
+            sig, data = stored
+            latest = data['latest_course_path']
+            latest = a.obsidian_path / latest if latest else None
+            if sig == signature(paths, latest):
+                return sig, data
+
+        latest = latest_course(paths['navigation'], date)
+        latest = Path(latest) if latest else None
+        # 先取签名再读取内容：读取期间发生的修改会让下一次调用重新生成
+        sig = signature(paths, latest)
+        data = self._build(date, paths, latest)
+        index.put_digest(date, sig, data)
+        return sig, data
+
+    def _build(self, date, paths, latest):
+        a = self.assistant
+        doc = load_course(latest) if latest else None
+        parsed = doc.to_dict() if doc else {}
+        course_stat = stat_key(latest) if latest else None
+
+        sounding = a.read_file(paths['sounding'])
+        yesterday_content = a.read_file(paths['yesterday_course'])
+        course_exists = os.path.exists(os.path.join(paths['navigation'], f"{date}_course.md"))
+
+        return {
+            'date': date,
+            'task': parsed.get('task', '').strip(),
+            'focus': parsed.get('focus', '').strip(),
+            'note': parsed.get('note', '').strip(),
+            'reference': parsed.get('reference', '').strip(),
+            'last_summary': parsed.get('summary', '').strip(),
+            'next_actions': parsed.get('next', '').strip(),
+            'latest_course_date': latest.stem.replace('_course', '') if latest else None,
+            'latest_course_path': latest.relative_to(a.obsidian_path).as_posix() if latest else None,
+            'latest_course_version': course_stat,
+            'sounding': sounding,
+            'sounding_exists': sounding is not None,
+            'course_exists': course_exists,
+            'logbook_exists': os.path.exists(paths['logbook_day']),
+            'has_courses': any(n.endswith('_course.md') for n in course_names(paths['navigation'])),
+            'yesterday_course': os.path.basename(paths['yesterday_course']) if yesterday_content is not None else None,
+            'yesterday_unfilled': bool(yesterday_content and UNFILLED_MARKER in yesterday_content),
+            'cards': {ct: _card_names(paths[ct]) for ct in CARD_TYPES},
+        }
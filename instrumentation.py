@@ -0,0 +1,98 @@
+"""
+Per-request I/O accounting and timing spans
+
+The vault helpers (CompassAssistant.read_file and its glob helpers, the vault
+index scanner, the digest and the server's async readers) report what they do
+through the functions below. The counts land in the RequestStats of the
+request currently being served, looked up through a ContextVar, so outside
+the API server (CLI, Claude sessions) nothing is collected and each hook is a
+single ContextVar lookup.
+
+Work that runs on thread pools is attributed correctly as long as the
+context is copied into the worker (anyio's run_sync and server/aio.run_io
+both do).
+
+- record_read(nbytes) / record_stat(n) / record_glob(): I/O counters
+- span(name): accumulate wall time under a Server-Timing metric name
+"""
+
+import _thread
+import contextvars
+import time
+
+_current = contextvars.ContextVar("compass_request_stats", default=None)
+
+
+class RequestStats:
+    """一个请求期间的文件访问计数和各阶段耗时（秒）"""
+
+    __slots__ = ("files_read", "bytes_read", "files_stat", "globs", "spans", "_lock")
+
+    def __init__(self):
+        self.files_read = 0
+        self.bytes_read = 0
+        self.files_stat = 0
+        self.globs = 0
+        self.spans = {}
+        # _thread而非threading：quick_status的CLI启动路径也会导入本模块，保持导入开销最小
+        self._lock = _thread.allocate_lock()
+
+    def add_span(self, name, seconds):
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+
+def begin():
+    """开始统计（返回token，交给end()）"""
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def record_read(nbytes):
+    stats = _current.get()
+    if stats is not None:
+        with stats._lock:
+            stats.files_read += 1
+            stats.bytes_read += nbytes
+
+
+def record_stat(n=1):
+    stats = _current.get()
+    if stats is not None:
+        with stats._lock:
+            stats.files_stat += n
+
+
+def record_glob():
+    stats = _current.get()
+    if stats is not None:
+        with stats._lock:
+            stats.globs += 1
+
+
+class span:
+    """把代码块的耗时累加到当前请求的name阶段（with span("index"): ...）"""
+
+    __slots__ = ("name", "stats", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.stats = _current.get()
+        if self.stats is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.stats is not None:
+            self.stats.add_span(self.name, time.perf_counter() - self.started)
+        return False
@@ -0,0 +1,335 @@
+"""
+Knowledge map engine - builds logbook/{date}/map.canvas from the card graph
+
+The graph is maintained incrementally by VaultIndex alongside the full-text
+index: whenever a card is (re)read, its [[wikilinks]] go into the links table
+and its content terms (with term frequency) into doc_terms; tags are already
+in the tags table. Generating a map therefore only runs a few indexed queries
+and never reads card files.
+
+Map rules (the 知识图谱 guidelines in CompassAssistant):
+- candidates are the day's cards plus earlier cards that the day's cards link
+  to or share tags with
+- each candidate is ranked by relevance to the Focus section (tf-idf overlap
+  of terms, tag matches, title matches), then by type (insights > fleeting),
+  connectivity and recency; the top max_nodes (default MAX_NODES) are kept
+- edges are explicit links, shared tags, and co-term similarity; each node
+  keeps only its strongest MAX_EDGES_PER_NODE edges
+- layout is deterministic: the Focus text node in the middle, insights on an
+  inner ring, other cards on an outer ring, ordered by score
+"""
+
+import hashlib
+import math
+import re
+import time
+from collections import Counter
+from datetime import datetime
+
+from search import tokenize
+
+MAX_NODES = 10
+MAX_EDGES_PER_NODE = 3
+
+# 每张卡片保存的词数（按词频）
+TERMS_PER_CARD = 48
+# 出现在超过该比例卡片中的词视为模板/套话，不参与相关度计算
+MAX_DOC_RATIO = 0.5
+# 共现相似度低于该值的卡片之间不连线
+MIN_SIMILARITY = 0.15
+# 从其他日期补充的候选卡片上限
+RELATED_LIMIT = 100
+# 参与连线计算的候选数 = max_nodes * SHORTLIST_FACTOR
+SHORTLIST_FACTOR = 3
+# 其他日期卡片的相关度按天数衰减（半衰期，天）
+RECENCY_HALF_LIFE = 7.0
+
+TYPE_WEIGHT = {"insights": 1.0, "fleeting": 0.4}
+
+NODE_WIDTH = 400
+NODE_HEIGHT = 240
+FOCUS_WIDTH = 480
+FOCUS_HEIGHT = 200
+RING_GAP = 120
+
+# canvas预设颜色："5"青色 / "4"绿色 / "3"黄色
+FOCUS_COLOR = "5"
+NODE_COLORS = {"insights": "4", "fleeting": "3"}
+
+_LINK_RE = re.compile(r"\[\[([^\]|#]+)(?:#[^\]|]*)?(?:\|[^\]]*)?\]\]")
+_HEADING_LINE_RE = re.compile(r"^\s*#{1,6}\s")
+
+# 卡片模板本身的词和常见英文虚词
+STOP_TERMS = frozenset(
+    """
+    a an and are as at be but by for from has have in is it its of on or that the this
+    to was were will with not no yes can do does into about than then there their they
+    we you your our i he she his her them these those which who what when where how
+    date content card tags tag1 tag2 related links link1 link2 source generated compass
+    insight fleeting
+    时间 类型 内容 标签 实际 际内 相关 链接 来源 通过 助手 手生 生成 待补 补充 更新
+    """.split()
+)
+
+
+def _stem(name):
+    """[[链接]]目标或文件名 -> 比较用的键（去目录、去.md、小写）"""
+    name = name.strip().rsplit("/", 1)[-1]
+    if name.lower().endswith(".md"):
+        name = name[:-3]
+    return name.strip().lower()
+
+
+def extract_links(text):
+    """提取 [[wikilink]] 目标（规范化后去重，保持出现顺序）"""
+    seen = []
+    for target in _LINK_RE.findall(text or ""):
+        key = _stem(target)
+        if key and key not in seen:
+            seen.append(key)
+    return seen
+
+
+def _is_term(token):
+    if token in STOP_TERMS or token.isdigit():
+        return False
+    return len(token) > 1 or not token.isascii()
+
+
+def extract_terms(text, limit=TERMS_PER_CARD):
+    """
+    卡片正文中的词及词频（跳过标题行，去掉虚词和纯数字）
+    返回按词频降序的 [(词, 词频)]，最多limit个
+    """
+    counts = Counter()
+    for line in (text or "").split("\n"):
+        if _HEADING_LINE_RE.match(line):
+            continue
+        counts.update(t for t in tokenize(line) if _is_term(t))
+    return counts.most_common(limit)
+
+
+def focus_terms(focus_text):
+    """Focus中的词（用于相关度）"""
+    return {term for term, _ in extract_terms(focus_text, limit=None)}
+
+
+def _node_id(path):
+    return hashlib.sha1(path.encode("utf-8")).hexdigest()[:16]
+
+
+def _days_between(a, b):
+    try:
+        return abs((datetime.strptime(a, "%Y-%m-%d") - datetime.strptime(b, "%Y-%m-%d")).days)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _cosine(a, b):
+    if not a or not b:
+        return 0.0
+    dot = sum(w * b[t] for t, w in a.items() if t in b)
+    if not dot:
+        return 0.0
+    return dot / (math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values())))
+
+
+def _side(dx, dy):
+    """从一个节点指向另一节点时使用的连接边"""
+    if abs(dx) >= abs(dy):
+        return "right" if dx > 0 else "left"
+    return "bottom" if dy > 0 else "top"
+
+
+def _ring_radius(count, inner=0):
+    """让count个节点在圆环上互不重叠的半径"""
+    if count == 0:
+        return inner
+    circumference = count * (NODE_WIDTH + RING_GAP)
+    minimum = max(FOCUS_WIDTH, NODE_WIDTH) / 2 + NODE_HEIGHT + RING_GAP
+    return max(circumference / (2 * math.pi), minimum, inner + NODE_HEIGHT + RING_GAP)
+
+
+def _ring_positions(count, radius, offset=0.0):
+    """节点中心坐标，从正上方开始顺时针均匀分布"""
+    for i in range(count):
+        angle = -math.pi / 2 + offset + 2 * math.pi * i / count
+        yield radius * math.cos(angle), radius * math.sin(angle)
+
+
+def build_map(index, date, focus_text="", max_nodes=MAX_NODES):
+    """
+    为指定日期生成知识图谱
+
+    参数:
+    - index: VaultIndex
+    - date: 日期 YYYY-MM-DD
+    - focus_text: course中的Focus内容
+    - max_nodes: 最多包含的卡片数
+
+    返回 {'canvas': {...}, 'stats': {...}}，canvas可直接写入map.canvas
+    """
+    started = time.perf_counter()
+    max_nodes = max(1, max_nodes)
+    index.refresh(["card"])
+
+    day_cards = index.list("card", date=date)
+    day_paths = [c["path"] for c in day_cards]
+    day_features = index.graph_features(day_paths)
+
+    # 候选：当天卡片 + 当天卡片链接到的、或标签相同的更早卡片
+    link_keys = {k for f in day_features.values() for k in f["links"]}
+    day_tags = {t for f in day_features.values() for t in f["tags"]}
+    terms = focus_terms(focus_text)
+    related = index.related_cards(link_keys, day_tags | terms, date, RELATED_LIMIT)
+    candidates = {c["path"]: c for c in related}
+    candidates.update((c["path"], c) for c in day_cards)
+
+    features = dict(day_features)
+    features.update(index.graph_features([p for p in candidates if p not in features]))
+
+    # tf-idf向量（文档频率过高的模板词权重为0）
+    total, doc_freq = index.term_doc_freq({t for f in features.values() for t in f["terms"]} | terms)
+    limit = max(2, total * MAX_DOC_RATIO)
+
+    def idf(term):
+        df = doc_freq.get(term, 0)
+        if df > limit:
+            return 0.0
+        return math.log((total + 1) / (df + 1)) + 1.0
+
+    vectors = {}
+    for path, f in features.items():
+        vectors[path] = {t: (1 + math.log(tf)) * idf(t) for t, tf in f["terms"].items() if idf(t) > 0}
+
+    def edge_between(a, b):
+        """(权重, 标签)；无关联时返回None"""
+        fa, fb = features[a], features[b]
+        if _stem(candidates[b]["name"]) in fa["links"] or _stem(candidates[a]["name"]) in fb["links"]:
+            return 3.0, "link"
+        shared_tags = sorted(set(fa["tags"]) & set(fb["tags"]))
+        similarity = _cosine(vectors[a], vectors[b])
+        if shared_tags:
+            return 1.5 + 0.5 * len(shared_tags) + similarity, " ".join(f"#{t}" for t in shared_tags[:3])
+        if similarity >= MIN_SIMILARITY:
+            common = sorted(set(vectors[a]) & set(vectors[b]), key=lambda t: -(vectors[a][t] + vectors[b][t]))
+            return similarity, common[0] if common else ""
+        return None
+
+    # 相关度：Focus词的tf-idf + 标签/标题命中
+    def relevance(path):
+        card, f = candidates[path], features[path]
+        vector = vectors[path]
+        score = sum(vector.get(t, 0.0) for t in terms)
+        score += 2.0 * len(terms & set(f["tags"]))
+        title_terms = set(tokenize(card["title"] or ""))
+        score += 1.0 * len(terms & title_terms)
+        return score
+
+    # 先按相关度/类型/时间粗排，只在前SHORTLIST_FACTOR*max_nodes张卡片之间计算连线
+    base = {}
+    for path, card in candidates.items():
+        recency = 0.5 ** (_days_between(card["date"], date) / RECENCY_HALF_LIFE)
+        if card["date"] != date:
+            # 其他日期的卡片只有与Focus或当天卡片相关时才值得放进来
+            recency *= 0.5
+        rel = relevance(path)
+        base[path] = ((1.0 + rel) * TYPE_WEIGHT.get(card["category"], 0.4) * recency, rel)
+    shortlist = sorted(candidates, key=lambda p: (-base[p][0], p))[:max_nodes * SHORTLIST_FACTOR]
+
+    edges = {}
+    for i, a in enumerate(shortlist):
+        for b in shortlist[i + 1:]:
+            pair = tuple(sorted((a, b)))
+            edge = edge_between(*pair)
+            if edge is not None:
+                edges[pair] = edge
+    degree = Counter()
+    for (a, b), (weight, _) in edges.items():
+        degree[a] += weight
+        degree[b] += weight
+    max_degree = max(degree.values(), default=0) or 1
+
+    scored = [(base[p][0] + 0.3 * degree[p] / max_degree, base[p][1], p) for p in shortlist]
+    # 分数相同按路径排序，保证结果确定
+    scored.sort(key=lambda s: (-s[0], s[2]))
+    selected = scored[:max_nodes]
+    chosen = {path for _, _, path in selected}
+
+    # 只保留每个节点最强的几条边
+    kept = {}
+    for path in chosen:
+        mine = [(w, pair) for pair, (w, _) in edges.items() if path in pair and set(pair) <= chosen]
+        for _, pair in sorted(mine, key=lambda e: (-e[0], e[1]))[:MAX_EDGES_PER_NODE]:
+            kept[pair] = edges[pair]
+
+    # 布局
+    focus_id = _node_id(f"focus:{date}")
+    nodes = [{
+        "id": focus_id,
+        "type": "text",
+        "text": f"## Focus {date}\n\n{focus_text.strip() or '(no focus)'}",
+        "x": -FOCUS_WIDTH // 2,
+        "y": -FOCUS_HEIGHT // 2,
+        "width": FOCUS_WIDTH,
+        "height": FOCUS_HEIGHT,
+        "color": FOCUS_COLOR,
+    }]
+    centers = {focus_id: (0.0, 0.0)}
+
+    inner = [s for s in selected if candidates[s[2]]["category"] == "insights"]
+    outer = [s for s in selected if candidates[s[2]]["category"] != "insights"]
+    if not inner:
+        inner, outer = outer, []
+    inner_radius = _ring_radius(len(inner))
+    rings = [(inner, inner_radius, 0.0)]
+    if outer:
+        rings.append((outer, _ring_radius(len(outer), inner_radius), math.pi / max(len(outer), 1)))
+
+    for ring, radius, offset in rings:
+        for (score, rel, path), (cx, cy) in zip(ring, _ring_positions(len(ring), radius, offset)):
+            node_id = _node_id(path)
+            centers[node_id] = (cx, cy)
+            nodes.append({
+                "id": node_id,
+                "type": "file",
+                "file": path,
+                "x": round(cx - NODE_WIDTH / 2),
+                "y": round(cy - NODE_HEIGHT / 2),
+                "width": NODE_WIDTH,
+                "height": NODE_HEIGHT,
+                "color": NODE_COLORS.get(candidates[path]["category"], "3"),
+            })
+
+    def make_edge(from_id, to_id, label):
+        (fx, fy), (tx, ty) = centers[from_id], centers[to_id]
+        edge = {
+            "id": _node_id(f"{from_id}->{to_id}"),
+            "fromNode": from_id,
+            "fromSide": _side(tx - fx, ty - fy),
+            "toNode": to_id,
+            "toSide": _side(fx - tx, fy - ty),
+        }
+        if label:
+            edge["label"] = label
+        return edge
+
+    canvas_edges = []
+    for score, rel, path in selected:
+        if rel > 0:
+            matched = sorted(terms & (set(vectors[path]) | set(features[path]["tags"])))
+            canvas_edges.append(make_edge(focus_id, _node_id(path), " ".join(matched[:3])))
+    for (a, b), (weight, label) in sorted(kept.items()):
+        canvas_edges.append(make_edge(_node_id(a), _node_id(b), label))
+
+    return {
+        "canvas": {"nodes": nodes, "edges": canvas_edges},
+        "stats": {
+            "date": date,
+            "candidates": len(candidates),
+            "day_cards": len(day_cards),
+            "nodes": len(selected),
+            "edges": len(canvas_edges),
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        },
+    }
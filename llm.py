@@ -0,0 +1,423 @@
+"""
+LLM providers - the model calls behind API mode
+
+config.json's api section selects a provider (supported_providers in
+config.example.json). "claude" (or "anthropic") is called through the
+Anthropic Messages API; "openai", "deepseek" and "custom" through the
+OpenAI-compatible chat completions API. Both are plain HTTPS requests over
+the standard library, so API mode needs no SDK.
+
+LLMClient adds what every caller would otherwise repeat:
+- connection pooling: keep-alive connections per host, reused across calls
+  and across the threads of complete_many()
+- fan-out: complete_many() sends several prompts concurrently (at most
+  `concurrency` in flight) and returns the results in order; identical
+  prompts in one batch are sent once
+- response cache: responses are stored on disk under the SHA-256 of the
+  request (provider, endpoint, model, prompt and sampling options), so
+  re-running @navigation or @course on the same inputs costs nothing.
+  Entries older than CACHE_DAYS are pruned
+- retry: connection errors, 408/429/5xx and Anthropic's 529 are retried
+  with exponential backoff and jitter, honouring Retry-After
+
+The API key is read from ANTHROPIC_API_KEY (claude) or OPENAI_API_KEY
+(others), falling back to api.api_key in config.json. benchmarks/mock_llm.py
+is an OpenAI-compatible stand-in server for running API mode offline.
+"""
+
+import contextvars
+import hashlib
+import http.client
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import instrumentation
+from vault_io import atomic_write
+
+DEFAULT_PROVIDER = "claude"
+DEFAULT_BASE_URLS = {
+    "claude": "https://api.anthropic.com",
+    "anthropic": "https://api.anthropic.com",
+    "openai": "https://api.openai.com/v1",
+    "deepseek": "https://api.deepseek.com/v1",
+}
+ANTHROPIC_PROVIDERS = ("claude", "anthropic")
+ANTHROPIC_VERSION = "2023-06-01"
+# config.example.json中的占位值，视为未配置
+PLACEHOLDER_KEY = "your-api-key-here"
+
+DEFAULT_MAX_TOKENS = 2048
+DEFAULT_TEMPERATURE = 0.3
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 120.0
+
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504, 529}
+
+CACHE_DAYS = 30
+# 缓存格式变化时递增
+CACHE_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    """模型调用失败（配置错误、不可重试的HTTP错误或重试耗尽）"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def _api_key(provider, api_config):
+    env = "ANTHROPIC_API_KEY" if provider in ANTHROPIC_PROVIDERS else "OPENAI_API_KEY"
+    key = os.environ.get(env) or api_config.get("api_key") or ""
+    return "" if key == PLACEHOLDER_KEY else key
+
+
+class ConnectionPool:
+    """
+    按 (scheme, host, port) 复用keep-alive连接（线程安全）
+
+    参数:
+    - timeout: 单次请求的超时（秒）
+    - max_idle: 每个主机最多保留的空闲连接数
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_idle=DEFAULT_CONCURRENCY):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def acquire(self, scheme, host, port):
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+            self.opened += 1
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout)
+
+    def release(self, scheme, host, port, conn):
+        """归还可复用的连接（超出max_idle时关闭）"""
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+class ResponseCache:
+    """
+    按请求内容的SHA-256存储响应：<目录>/<前2位>/<哈希>.json
+
+    参数:
+    - directory: 缓存目录（不存在时在首次写入时创建）
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._pruned = False
+
+    @staticmethod
+    def key(request):
+        canonical = json.dumps([CACHE_VERSION, request], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key, value):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(path, json.dumps(value, ensure_ascii=False))
+        if not self._pruned:
+            # 每个进程首次写入时清理一次过期条目
+            self._pruned = True
+            self.prune()
+
+    def prune(self, max_age_days=CACHE_DAYS):
+        """删除超过max_age_days天未更新的条目，返回删除数量"""
+        cutoff = time.time() - max_age_days * 86400
+        removed = 0
+        for path in self.directory.glob("*/*.json"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+class LLMClient:
+    """
+    调用config.json中配置的模型
+
+    参数:
+    - api_config: config.json的api部分
+    - cache_dir: 响应缓存目录（None表示不缓存）
+    - concurrency: complete_many()同时进行的请求数
+    - timeout / max_retries: 单次请求超时（秒）和最多重试次数
+    """
+
+    def __init__(self, api_config, cache_dir=None, concurrency=DEFAULT_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT, max_retries=MAX_RETRIES):
+        self.provider = (api_config.get("provider") or DEFAULT_PROVIDER).lower()
+        supported = api_config.get("supported_providers", {}).get(self.provider, {})
+        self.model = api_config.get("model") or supported.get("model")
+        base_url = api_config.get("base_url") or supported.get("base_url") or DEFAULT_BASE_URLS.get(self.provider)
+        if not self.model or not base_url:
+            raise LLMError(f"API配置不完整: provider={self.provider} 需要设置 model 和 base_url")
+        self.base_url = base_url.rstrip("/")
+        self.api_key = _api_key(self.provider, api_config)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+
+        parts = urlsplit(self.base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise LLMError(f"无效的base_url: {self.base_url}")
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port or (443 if parts.scheme == "https" else 80)
+        self._path = self._endpoint(parts.path.rstrip("/"))
+        self.pool = ConnectionPool(timeout=timeout, max_idle=self.concurrency)
+        self.cache = ResponseCache(cache_dir) if cache_dir is not None else None
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def _endpoint(self, base_path):
+        if self.provider in ANTHROPIC_PROVIDERS:
+            return f"{base_path}/messages" if base_path.endswith("/v1") else f"{base_path}/v1/messages"
+        return f"{base_path}/chat/completions"
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+
+    def _request(self, prompt, system, max_tokens, temperature):
+        """缓存键和请求体共用的请求描述"""
+        return {
+            "provider": self.provider,
+            "url": f"{self._host}:{self._port}{self._path}",
+            "model": self.model,
+            "system": system or "",
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+
+    def _body(self, request):
+        if self.provider in ANTHROPIC_PROVIDERS:
+            body = {
+                "model": request["model"],
+                "max_tokens": request["max_tokens"],
+                "temperature": request["temperature"],
+                "messages": [{"role": "user", "content": request["prompt"]}],
+            }
+            if request["system"]:
+                body["system"] = request["system"]
+            return body
+        messages = [{"role": "system", "content": request["system"]}] if request["system"] else []
+        messages.append({"role": "user", "content": request["prompt"]})
+        return {
+            "model": request["model"],
+            "max_tokens": request["max_tokens"],
+            "temperature": request["temperature"],
+            "messages": messages,
+        }
+
+    def _headers(self):
+        headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        if self.provider in ANTHROPIC_PROVIDERS:
+            headers["anthropic-version"] = ANTHROPIC_VERSION
+            if self.api_key:
+                headers["x-api-key"] = self.api_key
+        elif self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _parse(self, data):
+        """从响应中取出文本和用量"""
+        if self.provider in ANTHROPIC_PROVIDERS:
+            text = "".join(block.get("text", "") for block in data.get("content", []) if block.get("type") == "text")
+            usage = data.get("usage", {})
+            return text, {"input_tokens": usage.get("input_tokens"), "output_tokens": usage.get("output_tokens")}
+        choices = data.get("choices") or []
+        if not choices:
+            raise LLMError("响应中没有choices")
+        usage = data.get("usage", {})
+        text = (choices[0].get("message") or {}).get("content") or ""
+        return text, {"input_tokens": usage.get("prompt_tokens"), "output_tokens": usage.get("completion_tokens")}
+
+    def _post(self, payload):
+        """发送一次请求，返回 (状态码, 响应头, 响应体)；连接异常时抛出OSError/HTTPException"""
+        conn = self.pool.acquire(self._scheme, self._host, self._port)
+        try:
+            conn.request("POST", self._path, body=payload, headers=self._headers())
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self.pool.release(self._scheme, self._host, self._port, conn)
+        return response.status, response, body
+
+    @staticmethod
+    def _backoff(attempt, response=None):
+        """第attempt次重试前的等待时间（秒）：优先使用Retry-After"""
+        if response is not None:
+            try:
+                return min(float(response.getheader("Retry-After")), BACKOFF_MAX)
+            except (TypeError, ValueError):
+                pass
+        delay = min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX)
+        return delay * (0.5 + random.random() / 2)
+
+    def _send(self, request):
+        """发送请求（含重试），返回 (文本, 用量, 尝试次数)"""
+        payload = json.dumps(self._body(request), ensure_ascii=False).encode("utf-8")
+        attempt = 0
+        while True:
+            response = None
+            try:
+                status, response, body = self._post(payload)
+            except (OSError, http.client.HTTPException) as e:
+                status, error = None, f"连接失败: {e}"
+            else:
+                if 200 <= status < 300:
+                    try:
+                        data = json.loads(body)
+                    except ValueError:
+                        raise LLMError(f"响应不是有效的JSON（HTTP {status}）", status)
+                    text, usage = self._parse(data)
+                    return text, usage, attempt + 1
+                error = f"HTTP {status}: {body[:300].decode('utf-8', 'replace')}"
+                if status not in RETRY_STATUSES:
+                    raise LLMError(error, status)
+            if attempt >= self.max_retries:
+                raise LLMError(f"重试{self.max_retries}次后仍失败，{error}", status)
+            with self._lock:
+                self.retries += 1
+            time.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    def complete(self, prompt, system=None, max_tokens=DEFAULT_MAX_TOKENS,
+                 temperature=DEFAULT_TEMPERATURE, use_cache=True):
+        """
+        发送一条提示词
+        返回 {'text', 'model', 'usage', 'cached', 'attempts', 'took_ms'}
+        """
+        started = time.perf_counter()
+        request = self._request(prompt, system, max_tokens, temperature)
+        key = ResponseCache.key(request) if self.cache is not None else None
+        with instrumentation.span("llm"):
+            stored = self.cache.get(key) if key is not None and use_cache else None
+            if stored is not None:
+                with self._lock:
+                    self.cache_hits += 1
+                return {**stored, "cached": True, "attempts": 0,
+                        "took_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+            with self._lock:
+                self.requests += 1
+            try:
+                text, usage, attempts = self._send(request)
+            except LLMError:
+                with self._lock:
+                    self.errors += 1
+                raise
+            finally:
+                with self._lock:
+                    self.seconds += time.perf_counter() - started
+            result = {"text": text, "model": self.model, "usage": usage}
+            if key is not None:
+                try:
+                    self.cache.put(key, result)
+                except OSError as e:
+                    # 缓存写不进去（磁盘满、无权限）不影响已经拿到的回复
+                    logger.warning("LLM响应缓存写入失败: %s", e)
+        return {**result, "cached": False, "attempts": attempts,
+                "took_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    def complete_many(self, prompts, system=None, max_tokens=DEFAULT_MAX_TOKENS,
+                      temperature=DEFAULT_TEMPERATURE, use_cache=True, return_exceptions=False):
+        """
+        并发发送多条提示词（最多concurrency条同时进行），按输入顺序返回结果
+        相同的提示词只发送一次；return_exceptions=True时失败的条目返回LLMError而不是抛出
+        """
+        prompts = list(prompts)
+        unique = list(dict.fromkeys(prompts))
+
+        def run(prompt):
+            try:
+                return self.complete(prompt, system=system, max_tokens=max_tokens,
+                                     temperature=temperature, use_cache=use_cache)
+            except LLMError as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        if len(unique) <= 1:
+            results = [run(p) for p in unique]
+        else:
+            # 复制调用方的context，使请求耗时计入当前请求的"llm"阶段
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(unique)),
+                                    thread_name_prefix="llm") as pool:
+                futures = [pool.submit(contextvars.copy_context().run, run, p) for p in unique]
+                results = [f.result() for f in futures]
+        by_prompt = dict(zip(unique, results))
+        return [by_prompt[p] for p in prompts]
+
+    def stats(self):
+        """请求、缓存命中、重试和错误计数"""
+        with self._lock:
+            return {
+                "provider": self.provider,
+                "model": self.model,
+                "requests": self.requests,
+                "cache_hits": self.cache_hits,
+                "retries": self.retries,
+                "errors": self.errors,
+                "connections": self.pool.opened,
+                "seconds": round(self.seconds, 3),
+            }
+
+    def close(self):
+        self.pool.close()
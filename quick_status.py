@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Quick status - the fast `compass --status` path
+
+A CLI status call only needs a handful of fields from today's digest. The
+full path (CompassAssistant, the SQLite index, course parsing) costs tens of
+milliseconds of imports before any file is touched. This module answers from
+.status_cache instead. CompassAssistant.show_status() writes that file next
+to config.json.
+
+The cache also stores the vault settings from config.json and is keyed on
+config.json's mtime, so a hit parses no JSON. It is checked with the same
+stat signature digest.py uses: a few stat() calls, with no reads and no
+listing. It is stored with marshal, because json would pull in re, which
+costs more to import than everything else here. When the cache is missing or
+stale, the status is rebuilt through compass.py, which also refreshes the
+cache. Under `python -S` that means re-executing the interpreter without -S,
+since compass.py's dependencies live in site-packages.
+
+This module also holds the signature helpers shared with digest.py, so
+importing it must stay cheap: only builtin modules plus instrumentation.
+
+Usage: python quick_status.py   (bin/compass runs it for `compass` and `compass --status`)
+"""
+
+import marshal
+import os
+import sys
+from datetime import date as _date, timedelta
+
+import instrumentation
+
+# 与vault_index.CARD_TYPES一致（这里不导入vault_index，保持启动轻量）
+CARD_TYPES = ("insights", "fleeting")
+
+STATUS_CACHE_NAME = ".status_cache"
+
+# 快照中命令行状态需要的字段
+STATUS_FIELDS = ("has_courses", "yesterday_unfilled", "yesterday_course", "sounding_exists", "course_exists", "focus")
+
+
+def default_config_path():
+    """$COMPASS_CONFIG，其次为项目目录下的config.json"""
+    return os.environ.get("COMPASS_CONFIG") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+
+def stat_key(path):
+    """文件的(mtime_ns, size)，不存在时为None"""
+    instrumentation.record_stat()
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def course_names(navigation):
+    """navigation中的course文件名（倒序）"""
+    instrumentation.record_glob()
+    try:
+        names = [n for n in os.listdir(navigation) if n.endswith('course.md') and not n.startswith('.')]
+    except FileNotFoundError:
+        return []
+    return sorted(names, reverse=True)
+
+
+def latest_course(navigation, date):
+    """date当天或之前最新的course文件路径"""
+    for name in course_names(navigation):
+        if name[:10] <= date:
+            return os.path.join(navigation, name)
+    return None
+
+
+def source_paths(vault, folders, date):
+    """某天快照的来源文件和目录"""
+    yesterday = (_date.fromisoformat(date) - timedelta(days=1)).isoformat()
+    navigation = os.path.join(vault, folders['navigation'])
+    charts = os.path.join(vault, folders['charts'])
+    logbook_day = os.path.join(vault, folders['logbook'], date)
+    return {
+        'navigation': navigation,
+        'charts': charts,
+        'logbook_day': logbook_day,
+        'sounding': os.path.join(charts, f"{date}_sounding.md"),
+        'yesterday_course': os.path.join(navigation, f"{yesterday}_course.md"),
+        **{ct: os.path.join(logbook_day, ct) for ct in CARD_TYPES},
+    }
+
+
+def signature(paths, latest):
+    """来源文件的stat签名（任一文件新增、删除或修改都会改变签名）"""
+    sig = sorted((name, stat_key(path)) for name, path in paths.items())
+    sig.append(('latest_course', (os.path.basename(latest), stat_key(latest)) if latest else None))
+    return repr(sig)
+
+
+def render_status(date, obsidian_path, use_api, digest):
+    """命令行状态文本（digest至少包含STATUS_FIELDS）"""
+    lines = [
+        "",
+        "=" * 60,
+        "Knowledge Compass - 知识管理助手",
+        "=" * 60,
+        f"日期: {date}",
+        f"Obsidian路径: {obsidian_path}",
+        f"运行模式: {'API模式' if use_api else 'Claude Code模式'}",
+    ]
+
+    # 检查是否有任何course文档
+    if not digest['has_courses']:
+        lines += [
+            "",
+            "[首次使用提示]",
+            "   未找到任何course文档。",
+            "   运行 compass init 创建文件夹结构、模板和昨天日期的course模板。",
+            "   请打开 navigation/ 文件夹中的course文档，",
+            "   fill in your Goal (long-term goals) and Focus (current priorities), then",
+            "   再执行 @navigation 开始使用。",
+        ]
+
+    # 检查昨天的course是否存在且已填写
+    if digest['yesterday_unfilled']:
+        lines += [
+            "",
+            "[初始化未完成]",
+            f"   发现昨日course文档: {digest['yesterday_course']}",
+            "   But Goal and Focus are not filled in yet. Please complete them first.",
+        ]
+
+    lines += [
+        "",
+        "今日状态:",
+        f"   Sounding: {'已创建' if digest['sounding_exists'] else '未创建'}",
+        f"   Course: {'已创建' if digest['course_exists'] else '未创建'}",
+        "",
+        "当前Focus:",
+        digest['focus'] if digest['focus'] else "   未找到",
+        "",
+        "可用命令:",
+        "   @navigation - 生成今日sounding",
+        "   @insight - 探讨重点话题",
+        "   @fleeting - 探讨临时话题",
+        "   @card - 记录知识卡片",
+        "   @map - 生成知识图谱",
+        "   @harbor - 归档到长期知识库",
+        "   @analysis - 生成分析报告",
+        "   @course - 生成今日course文档",
+        "=" * 60,
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def cache_entry(config_path, config_mtime, config, date, sig, digest):
+    """写入.status_cache的内容（由CompassAssistant.show_status()写入）"""
+    return {
+        'config_path': os.path.abspath(config_path),
+        'config_mtime': config_mtime,
+        'vault': os.path.normpath(config['obsidian_path']),
+        'folders': dict(config['folders']),
+        'use_api': bool(config.get('api', {}).get('enabled', False)),
+        'date': date,
+        'signature': sig,
+        'latest_course_path': digest['latest_course_path'],
+        'status': {field: digest[field] for field in STATUS_FIELDS},
+    }
+
+
+def cache_file(config_path):
+    return os.path.join(os.path.dirname(os.path.abspath(config_path)), STATUS_CACHE_NAME)
+
+
+def load_cache(config_path):
+    try:
+        with open(cache_file(config_path), 'rb') as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def dump_cache(entry):
+    return marshal.dumps(entry)
+
+
+def cached_status(config_path, date=None):
+    """缓存仍然有效时返回状态文本，否则返回None"""
+    cache = load_cache(config_path)
+    if not isinstance(cache, dict):
+        return None
+    date = date or _date.today().isoformat()
+    try:
+        config_mtime = os.stat(config_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if (cache.get('config_path') != os.path.abspath(config_path) or cache.get('config_mtime') != config_mtime
+            or cache.get('date') != date):
+        return None
+
+    vault = cache['vault']
+    latest = cache['latest_course_path']
+    latest = os.path.join(vault, latest) if latest else None
+    if signature(source_paths(vault, cache['folders'], date), latest) != cache['signature']:
+        return None
+    return render_status(date, vault, cache['use_api'], cache['status'])
+
+
+def main():
+    text = cached_status(default_config_path())
+    if text is not None:
+        print(text)
+        return
+
+    # 缓存缺失或已过期（配置缺失时也走这里，由compass.py给出完整提示）
+    compass_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'compass.py')
+    if sys.flags.no_site:
+        # -S启动时没有site-packages，compass.py的依赖无法导入：换成正常的解释器重新执行
+        sys.stdout.flush()
+        os.execv(sys.executable, [sys.executable, compass_py, '--status'])
+    import compass
+    sys.argv = [compass_py, '--status']
+    compass.main()
+
+
+if __name__ == "__main__":
+    main()
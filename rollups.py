@@ -0,0 +1,129 @@
+"""
+Rollups - weekly and monthly digests of the course documents
+
+A rollup gathers the Today's Summary and What's Next sections of every course
+in one ISO week (2026-W41) or calendar month (2026-10), in date order, and
+renders them as one markdown document. Placeholder sections that were never
+filled in are left out.
+
+Rollups are stored in the vault index database together with their inputs:
+the path, mtime and size of each course file that fed them. update() groups
+the indexed courses by period and compares each group with the stored inputs,
+so only the periods where a course was added, edited or removed are rebuilt,
+and periods left without courses are dropped. The course sections come from
+the vault index, so an update reads no files.
+"""
+
+import json
+import time
+from datetime import date as Date, datetime, timedelta
+
+import instrumentation
+from vault_index import DATE_RE
+
+PERIOD_KINDS = ("week", "month")
+SECTIONS = (("summary", "Today's Summary"), ("next", "What's Next"))
+
+
+def period_of(kind, date):
+    """date所在的周期：(周期名, 开始日期, 结束日期)"""
+    day = datetime.strptime(date, "%Y-%m-%d").date()
+    if kind == "week":
+        year, week, weekday = day.isocalendar()
+        start = day - timedelta(days=weekday - 1)
+        return f"{year}-W{week:02d}", start.isoformat(), (start + timedelta(days=6)).isoformat()
+    if kind == "month":
+        start = day.replace(day=1)
+        following = Date(day.year + day.month // 12, day.month % 12 + 1, 1)
+        return f"{day.year}-{day.month:02d}", start.isoformat(), (following - timedelta(days=1)).isoformat()
+    raise ValueError(f"Unknown rollup kind: {kind}")
+
+
+def _is_placeholder(text):
+    """模板中的占位内容（如"[Auto-filled by the system]"）"""
+    return text.startswith("[") and text.endswith("]")
+
+
+def build_rollup(kind, period, start, end, entries):
+    """由一个周期内的course索引行（按日期排序）生成rollup"""
+    data = {
+        "kind": kind,
+        "period": period,
+        "start": start,
+        "end": end,
+        "courses": [e["date"] for e in entries],
+        "sources": [e["path"] for e in entries],
+    }
+    title = "Week" if kind == "week" else "Month"
+    parts = [f"# {title} {period} ({start} ~ {end})"]
+    for key, heading in SECTIONS:
+        items = []
+        for e in entries:
+            text = ((e["sections"] or {}).get(key) or "").strip()
+            if text and not _is_placeholder(text):
+                items.append({"date": e["date"], "text": text})
+        data[key] = items
+        parts.append(f"## {heading}")
+        parts.extend(f"### {item['date']}\n{item['text']}" for item in items)
+        if not items:
+            parts.append("-")
+    data["text"] = "\n\n".join(parts) + "\n"
+    return data
+
+
+class RollupEngine:
+    """
+    增量生成周/月rollup
+
+    参数:
+    - index: VaultIndex（course的sections需已解析）
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def update(self, kinds=PERIOD_KINDS):
+        """
+        重新生成输入发生变化的周期，删除已没有course的周期
+        返回 {'periods', 'recomputed', 'removed', 'took_ms'}（各类型合计）
+        """
+        started = time.perf_counter()
+        with instrumentation.span("rollups"):
+            # 文件名不以YYYY-MM-DD开头的course（如weekly_course.md）不属于任何周期
+            courses = [e for e in self.index.list("course") if e["date"] and DATE_RE.match(e["date"])]
+            stats = {"periods": 0, "recomputed": 0, "removed": 0}
+            for kind in kinds:
+                groups = {}
+                for entry in courses:
+                    groups.setdefault(period_of(kind, entry["date"]), []).append(entry)
+                stored = self.index.rollup_inputs(kind)
+                rows = []
+                for (period, start, end), entries in groups.items():
+                    entries.sort(key=lambda e: e["date"])
+                    inputs = json.dumps([[e["path"], e["mtime_ns"], e["size"]] for e in entries])
+                    if stored.get(period) != inputs:
+                        rows.append((period, start, end, inputs, build_rollup(kind, period, start, end, entries)))
+                current = {period for period, _, _ in groups}
+                removed = [period for period in stored if period not in current]
+                if rows or removed:
+                    self.index.put_rollups(kind, rows, removed)
+                stats["periods"] += len(groups)
+                stats["recomputed"] += len(rows)
+                stats["removed"] += len(removed)
+        return {**stats, "took_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    def list(self, kind, date_from=None, date_to=None, limit=None, update=True):
+        """与 [date_from, date_to] 有交集的rollup（新的在前，最多limit个）；update=True时先增量更新"""
+        if kind not in PERIOD_KINDS:
+            raise ValueError(f"Unknown rollup kind: {kind}")
+        if update:
+            self.update([kind])
+        return self.index.list_rollups(kind, date_from=date_from, date_to=date_to, limit=limit)
+
+    def get(self, kind, period, update=True):
+        """单个周期的rollup，不存在时返回None"""
+        if kind not in PERIOD_KINDS:
+            raise ValueError(f"Unknown rollup kind: {kind}")
+        if update:
+            self.update([kind])
+        return self.index.get_rollup(kind, period)
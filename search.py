@@ -0,0 +1,184 @@
+"""
+Full-text search over cards, soundings, courses and harbor files
+
+The inverted index itself lives in the vault index database (an SQLite FTS5
+table maintained by VaultIndex whenever it reads a file), so it is kept up to
+date by the same incremental refresh and write hooks. This module provides the
+pieces around it:
+
+- tokenize(): CJK-aware tokenization. Latin words and numbers become lowercase
+  terms; runs of Chinese/Japanese/Korean characters become overlapping
+  bigrams, so "英伟达芯片" is searchable without a word segmenter
+- build_match(): turns a user query into an FTS5 MATCH expression (CJK runs
+  become phrase queries over their bigrams)
+- extract_tags(): #tag extraction for tag filters
+- make_snippet(): a highlighted excerpt around the first matching term
+- search(): BM25-ranked query with kind, tag and date filters
+"""
+
+import re
+import time
+
+SEARCH_KINDS = ["card", "sounding", "course", "harbor"]
+
+# 生成摘要时最多读取的字节数（harbor长报告不必整篇读入）
+SNIPPET_MAX_BYTES = 256 * 1024
+
+# 标题权重高于正文
+TITLE_WEIGHT = 3.0
+BODY_WEIGHT = 1.0
+
+_CJK = (
+    "぀-ヿ"  # 日文假名
+    "㐀-䶿"  # CJK扩展A
+    "一-鿿"  # CJK统一汉字
+    "가-힯"  # 韩文
+    "豈-﫿"  # CJK兼容汉字
+)
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[^\W_{_CJK}]+", re.UNICODE)
+_CJK_RE = re.compile(rf"[{_CJK}]")
+_TAG_RE = re.compile(r"(?:^|(?<=[\s，,：:（(]))#([^\s#，,。；;：:、()（）\[\]]+)")
+
+
+def _is_cjk(run):
+    return bool(_CJK_RE.match(run))
+
+
+def _runs(text):
+    """按CJK/非CJK切分出的原始词串（小写）"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def tokenize(text):
+    """
+    把文本切分成索引词
+    - 英文/数字：按单词切分并转小写
+    - 中日韩文字：连续字符切成重叠的二元组（单字时保留单字）
+    """
+    tokens = []
+    for run in _runs(text):
+        if _is_cjk(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def count_cjk(text):
+    """文本中的中日韩字符数"""
+    return len(_CJK_RE.findall(text))
+
+
+def index_text(text):
+    """索引用的词串（空格分隔，交给FTS5的unicode61分词器）"""
+    return " ".join(tokenize(text))
+
+
+def query_terms(query):
+    """查询中的词（用于高亮），CJK连续字符保持整体"""
+    return [run for run in _runs(query) if run]
+
+
+def build_match(query):
+    """
+    把用户查询转换成FTS5 MATCH表达式
+    每个词都必须出现；CJK词串变成二元组短语，要求字符连续出现
+    """
+    clauses = []
+    for run in _runs(query):
+        if _is_cjk(run) and len(run) > 1:
+            grams = [run[i:i + 2] for i in range(len(run) - 1)]
+            clauses.append('"' + " ".join(grams) + '"')
+        else:
+            clauses.append('"' + run + '"')
+    return " ".join(clauses)
+
+
+def extract_tags(text):
+    """提取 #tag 标签（小写，去重，保持出现顺序）"""
+    seen = []
+    for tag in _TAG_RE.findall(text):
+        tag = tag.lower()
+        if tag not in seen:
+            seen.append(tag)
+    return seen
+
+
+def make_snippet(content, terms, width=160, pre="<mark>", post="</mark>"):
+    """
+    截取第一个匹配词附近的文本并高亮所有匹配词
+    找不到匹配时返回开头的一段
+    """
+    if not content:
+        return ""
+    lowered = content.lower()
+    positions = [lowered.find(t) for t in terms if t]
+    positions = [p for p in positions if p >= 0]
+    start = max(0, min(positions) - width // 3) if positions else 0
+    end = min(len(content), start + width)
+    excerpt = " ".join(content[start:end].split())
+    if terms:
+        pattern = re.compile("|".join(re.escape(t) for t in sorted(set(terms), key=len, reverse=True)), re.I)
+        excerpt = pattern.sub(lambda m: f"{pre}{m.group(0)}{post}", excerpt)
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if end < len(content) else ""
+    return f"{prefix}{excerpt}{suffix}"
+
+
+def search(index, query, kinds=None, tags=None, date_from=None, date_to=None,
+           limit=20, offset=0, highlight=("<mark>", "</mark>")):
+    """
+    BM25全文检索
+
+    参数:
+    - index: VaultIndex
+    - query: 查询文本（中英文均可）
+    - kinds: 限定文件类型（card/sounding/course/harbor）
+    - tags: 必须同时包含的标签列表（不含#）
+    - date_from / date_to: 日期范围（含边界）
+    - limit / offset: 分页
+    - highlight: 摘要中匹配词的前后标记
+
+    返回 {'query', 'total', 'took_ms', 'results': [...]}
+    """
+    started = time.perf_counter()
+    kinds = list(kinds) if kinds else SEARCH_KINDS
+    tags = [t.lower().lstrip("#") for t in (tags or []) if t.strip("# ")]
+    match = build_match(query)
+
+    if not match and not tags:
+        return {"query": query, "total": 0, "took_ms": 0.0, "results": []}
+
+    index.refresh(kinds)
+    rows, total = index.search_rows(
+        match, kinds, tags, date_from, date_to, limit, offset,
+        weights=(TITLE_WEIGHT, BODY_WEIGHT),
+    )
+
+    terms = query_terms(query)
+    pre, post = highlight
+    results = []
+    for row in rows:
+        content = index.read_text(row["path"], SNIPPET_MAX_BYTES)
+        results.append(
+            {
+                "path": row["path"],
+                "kind": row["kind"],
+                "name": row["name"],
+                "title": row["title"],
+                "date": row["date"],
+                "category": row["category"],
+                "score": round(row["score"], 4),
+                "snippet": make_snippet(content, terms, pre=pre, post=post),
+            }
+        )
+
+    return {
+        "query": query,
+        "total": total,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        "results": results,
+    }
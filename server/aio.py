@@ -0,0 +1,55 @@
+"""
+Async file access for the read endpoints.
+
+Blocking vault I/O (reading markdown, stat calls, vault index queries) runs on
+a dedicated, bounded thread pool instead of Starlette's shared threadpool, so
+async handlers can fan reads out concurrently while a slow or network-mounted
+vault can only ever tie up COMPASS_READ_WORKERS threads (default 8) and never
+starves the workers that serve other requests.
+"""
+
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, List, Optional
+
+import content_cache
+
+READ_WORKERS = int(os.environ.get("COMPASS_READ_WORKERS", "8"))
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="vault-read")
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_io(fn: Callable, *args, **kwargs):
+    """Run a blocking call on the read pool (in a copy of the caller's context, so
+    per-request instrumentation follows the work onto the pool)."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(get_pool(), partial(ctx.run, fn, *args, **kwargs))
+
+
+async def read_text(path) -> Optional[str]:
+    """Read a UTF-8 file on the read pool through the shared content cache;
+    None if it does not exist (like read_file)."""
+    return await run_io(content_cache.read, path)
+
+
+async def read_many(paths: Iterable) -> List[Optional[str]]:
+    """Read several files concurrently, preserving order."""
+    return list(await asyncio.gather(*(read_text(p) for p in paths)))
@@ -0,0 +1,191 @@
+"""
+Negotiated response compression for the API server.
+
+The list endpoints (/api/charts, /api/cards, /api/courses, /api/search)
+return whole markdown documents inside JSON, which compresses 4-8x. The
+CompressionMiddleware picks an encoding from the request's Accept-Encoding:
+zstd, then br, then gzip, honouring q-values. zstd and brotli are used only
+when their modules are installed (zstandard or Python 3.14's compression.zstd,
+and brotli); gzip is always available.
+
+Only complete bodies are compressed: the JSON endpoints send their body in a
+single message, while streamed responses (/api/events) pass through
+untouched. Raw file responses (?raw=true) are never compressed, whatever
+their size: they advertise Accept-Ranges and a Content-Disposition, and
+Range offsets must keep referring to the file's bytes. Bodies smaller than
+MIN_SIZE, non-2xx responses, 304s and types that are not text-like are sent
+as they are.
+
+The ETag is left unchanged. The compressed bytes are a content-coding of the
+same representation, so If-None-Match still revalidates and If-Match on
+writes keeps matching the ETag the client last saw, whatever encoding it
+was received in. Vary: Accept-Encoding keeps shared caches from mixing them.
+"""
+
+import gzip
+from typing import Callable, Dict, List, Optional, Tuple
+
+import instrumentation
+
+try:
+    from compression import zstd as _zstd  # Python 3.14+ (stdlib package)
+
+    def _zstd_compress(data: bytes) -> bytes:
+        return _zstd.compress(data, level=ZSTD_LEVEL)
+except ImportError:  # pragma: no cover - depends on the Python version and extras
+    try:
+        import zstandard as _zstd
+
+        def _zstd_compress(data: bytes) -> bytes:
+            return _zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    except ImportError:
+        _zstd_compress = None
+
+try:
+    import brotli as _brotli
+
+    def _brotli_compress(data: bytes) -> bytes:
+        return _brotli.compress(data, quality=BROTLI_QUALITY)
+except ImportError:  # pragma: no cover - depends on the installed extras
+    _brotli_compress = None
+
+# Bodies below this size gain little and cost a compressor call.
+MIN_SIZE = 1024
+
+# Fast levels: the server compresses on every request, nothing is stored.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def _gzip_compress(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def available_encodings() -> List[Tuple[str, Callable[[bytes], bytes]]]:
+    """Installed encoders in server preference order."""
+    encoders = []
+    if _zstd_compress is not None:
+        encoders.append(("zstd", _zstd_compress))
+    if _brotli_compress is not None:
+        encoders.append(("br", _brotli_compress))
+    encoders.append(("gzip", _gzip_compress))
+    return encoders
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Accept-Encoding as {coding: q}; malformed q-values count as 0."""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(header: Optional[str], encoders=None) -> Optional[Tuple[str, Callable[[bytes], bytes]]]:
+    """
+    Pick the encoder for an Accept-Encoding value: the highest q wins, ties
+    go to the server's order. Returns None for identity.
+    """
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for name, encoder in encoders or available_encodings():
+        q = accepted.get(name, wildcard)
+        if q > best_q:
+            best, best_q = (name, encoder), q
+    return best
+
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.endswith("+json")
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware; only buffers the first body message to decide."""
+
+    def __init__(self, app, minimum_size: int = MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoders = available_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                header = value.decode("latin-1")
+                break
+        chosen = negotiate(header, self.encoders)
+        if chosen is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Hold the start until the first body chunk shows what follows.
+                start = message
+                return
+
+            headers = list(start.get("headers", []))
+            names = {k.lower(): v for k, v in headers}
+            status = start["status"]
+            body = message.get("body", b"")
+            eligible = (
+                200 <= status < 300
+                and status not in (204, 206)
+                and not message.get("more_body", False)
+                and b"content-encoding" not in names
+                # File downloads: Range offsets refer to the uncompressed bytes.
+                and b"accept-ranges" not in names
+                and b"content-disposition" not in names
+                and len(body) >= self.minimum_size
+                and _is_compressible(names.get(b"content-type", b"").decode("latin-1"))
+            )
+            passthrough = True
+            if not eligible:
+                await send(start)
+                await send(message)
+                return
+
+            encoding, encoder = chosen
+            with instrumentation.span("compress"):
+                compressed = encoder(body)
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+            headers.append((b"content-encoding", encoding.encode()))
+            headers.append((b"content-length", str(len(compressed)).encode()))
+            vary = names.get(b"vary")
+            if vary is None:
+                headers.append((b"vary", b"Accept-Encoding"))
+            elif b"accept-encoding" not in vary.lower():
+                headers = [(k, v) for k, v in headers if k.lower() != b"vary"]
+                headers.append((b"vary", vary + b", Accept-Encoding"))
+            await send({**start, "headers": headers})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,363 @@
+"""
+Vault change notifications for the web UI.
+
+VaultWatcher watches the charts/logbook/harbor/navigation folders from a
+background thread, debounces raw filesystem events into batches, classifies
+every changed path (sounding, course, card, harbor, map) and hands the batch
+to an EventBroker, which fans it out to the /api/events Server-Sent Events
+streams.
+
+The watcher uses watchfiles (inotify on Linux; installed with
+uvicorn[standard]) when it is available and every watched folder exists. It
+polls otherwise, and switches to watchfiles once the missing folders have
+been created. Each poll
+- stats every directory and lists again only those whose mtime changed
+  (files added, removed or replaced by rename, which is how Compass writes)
+- re-stats the files modified within the last POLL_RECENT_SECONDS (at most
+  the POLL_RECENT_FILES latest), which catches in-place saves (Obsidian) of
+  the notes being worked on
+- re-stats up to POLL_SWEEP_FILES of the remaining files, taking the
+  directories in turn, so an in-place edit of an old note is seen within a
+  few polls without every poll stat()ing the whole vault
+"""
+
+import asyncio
+import heapq
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from vault_index import CARD_TYPES, DATE_RE, HARBOR_CATEGORIES
+
+try:
+    import watchfiles
+except ImportError:  # pragma: no cover - depends on the installed extras
+    watchfiles = None
+
+WATCHED_FOLDERS = ("charts", "logbook", "harbor", "navigation")
+
+# Files modified more recently than this are re-stat'ed on every poll.
+POLL_RECENT_SECONDS = 24 * 3600
+POLL_RECENT_FILES = 500
+# Other files re-stat'ed per poll by the rotating sweep.
+POLL_SWEEP_FILES = 2000
+
+
+def classify_change(vault_root: Path, folders: dict, path: str):
+    """
+    Describe a changed vault path as a typed notification payload, or return
+    None for paths the UI does not care about (temp files, other folders).
+    """
+    try:
+        rel = Path(path).relative_to(vault_root).as_posix()
+    except ValueError:
+        return None
+    parts = rel.split("/")
+    name = parts[-1]
+    if name.startswith(".") or not (name.endswith(".md") or name.endswith(".canvas")):
+        return None
+
+    top = parts[0]
+    info = {"path": rel}
+    if top == folders["charts"] and len(parts) == 2 and name.endswith("_sounding.md"):
+        info.update(type="sounding", date=name[: -len("_sounding.md")])
+    elif top == folders["navigation"] and len(parts) == 2 and name.endswith("course.md"):
+        info.update(type="course", date=name[: -len("course.md")].rstrip("_"))
+    elif top == folders["harbor"] and len(parts) == 3 and parts[1] in HARBOR_CATEGORIES:
+        info.update(type="harbor", category=parts[1])
+    elif top == folders["logbook"] and len(parts) >= 3 and DATE_RE.match(parts[1]):
+        if len(parts) == 3 and name == "map.canvas":
+            info.update(type="map", date=parts[1])
+        elif len(parts) == 4 and parts[2] in CARD_TYPES and name.endswith(".md"):
+            info.update(type="card", date=parts[1], category=parts[2])
+        else:
+            return None
+    else:
+        return None
+    return info
+
+
+class EventBroker:
+    """
+    Fan-out of change batches to connected SSE clients.
+
+    publish() is thread-safe: the watcher thread hands batches over to the
+    event loop, which puts them on every subscriber's queue. A client that
+    falls more than `max_queue` batches behind gets a single "resync" event
+    instead, telling it to refetch everything.
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._loop = None
+        self._subscribers: set = set()
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def publish(self, changes: list) -> None:
+        if self._loop is None or self._loop.is_closed() or not changes:
+            return
+        self._loop.call_soon_threadsafe(self._deliver, changes)
+
+    def _deliver(self, changes: list) -> None:
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(changes)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait([{"type": "resync"}])
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class VaultWatcher:
+    """
+    Background watcher over the vault folders.
+
+    Raw events are coalesced per path within `debounce` seconds (last action
+    wins), classified with classify_change() and passed to `on_changes` as a
+    list of payloads such as
+    {"type": "card", "action": "added", "date": "...", "category": "insights", "path": "..."}.
+    """
+
+    def __init__(self, vault_root, folders: dict, on_changes, debounce: float = 0.3,
+                 poll_interval: float = 2.0, force_polling: bool = False):
+        self.vault_root = Path(vault_root)
+        self.folders = dict(folders)
+        self.on_changes = on_changes
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.native = not force_polling and watchfiles is not None
+        # Backend in use right now (polling until every watched folder exists).
+        self.use_polling = not self.native or not self._roots_exist()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def roots(self) -> list:
+        return [self.vault_root / self.folders[f] for f in WATCHED_FOLDERS]
+
+    def _roots_exist(self) -> bool:
+        return all(r.is_dir() for r in self.roots)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="vault-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _emit(self, raw: dict) -> None:
+        """raw: {absolute path: "added" | "modified" | "deleted"}"""
+        changes = []
+        for path, action in sorted(raw.items()):
+            info = classify_change(self.vault_root, self.folders, path)
+            if info is not None:
+                info["action"] = action
+                changes.append(info)
+        if changes:
+            self.on_changes(changes)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            # watchfiles cannot watch folders that do not exist yet; polling
+            # picks them up, and hands over once they all exist.
+            self.use_polling = not self.native or not self._roots_exist()
+            if self.use_polling:
+                self._run_polling()
+                continue
+            try:
+                self._run_watchfiles()
+            except FileNotFoundError:
+                pass  # a folder was removed between the check and the watch
+            # The watch only ends early when it fails: check the folders again.
+            self._stop.wait(self.poll_interval)
+
+    # ------------------------------------------------------------------
+    # watchfiles backend
+    # ------------------------------------------------------------------
+
+    def _run_watchfiles(self) -> None:
+        actions = {
+            watchfiles.Change.added: "added",
+            watchfiles.Change.modified: "modified",
+            watchfiles.Change.deleted: "deleted",
+        }
+        for batch in watchfiles.watch(
+            *(str(r) for r in self.roots),
+            debounce=int(self.debounce * 1000),
+            stop_event=self._stop,
+            yield_on_timeout=False,
+            raise_interrupt=False,
+        ):
+            self._emit({path: actions[change] for change, path in batch})
+
+    # ------------------------------------------------------------------
+    # polling backend
+    # ------------------------------------------------------------------
+
+    def _run_polling(self) -> None:
+        """Poll until stopped, or (native backend) until every watched folder exists."""
+        poller = _Poller(self.roots)
+        poller.poll(None)
+        while not self._stop.wait(self.poll_interval):
+            raw: dict = {}
+            poller.poll(raw)
+            if raw:
+                # Let a burst of writes settle before reporting it.
+                time.sleep(self.debounce)
+                self._emit(raw)
+            if self.native and self._roots_exist():
+                return
+
+
+class _Poller:
+    """
+    Polling state: {dir: (mtime_ns, {file: (mtime_ns, size)}, subdirs)} for
+    every directory under the roots, plus the recently modified files and the
+    directories left in the current sweep (see the module docstring).
+    """
+
+    def __init__(self, roots, sweep_files: int = POLL_SWEEP_FILES,
+                 recent_seconds: float = POLL_RECENT_SECONDS):
+        self.roots = [str(r) for r in roots]
+        self.sweep_files = sweep_files
+        self.recent_seconds = recent_seconds
+        self.dirs: dict = {}
+        self.recent: dict = {}  # path -> mtime_ns
+        self._sweep: list = []
+
+    def poll(self, raw) -> None:
+        """Record changes since the previous poll in `raw` (None for the initial scan)."""
+        recent_since = time.time_ns() - int(self.recent_seconds * 1e9)
+        for root in self.roots:
+            if root not in self.dirs and os.path.isdir(root):
+                self._scan(root, raw, recent_since)
+        for directory in list(self.dirs):
+            if directory not in self.dirs:
+                continue  # dropped together with its parent
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                self._drop(directory, raw)
+                continue
+            if mtime != self.dirs[directory][0]:
+                self._scan(directory, raw, recent_since)
+        if len(self.recent) > POLL_RECENT_FILES:
+            latest = heapq.nlargest(POLL_RECENT_FILES, self.recent.items(), key=lambda item: item[1])
+            self.recent = dict(latest)
+        if raw is None:
+            return
+
+        for path in list(self.recent):
+            self._restat(path, raw, recent_since)
+        budget = self.sweep_files
+        while budget > 0:
+            if not self._sweep:
+                self._sweep = list(self.dirs)
+                if not self._sweep:
+                    break
+            directory = self._sweep.pop()
+            if directory not in self.dirs:
+                continue
+            files = list(self.dirs[directory][1])
+            budget -= len(files) or 1
+            for path in files:
+                self._restat(path, raw, recent_since)
+            if not self._sweep:
+                break  # one full pass per poll at most
+
+    def _note(self, path: str, sig: tuple, recent_since: int) -> None:
+        if sig[0] >= recent_since:
+            self.recent[path] = sig[0]
+        else:
+            self.recent.pop(path, None)
+
+    def _restat(self, path: str, raw: dict, recent_since: int) -> None:
+        """Check one known file for an in-place change."""
+        entry = self.dirs.get(os.path.dirname(path))
+        if entry is None or path not in entry[1]:
+            self.recent.pop(path, None)
+            return
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return  # its directory's mtime changed too; the next poll re-lists it
+        sig = (st.st_mtime_ns, st.st_size)
+        if sig != entry[1][path]:
+            entry[1][path] = sig
+            raw.setdefault(path, "modified")
+        self._note(path, sig, recent_since)
+
+    def _scan(self, directory: str, raw, recent_since: int) -> None:
+        """
+        List one directory, recording file changes against the previous
+        listing in `raw` (None for the initial scan). New subdirectories are
+        scanned in full.
+        """
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except (FileNotFoundError, NotADirectoryError):
+            self._drop(directory, raw)
+            return
+        files, subdirs = {}, set()
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.add(entry.path)
+                elif entry.is_file():
+                    st = entry.stat()
+                    files[entry.path] = (st.st_mtime_ns, st.st_size)
+                    self._note(entry.path, files[entry.path], recent_since)
+            except FileNotFoundError:
+                continue
+        _, old_files, old_subdirs = self.dirs.get(directory, (None, {}, set()))
+        if raw is not None:
+            for path, sig in files.items():
+                old = old_files.get(path)
+                if old is None:
+                    raw[path] = "added"
+                elif old != sig:
+                    raw[path] = "modified"
+            for path in old_files.keys() - files.keys():
+                raw[path] = "deleted"
+        for path in old_files.keys() - files.keys():
+            self.recent.pop(path, None)
+        self.dirs[directory] = (mtime, files, subdirs)
+        for sub in old_subdirs - subdirs:
+            self._drop(sub, raw)
+        for sub in subdirs - old_subdirs:
+            self._scan(sub, raw, recent_since)
+
+    def _drop(self, directory: str, raw) -> None:
+        """Forget a removed directory and everything below it."""
+        entry = self.dirs.pop(directory, None)
+        if entry is None:
+            return
+        _, files, subdirs = entry
+        for path in files:
+            self.recent.pop(path, None)
+        if raw is not None:
+            for path in files:
+                raw[path] = "deleted"
+        for sub in subdirs:
+            self._drop(sub, raw)
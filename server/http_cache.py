@@ -0,0 +1,151 @@
+"""
+Conditional GET support (ETag / Last-Modified) for the read endpoints.
+
+Single-file endpoints derive a strong ETag from the file's mtime and size and
+also send Last-Modified; list endpoints hash the (path, mtime, size) of every
+vault file that feeds the response and send only the ETag, because a deletion
+does not move the newest mtime and If-Modified-Since would miss it. Each ETag
+also carries a representation tag so that, e.g., the JSON and raw forms of
+the same file never share a validator.
+
+Single-file endpoints also have a raw form (cached_file) that streams the
+file from disk in chunks with Range support, so large documents are served
+with constant memory instead of being decoded and JSON-encoded.
+
+Writes use the same validators for optimistic concurrency: a client sends the
+ETag it last saw in If-Match and gets 412 if the file changed in between.
+
+Responses are sent with "Cache-Control: no-cache": browsers and proxies may
+store them but must revalidate, which costs a 304 with no body when nothing
+changed.
+"""
+
+import hashlib
+from pathlib import Path
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Awaitable, Callable, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+
+import instrumentation
+
+CACHE_CONTROL = "no-cache"
+
+
+def etag_for_stat(st, variant: str) -> str:
+    """Strong ETag for one file, from its mtime and size."""
+    return f'"{variant}-{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def etag_for_entries(entries: Iterable[dict], variant: str, *extra) -> str:
+    """Aggregate ETag for a list built from vault index entries."""
+    digest = hashlib.sha1(variant.encode())
+    for value in extra:
+        digest.update(f"|{value}".encode())
+    for entry in entries:
+        digest.update(f"\n{entry['path']}\0{entry['mtime_ns']}\0{entry['size']}".encode())
+    return f'"{variant}-{digest.hexdigest()[:20]}"'
+
+
+def http_date(mtime_ns: int) -> str:
+    return formatdate(mtime_ns / 1e9, usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison function (RFC 9110 13.1.2).
+    if header.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: str, mtime_ns: Optional[int]) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since when absent."""
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return _etag_matches(inm, etag)
+    ims = request.headers.get("if-modified-since")
+    if ims and mtime_ns is not None:
+        try:
+            since = parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime_ns // 1_000_000_000) <= int(since)
+    return False
+
+
+def precondition_failed(request: Request, etag: Optional[str]) -> bool:
+    """
+    Evaluate If-Match for a write (RFC 9110 13.1.1, strong comparison).
+    A missing header always passes; "*" passes when the file exists.
+    """
+    header = request.headers.get("if-match")
+    if header is None:
+        return False
+    if etag is None:
+        return True
+    if header.strip() == "*":
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return etag not in candidates
+
+
+def validator_headers(etag: str, mtime_ns: Optional[int]) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if mtime_ns is not None:
+        headers["Last-Modified"] = http_date(mtime_ns)
+    return headers
+
+
+def cached_json(request: Request, etag: str, mtime_ns: Optional[int], build: Callable[[], dict]) -> Response:
+    """
+    Return 304 if the client's validators still match, otherwise call
+    `build` (so file reads are skipped on a hit) and send it as JSON.
+    """
+    headers = validator_headers(etag, mtime_ns)
+    if is_not_modified(request, etag, mtime_ns):
+        return Response(status_code=304, headers=headers)
+    content = build()
+    with instrumentation.span("encode"):
+        return JSONResponse(content, headers=headers)
+
+
+async def cached_json_async(
+    request: Request, etag: str, mtime_ns: Optional[int], build: Callable[[], Awaitable[dict]]
+) -> Response:
+    """cached_json() for async handlers: `build` is a coroutine function."""
+    headers = validator_headers(etag, mtime_ns)
+    if is_not_modified(request, etag, mtime_ns):
+        return Response(status_code=304, headers=headers)
+    content = await build()
+    with instrumentation.span("encode"):
+        return JSONResponse(content, headers=headers)
+
+
+MARKDOWN_MEDIA_TYPE = "text/markdown; charset=utf-8"
+
+
+def cached_file(request: Request, path, st, variant: str, media_type: str = MARKDOWN_MEDIA_TYPE) -> Response:
+    """
+    Serve a file's bytes directly: 304 on a validator match, otherwise a
+    streamed FileResponse, which answers Range / If-Range with 206.
+    """
+    etag = etag_for_stat(st, variant)
+    headers = validator_headers(etag, st.st_mtime_ns)
+    if is_not_modified(request, etag, st.st_mtime_ns):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        path,
+        stat_result=st,
+        media_type=media_type,
+        headers=headers,
+        filename=Path(path).name,
+        content_disposition_type="inline",
+    )
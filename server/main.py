@@ -4,39 +4,143 @@ Reads Obsidian markdown files via compass.py logic.
 Run: uvicorn main:app --reload
 """
 
+import os
+import re
 import sys
 import json
-import re
+import stat
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 from datetime import datetime
+from types import SimpleNamespace
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 # Add project root to path so we can import compass.py
 ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from vault_index import CARD_TYPES, HARBOR_CATEGORIES, TERM_KINDS  # noqa: E402
+from similarity import DEFAULT_K, MAX_K  # noqa: E402
+from context_pack import DEFAULT_BUDGET, MAX_BUDGET, MIN_BUDGET  # noqa: E402
+from rollups import PERIOD_KINDS, RollupEngine  # noqa: E402
+from events import EventBroker, VaultWatcher, format_sse  # noqa: E402
+from http_cache import (  # noqa: E402
+    cached_file, cached_json, cached_json_async, etag_for_entries, etag_for_stat, precondition_failed,
+)
+from aio import read_many, read_text, run_io, shutdown_pool  # noqa: E402
+from content_encoding import CompressionMiddleware  # noqa: E402
+from course_doc import load_course  # noqa: E402
+from vault_io import file_lock  # noqa: E402
+import card_import  # noqa: E402
+import instrumentation  # noqa: E402
+from metrics import (  # noqa: E402
+    PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, TimedJSONResponse, registry as metrics_registry,
+)
+
+# Same lookup as CompassAssistant: $COMPASS_CONFIG, else the project config.json.
+CONFIG_PATH = Path(os.environ.get("COMPASS_CONFIG") or ROOT / "config.json")
+
+# Process-wide assistant shared by every request. Created once in the app
+# lifespan (folder/template bootstrap runs there) and kept in sync with
+# config.json by mtime on each get_compass() call.
+_compass = None
+_compass_lock = threading.Lock()
+
+# Vault watcher feeding the /api/events stream; restarted when the vault moves.
+broker = EventBroker()
+_watcher: Optional[VaultWatcher] = None
+
+SSE_HEARTBEAT_SECONDS = 15
 
-CONFIG_PATH = ROOT / "config.json"
 
-app = FastAPI(title="Knowledge Compass API", version="1.0.0")
+def _build_compass():
+    from compass import CompassAssistant
+    started = time.perf_counter()
+    with instrumentation.span("compass_init"):
+        compass = CompassAssistant(CONFIG_PATH)
+    metrics_registry.record_build(time.perf_counter() - started)
+    return compass
+
+
+def _on_vault_changes(changes: list) -> None:
+    """Keep the index in step with edits made outside the API, then notify clients."""
+    compass = _compass
+    if compass is not None:
+        for change in changes:
+            if change["type"] != "map":
+                compass.index.touch(compass.obsidian_path / change["path"])
+    broker.publish(changes)
+
+
+def _restart_watcher() -> None:
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
+    if _compass is not None:
+        _watcher = VaultWatcher(_compass.obsidian_path, _compass.config["folders"], _on_vault_changes)
+        _watcher.start()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _compass
+    broker.bind(asyncio.get_running_loop())
+    try:
+        _compass = _build_compass()
+    except Exception:
+        # Missing or broken config: get_compass() retries and reports the error.
+        _compass = None
+    _restart_watcher()
+    yield
+    if _watcher is not None:
+        _watcher.stop()
+    shutdown_pool()
+    _compass = None
+
+
+app = FastAPI(
+    title="Knowledge Compass API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=TimedJSONResponse,
+)
 
+# Innermost, so CORS and Server-Timing headers are added to the compressed response.
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://localhost:3001"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag"],
 )
+# Outermost, so the recorded latency covers every other middleware.
+app.add_middleware(MetricsMiddleware)
 
 
 def get_compass():
-    """Return a fresh CompassAssistant instance."""
+    """Return the shared CompassAssistant, reloading config.json if it changed."""
+    global _compass
     try:
-        from compass import CompassAssistant
-        return CompassAssistant()
+        with instrumentation.span("compass"), _compass_lock:
+            if _compass is None:
+                _compass = _build_compass()
+                _restart_watcher()
+            elif _compass.reload_config_if_changed():
+                _restart_watcher()
+            return _compass
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
@@ -53,6 +157,16 @@ def load_config():
         return json.load(f)
 
 
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+@app.get("/api/metrics")
+def get_metrics():
+    """Prometheus text exposition of this process's request metrics."""
+    return PlainTextResponse(metrics_registry.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 # ---------------------------------------------------------------------------
 # Config / User
 # ---------------------------------------------------------------------------
@@ -72,6 +186,42 @@ def get_user_config():
     }
 
 
+# ---------------------------------------------------------------------------
+# Events (Server-Sent Events)
+# ---------------------------------------------------------------------------
+
+@app.get("/api/events")
+async def vault_events(request: Request):
+    """
+    Stream vault changes as Server-Sent Events. Each event is named after the
+    kind of file that changed (sounding, course, card, harbor, map) and
+    carries {type, action, path, date?, category?}; "resync" means the client
+    fell behind and should refetch everything.
+    """
+    queue = broker.subscribe()
+
+    async def stream():
+        try:
+            mode = "polling" if _watcher is None or _watcher.use_polling else "native"
+            yield format_sse("ready", {"watcher": mode})
+            while not await request.is_disconnected():
+                try:
+                    changes = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                for change in changes:
+                    yield format_sse(change["type"], change)
+        finally:
+            broker.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ---------------------------------------------------------------------------
 # Status
 # ---------------------------------------------------------------------------
@@ -86,29 +236,36 @@ def get_status():
 # Today
 # ---------------------------------------------------------------------------
 
-@app.get("/api/today")
-def get_today():
-    compass = get_compass()
-    context = compass.get_context_info()
-    today_cards = compass.get_today_cards()
+def _course_etag(path: Path) -> Optional[str]:
+    try:
+        return etag_for_stat(path.stat(), "course")
+    except FileNotFoundError:
+        return None
 
-    sounding_path = compass.charts / f"{compass.today}_sounding.md"
-    sounding_content = compass.read_file(sounding_path)
 
-    course = compass.get_latest_course()
-    parsed = compass.parse_course(course)
+@app.get("/api/today")
+async def get_today():
+    """Served from the daily digest: a few stat() calls unless a source file changed."""
+    compass = await run_io(get_compass)
+    digest = await run_io(compass.get_digest)
+    version = digest["latest_course_version"]
+    course_etag = (
+        etag_for_stat(SimpleNamespace(st_mtime_ns=version[0], st_size=version[1]), "course")
+        if version else None
+    )
 
     return {
-        "date": compass.today,
-        "task": parsed.get("task", "").strip(),
-        "focus": parsed.get("focus", "").strip(),
-        "note": parsed.get("note", "").strip(),
-        "sounding": sounding_content,
-        "sounding_exists": context["sounding_exists"],
-        "course_exists": context["course_exists"],
+        "date": digest["date"],
+        "task": digest["task"],
+        "focus": digest["focus"],
+        "note": digest["note"],
+        "course_etag": course_etag,
+        "sounding": digest["sounding"],
+        "sounding_exists": digest["sounding_exists"],
+        "course_exists": digest["course_exists"],
         "cards": {
-            "insights": [p.name for p in today_cards["insights"]],
-            "fleeting": [p.name for p in today_cards["fleeting"]],
+            "insights": digest["cards"]["insights"],
+            "fleeting": digest["cards"]["fleeting"],
         },
     }
 
@@ -118,84 +275,122 @@ def get_today():
 # ---------------------------------------------------------------------------
 
 class UpdateTodayRequest(BaseModel):
-    field: str   # "goal" or "focus"
+    field: str   # "task" (alias "goal") or "focus"
     value: str
 
 
-def _update_course_section(content: str, section: str, new_value: str) -> str:
-    """Replace the text under a ## Section header in a course file."""
-    header_map = {"goal": "## Goal", "focus": "## Focus"}
-    header = header_map.get(section)
-    if not header:
-        raise ValueError(f"Unknown section: {section}")
-
-    lines = content.split("\n")
-    result = []
-    in_section = False
-    replaced = False
-
-    for line in lines:
-        if line.strip().startswith("##"):
-            if line.strip() == header or line.strip().startswith(header + " "):
-                in_section = True
-                result.append(line)
-                continue
-            else:
-                if in_section and not replaced:
-                    result.append(new_value.strip())
-                    replaced = True
-                in_section = False
-        elif in_section and line.strip() == "---":
-            if not replaced:
-                result.append(new_value.strip())
-                replaced = True
-            in_section = False
-
-        if not in_section or not (in_section and not replaced):
-            result.append(line)
-
-    if in_section and not replaced:
-        result.append(new_value.strip())
-
-    return "\n".join(result)
+# PATCH field name -> course section key
+UPDATABLE_FIELDS = {"task": "task", "goal": "task", "focus": "focus"}
 
 
 @app.patch("/api/today")
-def update_today(req: UpdateTodayRequest):
-    if req.field not in ("task", "focus"):
-        raise HTTPException(status_code=400, detail="field must be 'task' or 'focus'")
+def update_today(req: UpdateTodayRequest, request: Request):
+    """
+    Replace the Goal or Focus section of the latest course.
+
+    Send the course_etag from GET /api/today (or the ETag of
+    /api/courses/{date}) as If-Match; if the file changed since, the update is
+    refused with 412 instead of silently overwriting the other edit.
+    """
+    section = UPDATABLE_FIELDS.get(req.field)
+    if section is None:
+        raise HTTPException(status_code=400, detail="field must be 'task' (or 'goal') or 'focus'")
     compass = get_compass()
     course_path = compass.get_latest_course_path()
-    if not course_path or not course_path.exists():
+    if course_path is None:
         raise HTTPException(status_code=404, detail="No course file found")
-    content = course_path.read_text(encoding="utf-8")
-    updated = _update_course_section(content, req.field, req.value)
-    course_path.write_text(updated, encoding="utf-8")
-    return {"ok": True}
+
+    with file_lock(course_path):
+        current = _course_etag(course_path)
+        if precondition_failed(request, current):
+            raise HTTPException(
+                status_code=412,
+                detail="Course was modified since it was loaded",
+                headers={"ETag": current} if current else None,
+            )
+        doc = load_course(course_path)
+        if doc is None:
+            raise HTTPException(status_code=404, detail="No course file found")
+        try:
+            updated = doc.replace_section(section, req.value)
+        except KeyError:
+            raise HTTPException(status_code=422, detail=f"Course file has no {req.field} section")
+        compass.write_file(course_path, updated)
+        etag = _course_etag(course_path)
+
+    return JSONResponse({"ok": True, "etag": etag}, headers={"ETag": etag})
 
 
 # ---------------------------------------------------------------------------
 # Cards
 # ---------------------------------------------------------------------------
 
+def _month_range(year: Optional[int], month: Optional[int]) -> tuple:
+    """(first, last) date of ?year= / ?year=&month=, or (None, None)."""
+    if year is None:
+        if month is not None:
+            raise HTTPException(status_code=400, detail="month requires year")
+        return None, None
+    if not 1 <= year <= 9999 or (month is not None and not 1 <= month <= 12):
+        raise HTTPException(status_code=400, detail="year must be 1-9999 and month 1-12")
+    if month is None:
+        return f"{year:04d}-01-01", f"{year:04d}-12-31"
+    return f"{year:04d}-{month:02d}-01", f"{year:04d}-{month:02d}-31"
+
+
+def _card_day(day: dict) -> dict:
+    return {
+        "date": day["date"],
+        "insights": day["insights"],
+        "fleeting": day["fleeting"],
+        "total": day["insights"] + day["fleeting"],
+        "last_modified": datetime.fromtimestamp(day["mtime_ns"] / 1e9).isoformat(timespec="seconds"),
+        "tags": day["tags"],
+    }
+
+
 @app.get("/api/cards/dates")
-def get_card_dates():
+def get_card_dates(
+    request: Request,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    counts: bool = False,
+):
+    """
+    Dates that have cards, newest first, served from the per-day card
+    manifest (see VaultIndex.card_days). ?year= / ?month= and
+    ?from_date= / ?to_date= narrow the range. With ?counts=true each day also
+    carries its per-type counts, last modification time and tag counts
+    (calendar heatmaps), plus totals for the whole range.
+    """
+    _validate_date(from_date, "from_date")
+    _validate_date(to_date, "to_date")
+    first, last = _month_range(year, month)
+    date_from = max(filter(None, (first, from_date)), default=None)
+    date_to = min(filter(None, (last, to_date)), default=None)
+
     compass = get_compass()
-    dates = []
-    if compass.logbook.exists():
-        for day_dir in sorted(compass.logbook.iterdir(), reverse=True):
-            if day_dir.is_dir() and re.match(r"\d{4}-\d{2}-\d{2}", day_dir.name):
-                for ct in ["insights", "fleeting"]:
-                    ct_dir = day_dir / ct
-                    if ct_dir.exists() and list(ct_dir.glob("*.md")):
-                        dates.append(day_dir.name)
-                        break
-    return {"dates": dates}
+    days, total, mtime_sum, tag_chars = compass.index.card_days_fingerprint()
+    etag = f'"card-dates-{days:x}-{total:x}-{mtime_sum:x}-{tag_chars:x}-{date_from}-{date_to}-{int(counts)}"'
+
+    def build():
+        manifest = compass.index.card_days(date_from, date_to)
+        result = {"dates": [day["date"] for day in manifest]}
+        if counts:
+            result["days"] = [_card_day(day) for day in manifest]
+            insights = sum(day["insights"] for day in manifest)
+            fleeting = sum(day["fleeting"] for day in manifest)
+            result["totals"] = {"insights": insights, "fleeting": fleeting, "total": insights + fleeting}
+        return result
+
+    return cached_json(request, etag, None, build)
 
 
 @app.get("/api/cards")
-def get_cards(date: Optional[str] = None, type: Optional[str] = None):
-    compass = get_compass()
+async def get_cards(request: Request, date: Optional[str] = None, type: Optional[str] = None):
+    compass = await run_io(get_compass)
     if date is None:
         date = compass.today
     try:
@@ -203,26 +398,31 @@ def get_cards(date: Optional[str] = None, type: Optional[str] = None):
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
 
-    day_log = compass.logbook / date
-    cards = []
     card_types = ["insights", "fleeting"] if type is None else [type]
+    entries = [
+        entry
+        for ct in card_types
+        for entry in await run_io(compass.index.list, "card", category=ct, date=date, descending=True)
+    ]
+
+    async def build():
+        contents = await read_many(compass.obsidian_path / e["path"] for e in entries)
+        cards = []
+        for entry, content in zip(entries, contents):
+            content = content or ""
+            cards.append(
+                {
+                    "name": Path(entry["name"]).stem,
+                    "filename": entry["name"],
+                    "type": entry["category"],
+                    "date": date,
+                    "content": content,
+                }
+            )
+        return {"date": date, "cards": cards}
 
-    for ct in card_types:
-        card_dir = day_log / ct
-        if card_dir.exists():
-            for card_path in sorted(card_dir.glob("*.md"), reverse=True):
-                content = compass.read_file(card_path) or ""
-                cards.append(
-                    {
-                        "name": card_path.stem,
-                        "filename": card_path.name,
-                        "type": ct,
-                        "date": date,
-                        "content": content,
-                        "preview": content[:300],
-                    }
-                )
-    return {"date": date, "cards": cards}
+    etag = etag_for_entries(entries, "cards", date, type)
+    return await cached_json_async(request, etag, None, build)
 
 
 class FleetingCardInput(BaseModel):
@@ -243,35 +443,157 @@ def create_fleeting_card(body: FleetingCardInput):
     return {"path": path, "message": "Fleeting card created."}
 
 
+async def _read_lines(request: Request) -> list:
+    """Split a streamed request body into lines as it arrives."""
+    lines, buffer = [], b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *complete, buffer = buffer.split(b"\n")
+        lines.extend(complete)
+    if buffer:
+        lines.append(buffer)
+    return lines
+
+
+@app.post("/api/cards/batch")
+async def import_cards_batch(request: Request):
+    """
+    Bulk-create cards from a JSON Lines body (one card object per line, see
+    card_import). Invalid lines are reported per item and never abort the
+    batch; the response lists one result per non-empty line, in order.
+    """
+    lines = await _read_lines(request)
+    compass = await run_in_threadpool(get_compass)
+    return await run_in_threadpool(compass.import_cards, card_import.parse_jsonl(lines))
+
+
+@app.get("/api/cards/{date}/{filename}/related")
+def get_related_documents(date: str, filename: str, k: int = DEFAULT_K, kind: Optional[str] = None):
+    """Cards and harbor files most similar to one card, from the offline similarity index."""
+    _validate_date(date, "date")
+    if not 1 <= k <= MAX_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {MAX_K}")
+    kinds = [x.strip() for x in kind.split(",") if x.strip()] if kind else None
+    if kinds and any(x not in TERM_KINDS for x in kinds):
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(TERM_KINDS)}")
+    compass = get_compass()
+    for card_type in CARD_TYPES:
+        path = compass.logbook / date / card_type / filename
+        if path.is_file():
+            break
+    else:
+        raise HTTPException(status_code=404, detail=f"Card not found: {date}/{filename}")
+    result = compass.similarity.related(path.relative_to(compass.obsidian_path).as_posix(), k=k, kinds=kinds)
+    return {"date": date, "filename": filename, "type": card_type, **result}
+
+
 # ---------------------------------------------------------------------------
 # Charts (soundings)
 # ---------------------------------------------------------------------------
 
+CHART_FIELDS = ("date", "filename", "preview", "content")
+# preview is a prefix of content, so it is only sent when asked for.
+CHART_DEFAULT_FIELDS = ("date", "filename", "content")
+COURSE_FIELDS = ("date", "filename", "task", "focus", "note", "summary", "next", "preview")
+COURSE_DEFAULT_FIELDS = ("date", "filename", "task", "focus", "summary", "next")
+
+
+def _parse_fields(fields: Optional[str], allowed: tuple, default: tuple) -> tuple:
+    """Parse a comma-separated ?fields= value against the fields an endpoint supports."""
+    if not fields:
+        return default
+    requested = tuple(f.strip() for f in fields.split(",") if f.strip())
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}",
+        )
+    return requested
+
+
+def _validate_date(value: Optional[str], name: str) -> None:
+    if value is None:
+        return
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}. Use YYYY-MM-DD.")
+
+
+def _list_page(compass, kind, limit, cursor, from_date, to_date):
+    """
+    One page of date-named entries from the index, newest first.
+    Returns (entries, next_cursor); next_cursor is the date to pass as
+    ?cursor= for the following page, or None on the last page.
+    """
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    for value, name in ((cursor, "cursor"), (from_date, "from_date"), (to_date, "to_date")):
+        _validate_date(value, name)
+    entries = compass.index.list(
+        kind,
+        descending=True,
+        before=cursor,
+        date_from=from_date,
+        date_to=to_date,
+        limit=None if limit is None else limit + 1,
+    )
+    if limit is not None and len(entries) > limit:
+        entries = entries[:limit]
+        return entries, entries[-1]["date"]
+    return entries, None
+
+
 @app.get("/api/charts")
-def get_charts():
-    compass = get_compass()
-    charts = []
-    for sp in sorted(compass.charts.glob("*_sounding.md"), reverse=True):
-        content = compass.read_file(sp) or ""
-        date = sp.stem.replace("_sounding", "")
-        charts.append(
-            {
-                "date": date,
-                "filename": sp.name,
-                "content": content,
-                "preview": content[:300],
+async def get_charts(
+    request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    compass = await run_io(get_compass)
+    wanted = _parse_fields(fields, CHART_FIELDS, CHART_DEFAULT_FIELDS)
+    entries, next_cursor = await run_io(_list_page, compass, "sounding", limit, cursor, from_date, to_date)
+
+    async def build():
+        if "content" in wanted:
+            contents = await read_many(compass.obsidian_path / e["path"] for e in entries)
+        else:
+            contents = [None] * len(entries)
+        charts = []
+        for entry, content in zip(entries, contents):
+            item = {
+                "date": entry["date"],
+                "filename": entry["name"],
+                "preview": entry["preview"],
+                "content": content or "",
             }
-        )
-    return {"charts": charts}
+            charts.append({f: item[f] for f in wanted})
+        return {"charts": charts, "next_cursor": next_cursor}
+
+    etag = etag_for_entries(entries, "charts", ",".join(wanted), next_cursor)
+    return await cached_json_async(request, etag, None, build)
 
 
 @app.get("/api/charts/{date}")
-def get_chart(date: str):
-    compass = get_compass()
+async def get_chart(date: str, request: Request, raw: bool = False):
+    """Sounding as JSON, or with ?raw=true the markdown bytes streamed as-is (Range supported)."""
+    compass = await run_io(get_compass)
     sp = compass.charts / f"{date}_sounding.md"
-    if not sp.exists():
+    try:
+        st = await run_io(sp.stat)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"Sounding not found for {date}.")
-    return {"date": date, "content": compass.read_file(sp)}
+    if raw:
+        return cached_file(request, sp, st, "chart-raw")
+
+    async def build():
+        return {"date": date, "content": await read_text(sp)}
+
+    return await cached_json_async(request, etag_for_stat(st, "chart"), st.st_mtime_ns, build)
 
 
 # ---------------------------------------------------------------------------
@@ -279,95 +601,196 @@ def get_chart(date: str):
 # ---------------------------------------------------------------------------
 
 @app.get("/api/courses")
-def get_courses():
+def get_courses(
+    request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    fields: Optional[str] = None,
+):
     compass = get_compass()
-    courses = []
-    for cp in sorted(compass.navigation.glob("*course.md"), reverse=True):
-        content = compass.read_file(cp)
-        parsed = compass.parse_course(content) if content else {}
-        date = cp.stem.replace("_course", "")
-        courses.append(
-            {
-                "date": date,
-                "filename": cp.name,
-                "task": parsed.get("task", "").strip(),
-                "focus": parsed.get("focus", "").strip(),
-                "summary": parsed.get("summary", "").strip(),
-                "next": parsed.get("next", "").strip(),
-            }
-        )
-    return {"courses": courses}
+    wanted = _parse_fields(fields, COURSE_FIELDS, COURSE_DEFAULT_FIELDS)
+    entries, next_cursor = _list_page(compass, "course", limit, cursor, from_date, to_date)
+
+    def build():
+        courses = []
+        for entry in entries:
+            parsed = entry["sections"] or {}
+            item = {"date": entry["date"], "filename": entry["name"], "preview": entry["preview"]}
+            courses.append(
+                {f: item[f] if f in item else parsed.get(f, "") for f in wanted}
+            )
+        return {"courses": courses, "next_cursor": next_cursor}
+
+    etag = etag_for_entries(entries, "courses", ",".join(wanted), next_cursor)
+    return cached_json(request, etag, None, build)
+
+
+ROLLUP_PERIOD_RE = {"week": re.compile(r"^\d{4}-W\d{2}$"), "month": re.compile(r"^\d{4}-\d{2}$")}
+
+
+def _rollup_kind(kind: str) -> str:
+    if kind not in PERIOD_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(PERIOD_KINDS)}")
+    return kind
+
+
+def _rollup_etag(compass, *extra) -> str:
+    count, mtime_sum, size_sum, latest = compass.index.fingerprint("course")
+    suffix = "-".join(str(v) for v in extra)
+    return f'"rollups-{count:x}-{mtime_sum:x}-{size_sum:x}-{latest or 0:x}-{suffix}"'
+
+
+@app.get("/api/rollups")
+def get_rollups(
+    request: Request,
+    kind: str = "week",
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    """
+    Weekly or monthly digests of the courses' Today's Summary and What's
+    Next sections (see rollups), newest first. Only the periods whose course
+    files changed are rebuilt; the ETag is the course fingerprint, so a 304
+    costs one aggregate query.
+    """
+    _rollup_kind(kind)
+    _validate_date(from_date, "from_date")
+    _validate_date(to_date, "to_date")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    compass = get_compass()
+    etag = _rollup_etag(compass, kind, from_date, to_date, limit)
 
+    def build():
+        rollups = RollupEngine(compass.index).list(kind, date_from=from_date, date_to=to_date, limit=limit)
+        return {"kind": kind, "rollups": rollups}
 
-@app.get("/api/courses/{date}")
-def get_course(date: str):
+    return cached_json(request, etag, None, build)
+
+
+@app.get("/api/rollups/{kind}/{period}")
+def get_rollup(request: Request, kind: str, period: str):
+    _rollup_kind(kind)
+    if not ROLLUP_PERIOD_RE[kind].match(period):
+        raise HTTPException(status_code=400, detail="period must be YYYY-Www (week) or YYYY-MM (month)")
     compass = get_compass()
+    # Look the period up first, so If-None-Match cannot turn a missing period into a 304.
+    rollup = RollupEngine(compass.index).get(kind, period)
+    if rollup is None:
+        raise HTTPException(status_code=404, detail=f"No {kind} rollup for {period}.")
+    return cached_json(request, _rollup_etag(compass, kind, period), None, lambda: rollup)
+
+
+@app.get("/api/courses/{date}")
+async def get_course(date: str, request: Request):
+    compass = await run_io(get_compass)
     cp = compass.navigation / f"{date}_course.md"
-    if not cp.exists():
+    try:
+        st = await run_io(cp.stat)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"Course not found for {date}.")
-    content = compass.read_file(cp)
-    parsed = compass.parse_course(content) if content else {}
-    return {
-        "date": date,
-        "content": content,
-        "task": parsed.get("task", "").strip(),
-        "focus": parsed.get("focus", "").strip(),
-        "note": parsed.get("note", "").strip(),
-        "summary": parsed.get("summary", "").strip(),
-        "next": parsed.get("next", "").strip(),
-    }
+
+    async def build():
+        doc = await run_io(load_course, cp)
+        parsed = doc.to_dict() if doc else {}
+        return {
+            "date": date,
+            "content": doc.text if doc else None,
+            "task": parsed.get("task", "").strip(),
+            "focus": parsed.get("focus", "").strip(),
+            "note": parsed.get("note", "").strip(),
+            "summary": parsed.get("summary", "").strip(),
+            "next": parsed.get("next", "").strip(),
+        }
+
+    return await cached_json_async(request, etag_for_stat(st, "course"), st.st_mtime_ns, build)
 
 
 # ---------------------------------------------------------------------------
-# Harbor
+# Search
 # ---------------------------------------------------------------------------
 
-HARBOR_CATEGORIES = ["concepts", "frameworks", "companies", "people", "skills"]
+@app.get("/api/search")
+def search_vault(
+    q: str = "",
+    kind: Optional[str] = None,
+    tags: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+):
+    from search import SEARCH_KINDS
 
+    compass = get_compass()
+    kinds = [k.strip() for k in kind.split(",") if k.strip()] if kind else None
+    if kinds and any(k not in SEARCH_KINDS for k in kinds):
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(SEARCH_KINDS)}")
+    if not 1 <= limit <= 100 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit must be 1-100 and offset non-negative")
+    _validate_date(from_date, "from_date")
+    _validate_date(to_date, "to_date")
+    tag_list = [t.strip() for t in tags.split(",") if t.strip()] if tags else None
+    return compass.search(
+        q, kinds=kinds, tags=tag_list, date_from=from_date, date_to=to_date,
+        limit=limit, offset=offset,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Harbor
+# ---------------------------------------------------------------------------
 
 @app.get("/api/harbor")
-def get_harbor():
-    compass = get_compass()
-    structure: dict = {}
-    for cat in HARBOR_CATEGORIES:
-        cat_path = compass.harbor / cat
-        files = []
-        if cat_path.exists():
-            for f in sorted(cat_path.glob("*.md")):
-                content = compass.read_file(f) or ""
-                first_line = ""
-                for line in content.split("\n"):
-                    if line.strip():
-                        first_line = line.strip().lstrip("#").strip()
-                        break
-                files.append(
-                    {
-                        "name": f.stem,
-                        "filename": f.name,
-                        "category": cat,
-                        "description": first_line,
-                        "preview": content[:200],
-                    }
-                )
-        structure[cat] = files
-    return {"harbor": structure}
+async def get_harbor(request: Request):
+    compass = await run_io(get_compass)
+    entries = await run_io(compass.index.list, "harbor")
+
+    def build():
+        structure: dict = {cat: [] for cat in HARBOR_CATEGORIES}
+        for entry in entries:
+            structure[entry["category"]].append(
+                {
+                    "name": Path(entry["name"]).stem,
+                    "filename": entry["name"],
+                    "category": entry["category"],
+                    "description": entry["title"],
+                    "preview": entry["preview"][:200],
+                }
+            )
+        return {"harbor": structure}
+
+    return cached_json(request, etag_for_entries(entries, "harbor"), None, build)
 
 
 @app.get("/api/harbor/{category}/{filename}")
-def get_harbor_file(category: str, filename: str):
-    compass = get_compass()
+async def get_harbor_file(category: str, filename: str, request: Request, raw: bool = False):
+    """Harbor file as JSON, or with ?raw=true the markdown bytes streamed as-is (Range supported)."""
+    compass = await run_io(get_compass)
     if category not in HARBOR_CATEGORIES:
         raise HTTPException(status_code=400, detail=f"Invalid category: {category}")
     fp = compass.harbor / category / filename
-    if not fp.exists():
+    try:
+        st = await run_io(fp.stat)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"File not found: {filename}")
-    content = compass.read_file(fp)
-    return {
-        "category": category,
-        "filename": filename,
-        "name": fp.stem,
-        "content": content,
-    }
+    if not stat.S_ISREG(st.st_mode):
+        raise HTTPException(status_code=404, detail=f"File not found: {filename}")
+    if raw:
+        return cached_file(request, fp, st, "harbor-file-raw")
+
+    async def build():
+        return {
+            "category": category,
+            "filename": filename,
+            "name": fp.stem,
+            "content": await read_text(fp),
+        }
+
+    return await cached_json_async(request, etag_for_stat(st, "harbor-file"), st.st_mtime_ns, build)
 
 
 # ---------------------------------------------------------------------------
@@ -375,21 +798,25 @@ def get_harbor_file(category: str, filename: str):
 # ---------------------------------------------------------------------------
 
 @app.get("/api/templates")
-def get_templates():
-    compass = get_compass()
-    templates = []
-    if compass.template.exists():
-        for f in sorted(compass.template.glob("*.md")):
-            content = compass.read_file(f) or ""
+async def get_templates(request: Request):
+    compass = await run_io(get_compass)
+    entries = await run_io(compass.index.list, "template")
+
+    async def build():
+        contents = await read_many(compass.obsidian_path / e["path"] for e in entries)
+        templates = []
+        for entry, content in zip(entries, contents):
             templates.append(
                 {
-                    "name": f.stem,
-                    "filename": f.name,
-                    "content": content,
-                    "preview": content[:200],
+                    "name": Path(entry["name"]).stem,
+                    "filename": entry["name"],
+                    "content": content or "",
+                    "preview": entry["preview"][:200],
                 }
             )
-    return {"templates": templates}
+        return {"templates": templates}
+
+    return await cached_json_async(request, etag_for_entries(entries, "templates"), None, build)
 
 
 # ---------------------------------------------------------------------------
@@ -411,16 +838,68 @@ def generate_navigation():
 # ---------------------------------------------------------------------------
 
 @app.get("/api/map")
-def get_map(date: Optional[str] = None):
-    compass = get_compass()
+async def get_map(request: Request, date: Optional[str] = None):
+    compass = await run_io(get_compass)
     if date is None:
         date = compass.today
     map_path = compass.logbook / date / "map.canvas"
-    content = compass.read_file(map_path)
-    if content is None:
-        return {"date": date, "exists": False, "content": None, "data": None}
     try:
-        data = json.loads(content)
-    except json.JSONDecodeError:
-        data = None
-    return {"date": date, "exists": True, "content": content, "data": data}
+        st = await run_io(map_path.stat)
+    except FileNotFoundError:
+        return {"date": date, "exists": False, "content": None, "data": None}
+
+    async def build():
+        content = await read_text(map_path)
+        if content is None:
+            return {"date": date, "exists": False, "content": None, "data": None}
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError:
+            data = None
+        return {"date": date, "exists": True, "content": content, "data": data}
+
+    return await cached_json_async(request, etag_for_stat(st, "map"), st.st_mtime_ns, build)
+
+
+class GenerateMapRequest(BaseModel):
+    date: Optional[str] = None
+    max_nodes: int = 10
+    dry_run: bool = False
+
+
+@app.post("/api/map/generate")
+def generate_map(req: GenerateMapRequest):
+    """Build logbook/{date}/map.canvas from the card graph (see knowledge_map)."""
+    _validate_date(req.date, "date")
+    if not 1 <= req.max_nodes <= 50:
+        raise HTTPException(status_code=400, detail="max_nodes must be between 1 and 50")
+    compass = get_compass()
+    result = compass.generate_map(req.date, max_nodes=req.max_nodes, write=not req.dry_run)
+    return {
+        "date": result["stats"]["date"],
+        "exists": not req.dry_run,
+        "data": result["canvas"],
+        "stats": result["stats"],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Context packs
+# ---------------------------------------------------------------------------
+
+@app.get("/api/context")
+def get_context_pack(
+    date: Optional[str] = None,
+    budget: int = DEFAULT_BUDGET,
+    focus: Optional[str] = None,
+    no_cache: bool = False,
+):
+    """
+    Token-budgeted prompt context for the Focus (see context_pack). Without
+    ?focus= the Focus that applies on the date is used. Packs are cached per
+    (date, Focus, budget) until a card, harbor file or sounding changes.
+    """
+    _validate_date(date, "date")
+    if not MIN_BUDGET <= budget <= MAX_BUDGET:
+        raise HTTPException(status_code=400, detail=f"budget must be between {MIN_BUDGET} and {MAX_BUDGET}")
+    return get_compass().build_context(focus, date, budget=budget, use_cache=not no_cache)
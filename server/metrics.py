@@ -0,0 +1,201 @@
+"""
+Request-level metrics for the API server.
+
+MetricsMiddleware wraps every HTTP request in an instrumentation.RequestStats,
+so the vault helpers can report the files they stat, read and glob, and the
+named spans (compass, index, digest, encode, ...) they spend time in. When
+the response starts, it adds a Server-Timing header with that breakdown.
+When the response finishes, it records the request in the registry:
+- a latency histogram per method and route template
+- request counts per status
+- I/O totals per route
+
+GET /api/metrics exposes the registry in the Prometheus text format. The
+registry is per process: with several uvicorn workers, scrape each one or
+aggregate in Prometheus.
+"""
+
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from fastapi.responses import JSONResponse
+
+import content_cache
+import instrumentation
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Long-lived streams would only ever land in the +Inf bucket.
+UNTIMED_ROUTES = {"/api/events"}
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that reports its encoding time as the "encode" span."""
+
+    def render(self, content) -> bytes:
+        with instrumentation.span("encode"):
+            return super().render(content)
+
+
+class _Histogram:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: Dict[Tuple[str, str], _Histogram] = {}
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.io: Dict[str, List[int]] = {}  # route -> [files_read, bytes_read, files_stat, globs]
+        self.spans: Dict[Tuple[str, str], float] = {}
+        self.compass_builds = 0
+        self.compass_build_seconds = 0.0
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats) -> None:
+        with self._lock:
+            key = (method, route, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if route not in UNTIMED_ROUTES:
+                self.latency.setdefault((method, route), _Histogram()).observe(seconds)
+            io = self.io.setdefault(route, [0, 0, 0, 0])
+            io[0] += stats.files_read
+            io[1] += stats.bytes_read
+            io[2] += stats.files_stat
+            io[3] += stats.globs
+            for name, value in stats.spans.items():
+                self.spans[(route, name)] = self.spans.get((route, name), 0.0) + value
+
+    def record_build(self, seconds: float) -> None:
+        with self._lock:
+            self.compass_builds += 1
+            self.compass_build_seconds += seconds
+
+    def render_prometheus(self) -> str:
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            header("compass_http_requests_total", "counter", "HTTP requests by method, route and status.")
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'compass_http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}'
+                )
+
+            header("compass_http_request_duration_seconds", "histogram", "Request latency until the response ends.")
+            for (method, route), hist in sorted(self.latency.items()):
+                labels = f'method="{method}",route="{_escape(route)}"'
+                for bound, count in zip(LATENCY_BUCKETS, hist.buckets):
+                    lines.append(f'compass_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'compass_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f"compass_http_request_duration_seconds_sum{{{labels}}} {hist.sum:.6f}")
+                lines.append(f"compass_http_request_duration_seconds_count{{{labels}}} {hist.count}")
+
+            io_metrics = (
+                ("compass_files_read_total", "Vault files read while serving requests."),
+                ("compass_bytes_read_total", "Bytes of vault files read while serving requests."),
+                ("compass_files_stat_total", "Vault files stat'ed while serving requests."),
+                ("compass_globs_total", "Vault directory listings while serving requests."),
+            )
+            for i, (name, text) in enumerate(io_metrics):
+                header(name, "counter", text)
+                for route, values in sorted(self.io.items()):
+                    lines.append(f'{name}{{route="{_escape(route)}"}} {values[i]}')
+
+            header("compass_span_seconds_total", "counter", "Time spent in named phases (Server-Timing metrics).")
+            for (route, name), value in sorted(self.spans.items()):
+                lines.append(f'compass_span_seconds_total{{route="{_escape(route)}",span="{name}"}} {value:.6f}')
+
+            cache = content_cache.stats()
+            for key, kind, text in (
+                ("hits", "counter", "Content cache hits (file unchanged, no read)."),
+                ("misses", "counter", "Content cache misses (file read from disk)."),
+                ("evictions", "counter", "Content cache LRU evictions."),
+                ("entries", "gauge", "Files currently held in the content cache."),
+                ("bytes", "gauge", "Bytes currently held in the content cache."),
+                ("max_bytes", "gauge", "Content cache byte budget (COMPASS_CACHE_MB)."),
+            ):
+                name = f"compass_content_cache_{key}" + ("_total" if kind == "counter" else "")
+                header(name, kind, text)
+                lines.append(f"{name} {cache[key]}")
+
+            header("compass_assistant_builds_total", "counter", "CompassAssistant constructions.")
+            lines.append(f"compass_assistant_builds_total {self.compass_builds}")
+            header("compass_assistant_build_seconds_total", "counter", "Time spent constructing CompassAssistant.")
+            lines.append(f"compass_assistant_build_seconds_total {self.compass_build_seconds:.6f}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def server_timing(stats, total: float) -> str:
+    """Server-Timing header value: one metric per span plus the I/O counts."""
+    parts = [f"total;dur={total * 1000:.2f}"]
+    for name, value in sorted(stats.spans.items()):
+        parts.append(f"{name};dur={value * 1000:.2f}")
+    parts.append(
+        f'io;desc="read={stats.files_read} bytes={stats.bytes_read} stat={stats.files_stat} glob={stats.globs}"'
+    )
+    return ", ".join(parts)
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are not buffered."""
+
+    def __init__(self, app, registry: MetricsRegistry = registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        stats, token = instrumentation.begin()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                value = server_timing(stats, time.perf_counter() - started)
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", value.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            instrumentation.end(token)
+            route = scope.get("route")
+            self.registry.observe(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status,
+                time.perf_counter() - started,
+                stats,
+            )
@@ -0,0 +1,344 @@
+"""
+Similarity engine - related cards and harbor files, computed offline
+
+Every card and harbor file is a tf-idf vector over the content terms VaultIndex
+already keeps in doc_terms: words, and overlapping bigrams for CJK text (see
+search.tokenize). They are weighted (1 + log tf) * idf and L2-normalised, the
+same way knowledge_map weighs cards. Terms found in more than MAX_DOC_RATIO
+of the documents are dropped. No model and no network access is involved.
+
+The vectors are held in an impact-ordered inverted index: for each term, the
+ids of the documents containing it and their weights, sorted by weight.
+Scoring a query takes its QUERY_TERMS heaviest terms and walks at most
+POSTINGS_CUTOFF entries per term, accumulating dot products. Because the
+documents are normalised, these are cosine similarities. The cutoff makes
+the search approximate for very common terms: a document only reached
+through the tail of a long postings list can be missed. In exchange, the
+cost of a query no longer grows with the size of the vault. With numpy
+installed, postings are numpy arrays and each term is one vectorised
+scatter-add. Without it, the same arrays (array module) are walked in pure
+Python, which is slower but returns the same results.
+
+The index is built from SQLite on first use. Building reads every row of
+doc_terms, which takes seconds on a large vault, so the result is saved with
+marshal to a cache file next to config.json (.similarity_cache). A new
+process, such as a CLI call that creates a card, loads it instead of
+rebuilding. The cache is tied to the index generation and to its position in
+the term_changes log of VaultIndex. From there the index follows that log:
+documents changed since the build are scored exactly from a small side
+table, and their stale postings are masked. The index is rebuilt and saved
+again once those changes exceed REBUILD_RATIO of the vault.
+"""
+
+import heapq
+import marshal
+import math
+import threading
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the installed extras
+    np = None
+
+from knowledge_map import MAX_DOC_RATIO, extract_terms
+from vault_index import TERM_KINDS
+from vault_io import atomic_write
+import instrumentation
+
+CACHE_VERSION = 1
+
+DEFAULT_K = 10
+MAX_K = 50
+# 查询向量只保留权重最高的词数
+QUERY_TERMS = 24
+# 每个词最多遍历的倒排项数（倒排表按权重降序）
+POSTINGS_CUTOFF = 4096
+# 低于该相似度的结果不返回
+MIN_SCORE = 0.05
+# 构建后变化的文档数超过 max(REBUILD_MIN, 文档数 * REBUILD_RATIO) 时重新构建
+REBUILD_MIN = 256
+REBUILD_RATIO = 0.02
+# 新卡片"相关链接"中预先填入的文档数
+PREFILL_LINKS = 5
+
+
+def _postings_from_bytes(ids, weights):
+    if np is not None:
+        return np.frombuffer(ids, dtype=np.int32), np.frombuffer(weights, dtype=np.float32)
+    a, b = array("i"), array("f")
+    a.frombytes(ids)
+    b.frombytes(weights)
+    return a, b
+
+
+def _impact_order(ids, weights):
+    """倒排表按权重降序排列"""
+    if np is not None:
+        ids = np.frombuffer(ids, dtype=np.int32)
+        weights = np.frombuffer(weights, dtype=np.float32)
+        order = np.argsort(-weights, kind="stable")
+        return ids[order], weights[order]
+    order = sorted(range(len(weights)), key=weights.__getitem__, reverse=True)
+    return array("i", (ids[i] for i in order)), array("f", (weights[i] for i in order))
+
+
+def _dot(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b[t] for t, w in a.items() if t in b)
+
+
+class SimilarityIndex:
+    """
+    卡片和harbor文件的相似度索引（基于VaultIndex的doc_terms）
+
+    参数:
+    - index: VaultIndex
+    - cache_path: 构建结果的缓存文件（None表示不缓存）
+    """
+
+    def __init__(self, index, cache_path=None):
+        self.index = index
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._seq = None
+        self.build_seconds = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._paths = []            # 文档编号 -> 路径
+        self._kinds = array("b")    # 文档编号 -> TERM_KINDS中的下标
+        self._ids = {}              # 路径 -> 文档编号
+        self._postings = {}         # 词 -> (文档编号, 权重)，按权重降序
+        self._idf = {}
+        self._common = set()        # 文档频率过高、不参与计算的词
+        self._new_idf = 1.0         # 构建之后才出现的词的idf
+        self._dead = set()          # 构建后被修改或删除的文档编号（倒排项已过期）
+        self._extra = {}            # 构建后新增或修改的文档：路径 -> (类型, 向量)
+        self._kind_array = None
+
+    # ------------------------------------------------------------------
+    # Building and syncing
+    # ------------------------------------------------------------------
+
+    def _vector(self, terms):
+        """{词: 词频} -> 归一化的tf-idf向量"""
+        vector = {}
+        for term, tf in terms.items():
+            idf = self._idf.get(term)
+            if idf is None:
+                if term in self._common:
+                    continue
+                idf = self._new_idf
+            vector[term] = (1.0 + math.log(tf)) * idf
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {t: w / norm for t, w in vector.items()} if norm else {}
+
+    def _build(self):
+        started = time.perf_counter()
+        # 先取序号：构建期间的变化会在下次sync时重新应用（重复应用无害）
+        seq, _ = self.index.term_changes()
+        total, doc_freq = self.index.term_stats()
+        self._reset()
+        limit = max(2, total * MAX_DOC_RATIO)
+        for term, df in doc_freq.items():
+            if df > limit:
+                self._common.add(term)
+            else:
+                self._idf[term] = math.log((total + 1) / (df + 1)) + 1.0
+        self._new_idf = math.log((total + 1) / 2) + 1.0
+
+        lists = {}
+        for path, kind, terms in self.index.iter_doc_terms():
+            doc = len(self._paths)
+            self._paths.append(path)
+            self._kinds.append(TERM_KINDS.index(kind))
+            self._ids[path] = doc
+            for term, weight in self._vector(terms).items():
+                entry = lists.get(term)
+                if entry is None:
+                    entry = lists[term] = (array("i"), array("f"))
+                entry[0].append(doc)
+                entry[1].append(weight)
+        self._postings = {term: _impact_order(ids, weights) for term, (ids, weights) in lists.items()}
+        if np is not None:
+            self._kind_array = np.frombuffer(self._kinds, dtype=np.int8)
+        self._seq = seq
+        self.build_seconds = round(time.perf_counter() - started, 3)
+        self._save()
+
+    def _save(self):
+        if self.cache_path is None:
+            return
+        data = {
+            "version": CACHE_VERSION,
+            "generation": self.index.generation(),
+            "seq": self._seq,
+            "paths": self._paths,
+            "kinds": self._kinds.tobytes(),
+            "idf": self._idf,
+            "common": list(self._common),
+            "new_idf": self._new_idf,
+            "postings": {t: (ids.tobytes(), w.tobytes()) for t, (ids, w) in self._postings.items()},
+            "build_seconds": self.build_seconds,
+        }
+        try:
+            atomic_write(self.cache_path, marshal.dumps(data), sync_dir=False)
+        except OSError:
+            pass  # 缓存只是加速，写入失败时下次重新构建
+
+    def _load(self):
+        """读取缓存的构建结果（与当前索引的generation一致时），返回是否成功"""
+        if self.cache_path is None:
+            return False
+        try:
+            with open(self.cache_path, "rb") as f:
+                data = marshal.load(f)
+            if data["version"] != CACHE_VERSION or data["generation"] != self.index.generation():
+                return False
+            self._reset()
+            self._paths = data["paths"]
+            self._ids = {path: doc for doc, path in enumerate(self._paths)}
+            self._kinds.frombytes(data["kinds"])
+            self._idf = data["idf"]
+            self._common = set(data["common"])
+            self._new_idf = data["new_idf"]
+            self._postings = {t: _postings_from_bytes(*pair) for t, pair in data["postings"].items()}
+            self.build_seconds = data["build_seconds"]
+            seq = data["seq"]
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            self._reset()
+            return False
+        if np is not None:
+            self._kind_array = np.frombuffer(self._kinds, dtype=np.int8)
+        self._seq = seq
+        return True
+
+    def sync(self):
+        """刷新VaultIndex并应用之后的词频变化（首次调用时构建索引）"""
+        self.index.refresh(list(TERM_KINDS))
+        with instrumentation.span("similarity"), self._lock:
+            if self._seq is None and not self._load():
+                self._build()
+            seq, changed = self.index.term_changes(self._seq)
+            if not changed:
+                return
+            found = self.index.doc_terms(changed)
+            for path in changed:
+                doc = self._ids.get(path)
+                if doc is not None:
+                    self._dead.add(doc)
+                if path in found:
+                    kind, terms = found[path]
+                    self._extra[path] = (kind, self._vector(terms))
+                else:
+                    self._extra.pop(path, None)
+            self._seq = seq
+            if len(self._extra) + len(self._dead) > max(REBUILD_MIN, len(self._paths) * REBUILD_RATIO):
+                self._build()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _query_vector(self, terms):
+        vector = self._vector(terms)
+        if len(vector) > QUERY_TERMS:
+            vector = dict(heapq.nlargest(QUERY_TERMS, vector.items(), key=lambda item: item[1]))
+        return vector
+
+    def _top(self, query, k, kinds, exclude):
+        """倒排表 + 构建后变化的文档中最相似的k个：[(相似度, 路径, 类型)]"""
+        allowed = {TERM_KINDS.index(kind) for kind in kinds}
+        skip = set(self._dead)
+        skip.update(self._ids[p] for p in exclude if p in self._ids)
+        found = []
+
+        if np is not None and self._paths:
+            scores = np.zeros(len(self._paths), dtype=np.float32)
+            for term, weight in query.items():
+                entry = self._postings.get(term)
+                if entry is not None:
+                    ids, weights = entry
+                    scores[ids[:POSTINGS_CUTOFF]] += weight * weights[:POSTINGS_CUTOFF]
+            if len(allowed) < len(TERM_KINDS):
+                scores[~np.isin(self._kind_array, list(allowed))] = 0.0
+            if skip:
+                scores[np.fromiter(skip, dtype=np.int64, count=len(skip))] = 0.0
+            n = min(k, len(scores))
+            top = np.argpartition(-scores, n - 1)[:n] if n < len(scores) else np.arange(len(scores))
+            found = [(float(scores[d]), int(d)) for d in top if scores[d] >= MIN_SCORE]
+        elif self._paths:
+            scores = {}
+            for term, weight in query.items():
+                entry = self._postings.get(term)
+                if entry is not None:
+                    ids, weights = entry
+                    for doc, w in zip(ids[:POSTINGS_CUTOFF], weights[:POSTINGS_CUTOFF]):
+                        scores[doc] = scores.get(doc, 0.0) + weight * w
+            found = heapq.nlargest(
+                k,
+                (
+                    (score, doc) for doc, score in scores.items()
+                    if score >= MIN_SCORE and doc not in skip and self._kinds[doc] in allowed
+                ),
+            )
+
+        results = [(score, self._paths[doc], TERM_KINDS[self._kinds[doc]]) for score, doc in found]
+        for path, (kind, vector) in self._extra.items():
+            if kind in kinds and path not in exclude:
+                score = _dot(query, vector)
+                if score >= MIN_SCORE:
+                    results.append((score, path, kind))
+        return heapq.nlargest(k, results)
+
+    def _search(self, terms, k, kinds, exclude):
+        started = time.perf_counter()
+        k = max(1, min(int(k), MAX_K))
+        kinds = [kind for kind in (kinds or TERM_KINDS) if kind in TERM_KINDS]
+        with instrumentation.span("similarity"), self._lock:
+            top = self._top(self._query_vector(terms), k, kinds, set(exclude))
+        entries = self.index.get_many([path for _, path, _ in top])
+        results = []
+        for score, path, kind in top:
+            entry = entries.get(path)
+            if entry is None:
+                continue
+            results.append({
+                "path": path,
+                "kind": kind,
+                "category": entry["category"],
+                "date": entry["date"],
+                "name": entry["name"],
+                "title": entry["title"],
+                "score": round(score, 4),
+            })
+        return {"took_ms": round((time.perf_counter() - started) * 1000, 2), "results": results}
+
+    def related(self, relpath, k=DEFAULT_K, kinds=None):
+        """
+        与vault内某个文件（卡片或harbor文件，相对路径）最相似的文档
+        返回 {'path', 'took_ms', 'results': [...]}；该文件不在索引中或没有可用的词时results为空
+        """
+        self.sync()
+        found = self.index.doc_terms([relpath])
+        terms = found[relpath][1] if relpath in found else {}
+        return {"path": relpath, **self._search(terms, k, kinds, {relpath})}
+
+    def similar(self, text, k=DEFAULT_K, kinds=None, exclude=()):
+        """与一段文本（如尚未写入的新卡片）最相似的文档，返回 {'took_ms', 'results': [...]}"""
+        self.sync()
+        return self._search(dict(extract_terms(text)), k, kinds, exclude)
+
+    def stats(self):
+        """索引规模和构建耗时"""
+        with self._lock:
+            return {
+                "documents": len(self._paths) + len(self._extra),
+                "terms": len(self._postings),
+                "pending_changes": len(self._extra) + len(self._dead),
+                "build_seconds": self.build_seconds,
+                "numpy": np is not None,
+            }
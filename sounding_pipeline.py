@@ -0,0 +1,241 @@
+"""
+Sounding pipeline - fills News Update and Analysis Update one Focus topic at a time
+
+The Focus section of a sounding usually lists several topics (one per list
+item). split_topics() turns it into a list, and SoundingPipeline runs every
+topic through two stages concurrently (asyncio, at most `concurrency` topics
+in flight):
+- fetch(topic, date): gather material for the topic. The default,
+  local_fetch, takes the most similar cards and harbor files (similarity.py)
+- summarize(topic, material, date): return {'news': ..., 'analysis': ...}.
+  The default calls the configured model through llm.py in API mode and
+  lists the local material otherwise (local_summarize)
+
+Stages are plain callables and may be sync (run on a worker thread) or
+async. Results are merged into the sounding as one "### topic" subsection
+per topic under each of the two sections, always in Focus order. The file
+is rewritten each time a topic finishes, with a placeholder for the topics
+still running, so a slow topic never holds back the others. Each write
+re-reads the sounding under its file lock and replaces only those two
+sections, so edits made to the rest of the file meanwhile are kept. A topic that
+fails or exceeds `timeout` gets an error note and does not stop the rest.
+
+run() returns per-topic timings (fetch, summarize and total ms).
+"""
+
+import asyncio
+import inspect
+import re
+import time
+from pathlib import Path
+
+from context_pack import truncate_tokens
+from course_doc import CourseDocument, escape_body
+from knowledge_map import MIN_SIMILARITY
+from vault_io import file_lock
+
+DEFAULT_CONCURRENCY = 4
+MAX_TOPICS = 20
+# 每个话题取用的本地资料
+TOPIC_DOCUMENTS = 5
+DOCUMENT_TOKENS = 300
+
+PENDING = "（生成中）"
+SECTION_TITLES = {"news": "News Update", "analysis": "Analysis Update"}
+
+_BULLET_RE = re.compile(r"^(?:[-*+]|\d+[.)])\s+")
+
+
+def split_topics(focus_text):
+    """把Focus拆成话题列表（每个列表项或每行一个，去掉占位符和重复项）"""
+    topics = []
+    for line in (focus_text or "").splitlines():
+        topic = _BULLET_RE.sub("", line.strip()).strip()
+        if not topic or topic.startswith("#") or (topic.startswith("[") and topic.endswith("]")):
+            continue
+        if topic not in topics:
+            topics.append(topic)
+    return topics[:MAX_TOPICS]
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+class SoundingPipeline:
+    """
+    按话题并发填写sounding
+
+    参数:
+    - assistant: CompassAssistant
+    - fetch / summarize: 两个阶段（None时使用默认实现，见模块说明）
+    - concurrency: 同时处理的话题数
+    - timeout: 单个话题的超时（秒，None表示不限）
+    - use_cache: 默认summarize调用模型时是否使用响应缓存
+    """
+
+    def __init__(self, assistant, fetch=None, summarize=None, concurrency=DEFAULT_CONCURRENCY,
+                 timeout=None, use_cache=True):
+        self.assistant = assistant
+        self.fetch = fetch or self.local_fetch
+        if summarize is None:
+            summarize = self.llm_summarize if assistant.use_api else self.local_summarize
+        self.summarize = summarize
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.use_cache = use_cache
+
+    # ------------------------------------------------------------------
+    # Default stages
+    # ------------------------------------------------------------------
+
+    def local_fetch(self, topic, date):
+        """与话题最相似的卡片和harbor文件（截断后的正文）"""
+        a = self.assistant
+        found = a.similarity.similar(topic, k=TOPIC_DOCUMENTS)["results"]
+        documents = []
+        for r in found:
+            if r["score"] < MIN_SIMILARITY or (r["kind"] == "card" and (r["date"] or "") > date):
+                continue
+            content = a.read_file(a.obsidian_path / r["path"])
+            if content:
+                text, _ = truncate_tokens(content.strip(), DOCUMENT_TOKENS)
+                documents.append({**r, "text": text})
+        return documents
+
+    def local_summarize(self, topic, documents, date):
+        """不调用模型：列出本地相关笔记，供手动补充"""
+        if not documents:
+            return {"news": "- 本地暂无相关笔记", "analysis": "[待补充]"}
+        links = "\n".join(f"- [[{Path(r['name']).stem}]]" for r in documents)
+        return {"news": f"本地相关笔记：\n{links}", "analysis": "[待补充]"}
+
+    def llm_summarize(self, topic, documents, date):
+        """调用模型写出该话题的News Update和Analysis Update"""
+        a = self.assistant
+        notes = "\n\n".join(f"### {r['title'] or r['name']}\n{r['text']}" for r in documents) or "（无）"
+        guidelines = "\n".join(f"- {g}" for g in a.config.get("output_preferences", {}).get("guidelines", []))
+        system = f"你是Knowledge Compass的研究助手，帮助用户跟踪Focus中的话题。\n{guidelines}".strip()
+        prompt = (
+            f"话题：{topic}\n日期：{date}\n\n"
+            f"用户已有的相关笔记：\n{notes}\n\n"
+            "请只针对这个话题输出以下两个部分：\n"
+            "## News Update\n过去2天发生了哪些客观事实\n\n"
+            "## Analysis Update\n媒体/机构/专家/相关利益方的看法，未来几种可能的情形\n"
+        )
+        result = a.llm.complete(prompt, system=system, use_cache=self.use_cache)
+        reply = CourseDocument.parse(result["text"])
+        parts = {
+            key: reply.text[section.body_start:section.end].strip()
+            for key, section in reply.sections.items() if key in SECTION_TITLES
+        }
+        # 回复中没有约定的标题时整体作为News Update
+        return parts or {"news": result["text"].strip()}
+
+    # ------------------------------------------------------------------
+    # Run
+    # ------------------------------------------------------------------
+
+    async def _call(self, stage, *args):
+        if inspect.iscoroutinefunction(stage):
+            return await stage(*args)
+        return await asyncio.to_thread(stage, *args)
+
+    async def _stages(self, topic, date, timing):
+        started = time.perf_counter()
+        material = await self._call(self.fetch, topic, date)
+        timing["fetch_ms"] = _elapsed_ms(started)
+        started = time.perf_counter()
+        parts = await self._call(self.summarize, topic, material, date)
+        timing["summarize_ms"] = _elapsed_ms(started)
+        return parts
+
+    async def _process(self, topic, date, semaphore):
+        """一个话题的两个阶段（失败或超时时返回错误说明），返回 (结果, 耗时)"""
+        timing = {"topic": topic, "fetch_ms": None, "summarize_ms": None, "total_ms": None, "ok": False, "error": None}
+        async with semaphore:
+            # 超时只计算开始处理之后的时间，不含等待并发名额的时间
+            started = time.perf_counter()
+            try:
+                stages = self._stages(topic, date, timing)
+                parts = await (stages if self.timeout is None else asyncio.wait_for(stages, self.timeout))
+                timing["ok"] = True
+            except asyncio.TimeoutError:
+                timing["error"] = f"超时（{self.timeout}秒）"
+                parts = {key: "（生成失败: 超时）" for key in SECTION_TITLES}
+            except Exception as e:
+                timing["error"] = str(e) or type(e).__name__
+                parts = {key: f"（生成失败: {timing['error']}）" for key in SECTION_TITLES}
+            timing["total_ms"] = _elapsed_ms(started)
+        return parts, timing
+
+    @staticmethod
+    def render(content, topics, results):
+        """
+        把各话题的结果按Focus顺序写入News Update和Analysis Update（未完成的话题显示占位符）
+        结果中的一/二级标题和分隔线会被转义，否则下一次写入时section会在那里提前结束
+        """
+        for key, title in SECTION_TITLES.items():
+            body = "\n\n".join(
+                f"### {topic}\n{escape_body(results[topic].get(key) or '-') if topic in results else PENDING}"
+                for topic in topics
+            )
+            doc = CourseDocument.parse(content)
+            if key in doc.sections:
+                content = doc.replace_section(key, body)
+            else:
+                content = content.rstrip("\n") + f"\n\n## {title}\n{body}\n"
+        return content
+
+    def _write(self, path, topics, results):
+        """在文件锁内重新读取sounding，只替换两个部分后写回；文件已被删除时不写入"""
+        a = self.assistant
+        with file_lock(path):
+            content = a.read_file(path)
+            if content is None:
+                return False
+            a.write_file(path, self.render(content, topics, results))
+        return True
+
+    async def run(self, date=None):
+        """
+        填写date当天的sounding（需已存在），话题取自其Focus部分（为空时使用当天适用的Focus）
+        返回 {'path', 'topics': [每个话题的耗时], 'writes', 'took_ms'}
+        """
+        started = time.perf_counter()
+        a = self.assistant
+        date = date or a.today
+        path = a.charts / f"{date}_sounding.md"
+        content = await asyncio.to_thread(a.read_file, path)
+        if content is None:
+            raise FileNotFoundError(f"sounding不存在: {path}")
+        topics = split_topics(CourseDocument.parse(content).get("focus")) or split_topics(a.focus_for_date(date))
+
+        results = {}
+        writes = 0
+        write_lock = asyncio.Lock()
+
+        async def flush():
+            nonlocal writes
+            async with write_lock:
+                if await asyncio.to_thread(self._write, path, topics, dict(results)):
+                    writes += 1
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        timings = {}
+
+        async def one(topic):
+            parts, timing = await self._process(topic, date, semaphore)
+            results[topic] = parts
+            timings[topic] = timing
+            await flush()
+
+        if topics:
+            await flush()
+            await asyncio.gather(*(one(topic) for topic in topics))
+        return {
+            "path": str(path),
+            "topics": [timings[topic] for topic in topics],
+            "writes": writes,
+            "took_ms": _elapsed_ms(started),
+        }
@@ -0,0 +1,78 @@
+"""Progressive sounding writes must survive topic results that contain section breaks."""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add project root to path so we can import the root modules
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from course_doc import CourseDocument  # noqa: E402
+from sounding_pipeline import PENDING, SoundingPipeline  # noqa: E402
+
+DATE = "2026-10-17"
+SOUNDING = """# Sounding {date}
+
+## Focus
+- A
+- B
+
+## News Update
+[Auto-filled by the system]
+
+## Analysis Update
+[Auto-filled by the system]
+
+---
+## Notes
+keep me
+"""
+
+
+class StubAssistant:
+    """The parts of CompassAssistant the pipeline touches."""
+
+    use_api = False
+    config = {}
+
+    def __init__(self, root):
+        self.charts = Path(root)
+        self.today = DATE
+
+    def read_file(self, path):
+        path = Path(path)
+        return path.read_text(encoding="utf-8") if path.exists() else None
+
+    def write_file(self, path, content):
+        Path(path).write_text(content, encoding="utf-8")
+
+    def focus_for_date(self, date):
+        return ""
+
+
+def test_results_with_rules_and_headings_do_not_break_later_writes(tmp_path):
+    path = tmp_path / f"{DATE}_sounding.md"
+    path.write_text(SOUNDING.format(date=DATE), encoding="utf-8")
+
+    async def summarize(topic, material, date):
+        if topic == "B":
+            # A finishes first, so B's write re-parses the file that holds A's result.
+            await asyncio.sleep(0.05)
+        return {"news": f"line1 {topic}\n---\nline2 after rule {topic}\n## x\n# y", "analysis": f"ok {topic}"}
+
+    pipeline = SoundingPipeline(StubAssistant(tmp_path), fetch=lambda topic, date: [], summarize=summarize)
+    result = asyncio.run(pipeline.run(DATE))
+    text = path.read_text(encoding="utf-8")
+
+    assert result["writes"] == 3
+    assert PENDING not in text
+    for topic in ("A", "B"):
+        assert text.count(f"line2 after rule {topic}") == 1
+        assert text.count(f"### {topic}\n") == 2
+    assert text.count("keep me") == 1
+
+    doc = CourseDocument.parse(text)
+    news = text[doc.sections["news"].body_start:doc.sections["news"].end]
+    assert "line2 after rule A" in news and "line2 after rule B" in news
+    assert "#### x" in news and "### y" in news
+    assert doc.get("analysis") == "ok A\nok B\n"
@@ -0,0 +1,1037 @@
+"""
+Vault metadata index - SQLite-backed listing cache for the Obsidian vault
+
+Stores one row per indexed markdown file (path, kind, date, category, size,
+mtime, title, first line, preview and parsed course sections) so that listing
+endpoints and status checks never have to open every file on each call.
+
+Refresh is incremental:
+- flat folders (charts, navigation, template, harbor/*) are re-stat'ed and only
+  files whose (mtime, size) changed are re-read
+- logbook is listed again only when its own mtime changed (a day folder was
+  added or removed). Each day folder checked is listed again only when its
+  mtime changed; otherwise the files already indexed there are re-stat'ed
+  one by one, which catches in-place edits (e.g. an Obsidian save)
+- the first card refresh in a process (and refresh(force=True)) checks every
+  day folder; later ones check only the last RESTAT_CARD_DAYS days plus the
+  dates being read, so their cost does not grow with the age of the vault
+- writes made through CompassAssistant call touch() so they show up at once,
+  and so does the server's vault watcher for external edits (including
+  in-place edits of old cards); other external edits are picked up by the
+  next refresh, which is throttled to at most once every `refresh_interval`
+  seconds
+
+Cards, soundings, courses and harbor files are also tokenized into an FTS5
+full-text table and a tag table whenever they are (re)read; see search.py.
+Cards additionally feed the knowledge-map graph (wikilinks); cards and
+harbor files both keep their content terms with term frequencies in
+doc_terms, which the knowledge map (cards only) and the similarity engine
+read; see knowledge_map.py and similarity.py. Every change to doc_terms is
+logged in term_changes with an increasing sequence number, so in-memory
+structures built from it can catch up on just the changed paths, whichever
+process made the change. The digests table stores the per-day snapshots
+built by digest.py, context_packs the prompt context packs built by
+context_pack.py, and rollups the weekly/monthly course digests built by
+rollups.py together with the course files they were built from.
+
+card_days is a per-day card manifest (counts per card type, latest mtime and
+tag counts). It is recomputed for just the days touched whenever cards are
+indexed or removed, so date lists and calendar views never walk logbook:
+card_days() reads it as stored, once the first card refresh of the process
+has run.
+
+Harbor and template files can be long reports, so their catalog fields
+(title, first line, preview) come from their first HEADER_BYTES bytes.
+Templates are read only that far. Harbor files are read once, up to
+SEARCH_MAX_BYTES, for the full-text body, and the header is cut from the
+same read.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date as Date, timedelta
+from pathlib import Path
+
+from search import SEARCH_KINDS, extract_tags, index_text
+from knowledge_map import extract_links, extract_terms
+import instrumentation
+
+HARBOR_CATEGORIES = ["concepts", "frameworks", "companies", "people", "skills"]
+CARD_TYPES = ["insights", "fleeting"]
+KINDS = ["sounding", "course", "template", "harbor", "card"]
+# 保存词频（doc_terms）的类型
+TERM_KINDS = ("card", "harbor")
+
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+SCHEMA_VERSION = 8
+PREVIEW_CHARS = 300
+
+# 只读取文件开头的类型（catalog字段只需要标题和预览）
+HEADER_ONLY_KINDS = {"harbor", "template"}
+HEADER_BYTES = 1024
+# 长文档参与全文索引的最大字节数
+SEARCH_MAX_BYTES = 256 * 1024
+# 卡片增量刷新时检查的最近天数（更早的日期只在首次/强制刷新和按日期读取时检查）
+RESTAT_CARD_DAYS = 7
+# 扫描时每批写入的条目数（限制同时驻留内存的文件内容）
+UPSERT_BATCH = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    path       TEXT PRIMARY KEY,
+    dir        TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    date       TEXT,
+    category   TEXT,
+    size       INTEGER NOT NULL,
+    mtime_ns   INTEGER NOT NULL,
+    title      TEXT,
+    first_line TEXT,
+    preview    TEXT,
+    sections   TEXT
+);
+CREATE INDEX IF NOT EXISTS files_kind_date ON files (kind, date);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+CREATE TABLE IF NOT EXISTS dirs (
+    dir      TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS search_docs (
+    id   INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    path TEXT NOT NULL,
+    tag  TEXT NOT NULL,
+    PRIMARY KEY (path, tag)
+);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+CREATE TABLE IF NOT EXISTS links (
+    path   TEXT NOT NULL,
+    target TEXT NOT NULL,
+    PRIMARY KEY (path, target)
+);
+CREATE TABLE IF NOT EXISTS doc_terms (
+    path TEXT NOT NULL,
+    term TEXT NOT NULL,
+    tf   INTEGER NOT NULL,
+    PRIMARY KEY (path, term)
+);
+CREATE INDEX IF NOT EXISTS doc_terms_term ON doc_terms (term, path);
+CREATE TABLE IF NOT EXISTS term_changes (
+    path TEXT PRIMARY KEY,
+    seq  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS term_changes_seq ON term_changes (seq);
+CREATE TABLE IF NOT EXISTS card_days (
+    date     TEXT PRIMARY KEY,
+    insights INTEGER NOT NULL,
+    fleeting INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    tags     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS digests (
+    date      TEXT PRIMARY KEY,
+    signature TEXT NOT NULL,
+    data      TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS context_packs (
+    key       TEXT PRIMARY KEY,
+    date      TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    data      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS context_packs_date ON context_packs (date);
+CREATE TABLE IF NOT EXISTS rollups (
+    kind       TEXT NOT NULL,
+    period     TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date   TEXT NOT NULL,
+    inputs     TEXT NOT NULL,
+    data       TEXT NOT NULL,
+    PRIMARY KEY (kind, period)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+    title, body, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_TABLES = [
+    "files", "dirs", "search_docs", "tags", "links", "doc_terms", "term_changes",
+    "card_days", "digests", "context_packs", "rollups", "search_fts",
+]
+
+
+def _title_of(content):
+    """第一行非空文本（去掉markdown标题的#号）"""
+    for line in content.split("\n"):
+        if line.strip():
+            return line.strip().lstrip("#").strip()
+    return ""
+
+
+def read_text_prefix(path, max_bytes=None):
+    """
+    读取UTF-8文件的前max_bytes字节（None表示整个文件）
+    截断处不完整的多字节字符会被丢弃；文件不存在或无法解码时返回空字符串
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read() if max_bytes is None else f.read(max_bytes + 1)
+    except FileNotFoundError:
+        return ""
+    instrumentation.record_read(len(data))
+    if max_bytes is not None and len(data) > max_bytes:
+        return data[:max_bytes].decode("utf-8", errors="ignore")
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return ""
+
+
+class VaultIndex:
+    """
+    vault文件元数据索引
+
+    参数:
+    - db_path: SQLite文件路径（保存在项目目录）
+    - vault_root: obsidian_path
+    - folders: config['folders']
+    - parse_course: course解析函数，结果以JSON保存在sections列
+    - refresh_interval: 两次自动刷新之间的最短间隔（秒）
+    """
+
+    def __init__(self, db_path, vault_root, folders, parse_course=None, refresh_interval=2.0):
+        self.db_path = Path(db_path)
+        self.vault_root = Path(vault_root)
+        self.folders = dict(folders)
+        self.parse_course = parse_course
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.RLock()
+        self._last_refresh = {}
+        # 本次事务中卡片有变化的日期（事务结束前更新card_days）
+        self._dirty_days = set()
+
+        self.db = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=10)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+
+    # ------------------------------------------------------------------
+    # Schema
+    # ------------------------------------------------------------------
+
+    def _signature(self):
+        return json.dumps(
+            {"version": SCHEMA_VERSION, "vault": str(self.vault_root), "folders": self.folders},
+            sort_keys=True,
+        )
+
+    def _init_schema(self):
+        with self._lock, self.db:
+            self.db.executescript(_SCHEMA)
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+            if row is None or row["value"] != self._signature():
+                # 不同的vault/目录配置/表结构：丢弃旧数据重新建立
+                self.db.executescript(
+                    "".join(f"DROP TABLE IF EXISTS {t};" for t in _TABLES) + _SCHEMA
+                )
+                self.db.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('signature', ?)",
+                    (self._signature(),),
+                )
+                # 每次重建都换一个generation：term_changes的序号从头开始，外部缓存据此失效
+                self.db.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)",
+                    (f"{time.time_ns():x}",),
+                )
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    # ------------------------------------------------------------------
+    # Path classification
+    # ------------------------------------------------------------------
+
+    def _rel(self, path):
+        return Path(path).relative_to(self.vault_root).as_posix()
+
+    def classify(self, relpath):
+        """
+        根据vault内的相对路径判断文件类型
+        返回 (kind, category, date)，不属于索引范围时返回None
+        """
+        parts = relpath.split("/")
+        name = parts[-1]
+        if not name.endswith(".md"):
+            return None
+        top = parts[0]
+        if len(parts) == 2:
+            if top == self.folders["charts"] and name.endswith("_sounding.md"):
+                return ("sounding", None, name[: -len("_sounding.md")])
+            if top == self.folders["navigation"] and name.endswith("course.md"):
+                return ("course", None, name[: -len("course.md")].rstrip("_"))
+            if top == self.folders["template"]:
+                return ("template", None, None)
+        elif len(parts) == 3:
+            if top == self.folders["harbor"] and parts[1] in HARBOR_CATEGORIES:
+                return ("harbor", parts[1], None)
+        elif len(parts) == 4:
+            if top == self.folders["logbook"] and DATE_RE.match(parts[1]) and parts[2] in CARD_TYPES:
+                return ("card", parts[2], parts[1])
+        return None
+
+    # ------------------------------------------------------------------
+    # Indexing
+    # ------------------------------------------------------------------
+
+    def _read_entry(self, relpath, kind, category, date, st):
+        """
+        读取文件并生成索引行，返回 (行, 全文索引用的内容)
+        harbor/template的catalog字段只取文件头：template只读取文件头，
+        harbor（参与全文索引）只读取一次，最多SEARCH_MAX_BYTES字节
+        """
+        path = self.vault_root / relpath
+        if kind in HEADER_ONLY_KINDS:
+            if kind in SEARCH_KINDS:
+                # 全文索引本来就要读取正文：文件头取自同一次读取的开头，不再单独打开文件
+                content = read_text_prefix(path, SEARCH_MAX_BYTES)
+                header = content[:HEADER_BYTES].encode("utf-8")[:HEADER_BYTES].decode("utf-8", errors="ignore")
+            else:
+                header = read_text_prefix(path, HEADER_BYTES)
+                content = None
+        else:
+            header = content = read_text_prefix(path)
+
+        sections = None
+        if kind == "course" and self.parse_course:
+            sections = json.dumps(
+                {k: v.strip() for k, v in self.parse_course(content).items()},
+                ensure_ascii=False,
+            )
+
+        dirname, _, name = relpath.rpartition("/")
+        row = (
+            relpath,
+            dirname,
+            name,
+            kind,
+            date,
+            category,
+            st.st_size,
+            st.st_mtime_ns,
+            _title_of(header),
+            header.split("\n")[0].strip(),
+            header[:PREVIEW_CHARS],
+            sections,
+        )
+        return row, content
+
+    def read_text(self, relpath, max_bytes=None):
+        """读取vault内文件（可只读前max_bytes字节）"""
+        return read_text_prefix(self.vault_root / relpath, max_bytes)
+
+    def _upsert(self, entries):
+        """写入 _read_entry() 生成的条目，并更新全文索引"""
+        self.db.executemany(
+            "INSERT OR REPLACE INTO files "
+            "(path, dir, name, kind, date, category, size, mtime_ns, title, first_line, preview, sections) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [row for row, _ in entries],
+        )
+        for row, content in entries:
+            if row[3] in SEARCH_KINDS:
+                self._index_search(row[0], row[8], content)
+            if row[3] in TERM_KINDS:
+                self._index_terms(row[0], content)
+            if row[3] == "card":
+                self._index_graph(row[0], content)
+                self._dirty_days.add(row[4])
+
+    def _index_search(self, relpath, title, content):
+        found = self.db.execute("SELECT id FROM search_docs WHERE path = ?", (relpath,)).fetchone()
+        if found is not None:
+            docid = found["id"]
+            self.db.execute("DELETE FROM search_fts WHERE rowid = ?", (docid,))
+        else:
+            docid = self.db.execute("INSERT INTO search_docs (path) VALUES (?)", (relpath,)).lastrowid
+        self.db.execute(
+            "INSERT INTO search_fts (rowid, title, body) VALUES (?, ?, ?)",
+            (docid, index_text(title), index_text(content)),
+        )
+        self.db.execute("DELETE FROM tags WHERE path = ?", (relpath,))
+        self.db.executemany(
+            "INSERT OR IGNORE INTO tags (path, tag) VALUES (?, ?)",
+            [(relpath, tag) for tag in extract_tags(content)],
+        )
+
+    def _index_graph(self, relpath, content):
+        """卡片的链接（知识图谱用）"""
+        self.db.execute("DELETE FROM links WHERE path = ?", (relpath,))
+        self.db.executemany(
+            "INSERT OR IGNORE INTO links (path, target) VALUES (?, ?)",
+            [(relpath, target) for target in extract_links(content)],
+        )
+
+    def _index_terms(self, relpath, content):
+        """卡片和harbor文件的词频（知识图谱和相似度计算用）"""
+        self.db.execute("DELETE FROM doc_terms WHERE path = ?", (relpath,))
+        self.db.executemany(
+            "INSERT INTO doc_terms (path, term, tf) VALUES (?, ?, ?)",
+            [(relpath, term, tf) for term, tf in extract_terms(content)],
+        )
+        self._log_term_change(relpath)
+
+    def _log_term_change(self, relpath):
+        self.db.execute(
+            "INSERT OR REPLACE INTO term_changes (path, seq) "
+            "VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM term_changes))",
+            (relpath,),
+        )
+
+    def _delete_paths(self, relpaths):
+        """删除文件的索引行及其全文索引"""
+        for relpath in relpaths:
+            info = self.classify(relpath)
+            if info is not None and info[0] == "card":
+                self._dirty_days.add(info[2])
+            if info is not None and info[0] in TERM_KINDS:
+                self._log_term_change(relpath)
+            self.db.execute("DELETE FROM files WHERE path = ?", (relpath,))
+            found = self.db.execute("SELECT id FROM search_docs WHERE path = ?", (relpath,)).fetchone()
+            if found is not None:
+                self.db.execute("DELETE FROM search_fts WHERE rowid = ?", (found["id"],))
+                self.db.execute("DELETE FROM search_docs WHERE id = ?", (found["id"],))
+            self.db.execute("DELETE FROM tags WHERE path = ?", (relpath,))
+            self.db.execute("DELETE FROM links WHERE path = ?", (relpath,))
+            self.db.execute("DELETE FROM doc_terms WHERE path = ?", (relpath,))
+
+    def _delete_dir(self, reldir):
+        paths = [r["path"] for r in self.db.execute("SELECT path FROM files WHERE dir = ?", (reldir,))]
+        self._delete_paths(paths)
+        self.db.execute("DELETE FROM dirs WHERE dir = ?", (reldir,))
+
+    def _scan_dir(self, reldir, trust_dir_mtime=False):
+        """
+        增量扫描单个目录：只重新读取mtime或大小发生变化的文件
+        trust_dir_mtime=True时，目录mtime未变化则不列目录，只逐个stat已索引的文件
+        （原地编辑不改变目录mtime，但会改变文件自身的mtime/大小）
+        """
+        directory = self.vault_root / reldir
+        try:
+            instrumentation.record_stat()
+            dir_mtime = directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._delete_dir(reldir)
+            return
+
+        if trust_dir_mtime:
+            row = self.db.execute("SELECT mtime_ns FROM dirs WHERE dir = ?", (reldir,)).fetchone()
+            if row is not None and row["mtime_ns"] == dir_mtime:
+                self._restat_known(reldir)
+                return
+
+        known = {
+            r["name"]: (r["mtime_ns"], r["size"])
+            for r in self.db.execute("SELECT name, mtime_ns, size FROM files WHERE dir = ?", (reldir,))
+        }
+        changed = []
+        seen = set()
+        with os.scandir(directory) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                relpath = f"{reldir}/{entry.name}"
+                info = self.classify(relpath)
+                if info is None:
+                    continue
+                seen.add(entry.name)
+                st = entry.stat()
+                instrumentation.record_stat()
+                if known.get(entry.name) != (st.st_mtime_ns, st.st_size):
+                    changed.append(self._read_entry(relpath, *info, st))
+                    if len(changed) >= UPSERT_BATCH:
+                        self._upsert(changed)
+                        changed = []
+
+        if changed:
+            self._upsert(changed)
+        removed = [f"{reldir}/{name}" for name in known.keys() - seen]
+        if removed:
+            self._delete_paths(removed)
+        self.db.execute(
+            "INSERT OR REPLACE INTO dirs (dir, mtime_ns) VALUES (?, ?)", (reldir, dir_mtime)
+        )
+
+    def _restat_known(self, reldir):
+        """逐个stat目录中已索引的文件，重新读取mtime或大小发生变化的文件"""
+        changed, removed = [], []
+        rows = self.db.execute("SELECT name, mtime_ns, size FROM files WHERE dir = ?", (reldir,)).fetchall()
+        instrumentation.record_stat(len(rows))
+        # 字符串拼接而非Path：大vault上每次刷新要stat全部卡片
+        prefix = os.path.join(self.vault_root, reldir, "")
+        for r in rows:
+            relpath = f"{reldir}/{r['name']}"
+            try:
+                st = os.stat(prefix + r["name"])
+            except FileNotFoundError:
+                removed.append(relpath)
+                continue
+            if (st.st_mtime_ns, st.st_size) != (r["mtime_ns"], r["size"]):
+                info = self.classify(relpath)
+                if info is not None:
+                    changed.append(self._read_entry(relpath, *info, st))
+        if changed:
+            self._upsert(changed)
+        if removed:
+            self._delete_paths(removed)
+
+    def _scan_logbook(self, full=False, dates=()):
+        """
+        刷新卡片索引
+        full=True时检查所有日期目录；否则只在logbook目录mtime变化时列出它（新增/删除的日期），
+        并只检查最近RESTAT_CARD_DAYS天和dates中的日期
+        """
+        logbook = self.folders["logbook"]
+        root = self.vault_root / logbook
+        instrumentation.record_stat()
+        try:
+            root_mtime = root.stat().st_mtime_ns
+        except FileNotFoundError:
+            root_mtime = None
+        row = self.db.execute("SELECT mtime_ns FROM dirs WHERE dir = ?", (logbook,)).fetchone()
+
+        days = set(dates)
+        if full or row is None or row["mtime_ns"] != root_mtime:
+            on_disk = set()
+            if root_mtime is not None:
+                with os.scandir(root) as it:
+                    on_disk = {e.name for e in it if e.is_dir() and DATE_RE.match(e.name)}
+            known = {r["date"] for r in self.db.execute("SELECT DISTINCT date FROM files WHERE kind = 'card'")}
+            # 整个日期目录被删除
+            for date in known - on_disk:
+                for ct in CARD_TYPES:
+                    self._delete_dir(f"{logbook}/{date}/{ct}")
+            days |= on_disk if full else on_disk - known
+            if root_mtime is None:
+                self.db.execute("DELETE FROM dirs WHERE dir = ?", (logbook,))
+            else:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO dirs (dir, mtime_ns) VALUES (?, ?)", (logbook, root_mtime)
+                )
+        if not full:
+            today = Date.today()
+            days.update((today - timedelta(days=i)).isoformat() for i in range(RESTAT_CARD_DAYS))
+        self._scan_card_days(days)
+
+    def _scan_card_days(self, dates):
+        """检查指定日期的卡片目录（目录mtime未变化时逐个stat已索引的卡片）"""
+        logbook = self.folders["logbook"]
+        for date in sorted(dates):
+            for ct in CARD_TYPES:
+                self._scan_dir(f"{logbook}/{date}/{ct}", trust_dir_mtime=True)
+
+    def refresh(self, kinds=None, force=False, dates=None):
+        """
+        增量刷新指定类型的索引（默认全部）
+        force=False时，距上次刷新不足refresh_interval秒的类型会被跳过
+        dates: 要读取的卡片日期，即使卡片刚刷新过也会检查（同样按refresh_interval节流）
+        """
+        kinds = KINDS if kinds is None else kinds
+        now = time.monotonic()
+
+        def fresh(key):
+            return not force and now - self._last_refresh.get(key, float("-inf")) < self.refresh_interval
+
+        with instrumentation.span("index"), self._lock, self.db:
+            for kind in kinds:
+                if kind == "card":
+                    # 要读取的日期即使卡片刚刷新过也单独检查
+                    wanted = [d for d in dates or () if DATE_RE.match(d) and not fresh(("card", d))]
+                    if not fresh(kind):
+                        self._scan_logbook(full=force or kind not in self._last_refresh, dates=wanted)
+                        self._last_refresh[kind] = now
+                    elif wanted:
+                        self._scan_card_days(wanted)
+                    self._last_refresh.update({("card", d): now for d in wanted})
+                    continue
+                if fresh(kind):
+                    continue
+                if kind == "sounding":
+                    self._scan_dir(self.folders["charts"])
+                elif kind == "course":
+                    self._scan_dir(self.folders["navigation"])
+                elif kind == "template":
+                    self._scan_dir(self.folders["template"])
+                elif kind == "harbor":
+                    for cat in HARBOR_CATEGORIES:
+                        self._scan_dir(f"{self.folders['harbor']}/{cat}")
+                else:
+                    raise ValueError(f"Unknown kind: {kind}")
+                self._last_refresh[kind] = now
+            self._update_card_days()
+
+    def expire(self):
+        """让下一次读取不受refresh_interval限制，重新检查文件"""
+        with self._lock:
+            for key in self._last_refresh:
+                self._last_refresh[key] = float("-inf")
+
+    def touch(self, *paths):
+        """文件被写入或删除后立即更新对应的索引行（多个文件在同一事务内完成）"""
+        targets = []
+        for path in paths:
+            try:
+                relpath = self._rel(path)
+            except ValueError:
+                continue
+            info = self.classify(relpath)
+            if info is not None:
+                targets.append((relpath, info))
+        if not targets:
+            return
+        with self._lock, self.db:
+            changed, removed = [], []
+            for relpath, info in targets:
+                instrumentation.record_stat()
+                try:
+                    st = os.stat(self.vault_root / relpath)
+                except FileNotFoundError:
+                    removed.append(relpath)
+                    continue
+                changed.append(self._read_entry(relpath, *info, st))
+                if len(changed) >= UPSERT_BATCH:
+                    self._upsert(changed)
+                    changed = []
+            if changed:
+                self._upsert(changed)
+            if removed:
+                self._delete_paths(removed)
+            self._update_card_days()
+
+    def _update_card_days(self):
+        """重新统计有变化的日期的card_days行（在写入事务内调用）"""
+        dates, self._dirty_days = self._dirty_days, set()
+        if not dates:
+            return
+        days = {d: {"insights": 0, "fleeting": 0, "mtime_ns": 0, "tags": {}} for d in dates}
+        for r in self._select_in(
+            "SELECT date, category, COUNT(*) AS n, MAX(mtime_ns) AS mtime_ns FROM files "
+            "WHERE kind = 'card' AND date IN ({marks}) GROUP BY date, category",
+            dates,
+        ):
+            day = days[r["date"]]
+            day[r["category"]] = r["n"]
+            day["mtime_ns"] = max(day["mtime_ns"], r["mtime_ns"])
+        for r in self._select_in(
+            "SELECT f.date, t.tag, COUNT(*) AS n FROM tags t JOIN files f ON f.path = t.path "
+            "WHERE f.kind = 'card' AND f.date IN ({marks}) GROUP BY f.date, t.tag",
+            dates,
+        ):
+            days[r["date"]]["tags"][r["tag"]] = r["n"]
+
+        for date, day in days.items():
+            if day["insights"] or day["fleeting"]:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO card_days (date, insights, fleeting, mtime_ns, tags) VALUES (?, ?, ?, ?, ?)",
+                    (date, day["insights"], day["fleeting"], day["mtime_ns"],
+                     json.dumps(day["tags"], ensure_ascii=False, sort_keys=True)),
+                )
+            else:
+                self.db.execute("DELETE FROM card_days WHERE date = ?", (date,))
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _to_dict(row):
+        entry = dict(row)
+        entry["sections"] = json.loads(entry["sections"]) if entry["sections"] else None
+        return entry
+
+    def list(self, kind, category=None, date=None, descending=False,
+             before=None, date_from=None, date_to=None, limit=None):
+        """
+        列出某类文件的索引行（按文件名排序）
+
+        - before: 只返回date早于该日期的行（倒序分页的游标）
+        - date_from / date_to: 日期范围（含边界）
+        - limit: 最多返回的行数
+        """
+        self.refresh([kind], dates=[date] if kind == "card" and date else None)
+        sql = "SELECT * FROM files WHERE kind = ?"
+        params = [kind]
+        if category is not None:
+            sql += " AND category = ?"
+            params.append(category)
+        if date is not None:
+            sql += " AND date = ?"
+            params.append(date)
+        if before is not None:
+            sql += " AND date < ?"
+            params.append(before)
+        if date_from is not None:
+            sql += " AND date >= ?"
+            params.append(date_from)
+        if date_to is not None:
+            sql += " AND date <= ?"
+            params.append(date_to)
+        sql += " ORDER BY name DESC" if descending else " ORDER BY name"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [self._to_dict(r) for r in self.db.execute(sql, params)]
+
+    def get(self, path):
+        """按路径获取单个文件的索引行"""
+        try:
+            relpath = self._rel(path)
+        except ValueError:
+            return None
+        info = self.classify(relpath)
+        if info is None:
+            return None
+        self.refresh([info[0]], dates=[info[2]] if info[0] == "card" else None)
+        with self._lock:
+            row = self.db.execute("SELECT * FROM files WHERE path = ?", (relpath,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def get_many(self, relpaths):
+        """按相对路径批量获取索引行：{路径: 行}（不刷新索引）"""
+        with self._lock:
+            rows = self._select_in("SELECT * FROM files WHERE path IN ({marks})", relpaths)
+        return {r["path"]: self._to_dict(r) for r in rows}
+
+    def fingerprint(self, kind):
+        """
+        某类文件的整体指纹（数量、mtime之和、大小之和、最新mtime）
+        任何增删改都会改变指纹，用于列表接口的ETag
+        （mtime取低32位再求和，避免纳秒时间戳累加溢出64位整数）
+        """
+        self.refresh([kind])
+        with self._lock:
+            row = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(mtime_ns % 4294967296), 0), COALESCE(SUM(size), 0), MAX(mtime_ns) "
+                "FROM files WHERE kind = ?",
+                (kind,),
+            ).fetchone()
+        return tuple(row)
+
+    def _load_cards(self):
+        """
+        card_days按已保存的状态读取：只在本进程第一次用到卡片时完整刷新一次，
+        之后由touch()（写入和vault watcher）和卡片列表的刷新维护
+        """
+        if "card" not in self._last_refresh:
+            self.refresh(["card"])
+
+    def card_dates(self, date_from=None, date_to=None):
+        """有卡片的日期列表（倒序，可限定日期范围）"""
+        return [day["date"] for day in self.card_days(date_from, date_to)]
+
+    def card_days(self, date_from=None, date_to=None):
+        """
+        每日卡片清单（倒序，可限定日期范围，含边界）
+        每项为 {'date', 'insights', 'fleeting', 'mtime_ns', 'tags': {标签: 卡片数}}
+        """
+        self._load_cards()
+        sql = "SELECT * FROM card_days WHERE 1 = 1"
+        params = []
+        if date_from is not None:
+            sql += " AND date >= ?"
+            params.append(date_from)
+        if date_to is not None:
+            sql += " AND date <= ?"
+            params.append(date_to)
+        sql += " ORDER BY date DESC"
+        with self._lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return [
+            {
+                "date": r["date"],
+                "insights": r["insights"],
+                "fleeting": r["fleeting"],
+                "mtime_ns": r["mtime_ns"],
+                "tags": json.loads(r["tags"]),
+            }
+            for r in rows
+        ]
+
+    def card_days_fingerprint(self):
+        """card_days的整体指纹（天数、卡片总数、mtime之和），用于ETag"""
+        self._load_cards()
+        with self._lock:
+            row = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(insights + fleeting), 0), "
+                "COALESCE(SUM(mtime_ns % 4294967296), 0), COALESCE(SUM(length(tags)), 0) FROM card_days"
+            ).fetchone()
+        return tuple(row)
+
+    def search_rows(self, match, kinds, tags, date_from, date_to, limit, offset, weights):
+        """
+        全文检索查询（由search.search()调用）
+        match为空时只按标签过滤，按日期倒序；返回 (行列表, 总数)
+        """
+        where = [f"f.kind IN ({','.join('?' * len(kinds))})"]
+        params = list(kinds)
+        if date_from is not None:
+            where.append("f.date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            where.append("f.date <= ?")
+            params.append(date_to)
+        if tags:
+            where.append(
+                f"f.path IN (SELECT path FROM tags WHERE tag IN ({','.join('?' * len(tags))}) "
+                "GROUP BY path HAVING COUNT(*) = ?)"
+            )
+            params.extend(tags)
+            params.append(len(tags))
+
+        if match:
+            source = (
+                "search_fts JOIN search_docs d ON d.id = search_fts.rowid "
+                "JOIN files f ON f.path = d.path"
+            )
+            where.insert(0, "search_fts MATCH ?")
+            params.insert(0, match)
+            score = "-bm25(search_fts, ?, ?)"
+            order = "score DESC"
+            score_params = list(weights)
+        else:
+            source = "files f"
+            score = "0.0"
+            order = "f.date DESC, f.name"
+            score_params = []
+
+        clause = " AND ".join(where)
+        with self._lock:
+            total = self.db.execute(
+                f"SELECT COUNT(*) FROM {source} WHERE {clause}", params
+            ).fetchone()[0]
+            rows = self.db.execute(
+                f"SELECT f.path, f.kind, f.name, f.title, f.date, f.category, {score} AS score "
+                f"FROM {source} WHERE {clause} ORDER BY {order} LIMIT ? OFFSET ?",
+                score_params + params + [limit, offset],
+            ).fetchall()
+        return [dict(r) for r in rows], total
+
+    # ------------------------------------------------------------------
+    # Knowledge map graph
+    # ------------------------------------------------------------------
+
+    def _select_in(self, sql, values, extra=()):
+        """对IN (...) 查询分批执行（SQLite参数个数有上限）"""
+        values = list(values)
+        rows = []
+        for i in range(0, len(values), 500):
+            chunk = values[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            rows.extend(self.db.execute(sql.format(marks=marks), list(extra) + chunk).fetchall())
+        return rows
+
+    def graph_features(self, paths):
+        """卡片的标签、链接目标和词频：{path: {'tags': [...], 'links': [...], 'terms': {词: 词频}}}"""
+        features = {p: {"tags": [], "links": [], "terms": {}} for p in paths}
+        if not features:
+            return features
+        with self._lock:
+            for r in self._select_in("SELECT path, tag FROM tags WHERE path IN ({marks})", features):
+                features[r["path"]]["tags"].append(r["tag"])
+            for r in self._select_in("SELECT path, target FROM links WHERE path IN ({marks})", features):
+                features[r["path"]]["links"].append(r["target"])
+            for r in self._select_in("SELECT path, term, tf FROM doc_terms WHERE path IN ({marks})", features):
+                features[r["path"]]["terms"][r["term"]] = r["tf"]
+        return features
+
+    def related_cards(self, link_targets, tags, before, limit):
+        """
+        早于before的卡片中，文件名被link_targets链接到、或带有tags中标签的卡片
+        按日期倒序，最多limit张
+        """
+        link_targets, tags = list(link_targets), list(tags)
+        if not (link_targets or tags):
+            return []
+        found = {}
+        with self._lock:
+            if link_targets:
+                for r in self._select_in(
+                    "SELECT * FROM files WHERE kind = 'card' AND date < ? "
+                    "AND lower(substr(name, 1, length(name) - 3)) IN ({marks})",
+                    link_targets, (before,),
+                ):
+                    found[r["path"]] = self._to_dict(r)
+            if tags:
+                for r in self._select_in(
+                    "SELECT f.* FROM files f WHERE f.kind = 'card' AND f.date < ? "
+                    "AND f.path IN (SELECT path FROM tags WHERE tag IN ({marks})) "
+                    f"ORDER BY f.date DESC LIMIT {int(limit)}",
+                    tags, (before,),
+                ):
+                    found.setdefault(r["path"], self._to_dict(r))
+        return sorted(found.values(), key=lambda e: (e["date"], e["path"]), reverse=True)[:limit]
+
+    def term_doc_freq(self, terms):
+        """(卡片总数, {词: 包含该词的卡片数})"""
+        with self._lock:
+            total = self.db.execute("SELECT COUNT(*) FROM files WHERE kind = 'card'").fetchone()[0]
+            # 卡片的路径都以logbook目录开头（doc_terms_term索引覆盖term和path）
+            prefix = self.folders["logbook"] + "/"
+            rows = self._select_in(
+                "SELECT term, COUNT(*) AS df FROM doc_terms "
+                "WHERE substr(path, 1, ?) = ? AND term IN ({marks}) GROUP BY term",
+                terms, (len(prefix), prefix),
+            )
+        return total, {r["term"]: r["df"] for r in rows}
+
+    # ------------------------------------------------------------------
+    # Term vectors (similarity.py)
+    # ------------------------------------------------------------------
+
+    def generation(self):
+        """索引数据的代号（表被清空重建时改变）"""
+        with self._lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row["value"] if row else ""
+
+    def term_changes(self, since=None):
+        """
+        (当前序号, 序号大于since的路径)：这些路径的词频被更新或删除过
+        since为None时只返回当前序号
+        """
+        with self._lock:
+            seq = self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM term_changes").fetchone()[0]
+            if since is None:
+                return seq, []
+            rows = self.db.execute("SELECT path FROM term_changes WHERE seq > ?", (since,)).fetchall()
+        return seq, [r["path"] for r in rows]
+
+    def term_stats(self):
+        """(文档数, {词: 包含该词的文档数})，统计范围为TERM_KINDS"""
+        marks = ",".join("?" * len(TERM_KINDS))
+        with self._lock:
+            total = self.db.execute(f"SELECT COUNT(*) FROM files WHERE kind IN ({marks})", TERM_KINDS).fetchone()[0]
+            rows = self.db.execute("SELECT term, COUNT(*) AS df FROM doc_terms GROUP BY term").fetchall()
+        return total, {r["term"]: r["df"] for r in rows}
+
+    def doc_terms(self, paths):
+        """{路径: (类型, {词: 词频})}，没有词频的路径不出现"""
+        found = {}
+        with self._lock:
+            for r in self._select_in("SELECT path, term, tf FROM doc_terms WHERE path IN ({marks})", paths):
+                if r["path"] not in found:
+                    found[r["path"]] = (self.classify(r["path"])[0], {})
+                found[r["path"]][1][r["term"]] = r["tf"]
+        return found
+
+    def iter_doc_terms(self):
+        """
+        按路径顺序逐个返回 (路径, 类型, {词: 词频})
+        使用单独的只读连接，长时间的批量读取不占用索引锁
+        """
+        db = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            current, terms = None, {}
+            for path, term, tf in db.execute("SELECT path, term, tf FROM doc_terms ORDER BY path"):
+                if path != current:
+                    if current is not None:
+                        yield current, self.classify(current)[0], terms
+                    current, terms = path, {}
+                terms[term] = tf
+            if current is not None:
+                yield current, self.classify(current)[0], terms
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------
+    # Daily digests
+    # ------------------------------------------------------------------
+
+    def get_digest(self, date):
+        """(签名, 快照数据)，没有时返回None"""
+        with self._lock:
+            row = self.db.execute("SELECT signature, data FROM digests WHERE date = ?", (date,)).fetchone()
+        return (row["signature"], json.loads(row["data"])) if row else None
+
+    def put_digest(self, date, signature, data):
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO digests (date, signature, data) VALUES (?, ?, ?)",
+                (date, signature, json.dumps(data, ensure_ascii=False)),
+            )
+
+    # ------------------------------------------------------------------
+    # Context packs
+    # ------------------------------------------------------------------
+
+    def get_context_pack(self, key):
+        """(签名, 数据)，没有时返回None"""
+        with self._lock:
+            row = self.db.execute("SELECT signature, data FROM context_packs WHERE key = ?", (key,)).fetchone()
+        return (row["signature"], json.loads(row["data"])) if row else None
+
+    def put_context_pack(self, key, date, signature, data, keep_from=None):
+        """保存context pack；keep_from不为None时删除date早于它的旧记录"""
+        with self._lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO context_packs (key, date, signature, data) VALUES (?, ?, ?, ?)",
+                (key, date, signature, json.dumps(data, ensure_ascii=False)),
+            )
+            if keep_from is not None:
+                self.db.execute("DELETE FROM context_packs WHERE date < ?", (keep_from,))
+
+    def rollup_inputs(self, kind):
+        """某类rollup各周期的输入记录：{周期: inputs}"""
+        with self._lock:
+            rows = self.db.execute("SELECT period, inputs FROM rollups WHERE kind = ?", (kind,)).fetchall()
+        return {r["period"]: r["inputs"] for r in rows}
+
+    def put_rollups(self, kind, rows, removed=()):
+        """保存rollup（rows为 (周期, 开始日期, 结束日期, inputs, 数据)），并删除removed中的周期"""
+        with self._lock, self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO rollups (kind, period, start_date, end_date, inputs, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(kind, period, start, end, inputs, json.dumps(data, ensure_ascii=False))
+                 for period, start, end, inputs, data in rows],
+            )
+            self.db.executemany("DELETE FROM rollups WHERE kind = ? AND period = ?", [(kind, p) for p in removed])
+
+    def list_rollups(self, kind, date_from=None, date_to=None, limit=None):
+        """与 [date_from, date_to] 有交集的rollup数据（按开始日期倒序，最多limit条）"""
+        sql = "SELECT data FROM rollups WHERE kind = ?"
+        params = [kind]
+        if date_from is not None:
+            sql += " AND end_date >= ?"
+            params.append(date_from)
+        if date_to is not None:
+            sql += " AND start_date <= ?"
+            params.append(date_to)
+        sql += " ORDER BY start_date DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [json.loads(r["data"]) for r in self.db.execute(sql, params)]
+
+    def get_rollup(self, kind, period):
+        with self._lock:
+            row = self.db.execute(
+                "SELECT data FROM rollups WHERE kind = ? AND period = ?", (kind, period)
+            ).fetchone()
+        return json.loads(row["data"]) if row else None
@@ -0,0 +1,146 @@
+"""
+Crash-safe vault writes - atomic replace plus per-file advisory locks
+
+All vault mutations (CompassAssistant.write_file, card appends, save_state,
+the server's PATCH endpoints) go through this module so that concurrent
+writers - several uvicorn workers, the CLI and a Claude session - can never
+interleave or truncate a file:
+
+- atomic_write() writes to a hidden temp file in the same directory, fsyncs
+  it, renames it over the target and fsyncs the directory, so readers see
+  either the old or the new content, never a partial file
+- file_lock() serializes writers of the same path, across threads (RLock) and
+  across processes (fcntl.flock on a lock file under the project directory).
+  Paths are hashed onto a fixed set of lock stripes, so the number of lock
+  files stays bounded. The lock is re-entrant within a thread, so a locked
+  read-modify-write may call atomic_write()/write_file() again
+
+atomic_write() also drops the replaced path from content_cache.
+"""
+
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import content_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows：只有进程内的线程锁
+    fcntl = None
+
+LOCK_DIR = Path(__file__).parent / ".locks"
+LOCK_STRIPES = 64
+
+
+class _Stripe:
+    """
+    一个锁分片：线程间用RLock，进程间用flock（首次进入时加锁，最后退出时释放）
+    锁文件描述符在进程内保持打开；fork出的子进程会重新打开，
+    否则父子进程共享同一个打开的文件，flock无法互斥
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.rlock = threading.RLock()
+        self.depth = 0
+        self.fd = None
+        self.pid = None
+
+    def _lock_fd(self):
+        if self.fd is None or self.pid != os.getpid():
+            LOCK_DIR.mkdir(parents=True, exist_ok=True)
+            self.fd = os.open(LOCK_DIR / f"{self.index:02x}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            self.pid = os.getpid()
+        return self.fd
+
+    def acquire(self):
+        self.rlock.acquire()
+        if self.depth == 0 and fcntl is not None:
+            try:
+                fcntl.flock(self._lock_fd(), fcntl.LOCK_EX)
+            except BaseException:
+                self.rlock.release()
+                raise
+        self.depth += 1
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0 and fcntl is not None:
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            finally:
+                self.rlock.release()
+        else:
+            self.rlock.release()
+
+
+_stripes = [_Stripe(i) for i in range(LOCK_STRIPES)]
+
+
+def _stripe_for(path):
+    key = os.path.abspath(os.fspath(path)).encode("utf-8", "surrogateescape")
+    return _stripes[int.from_bytes(hashlib.sha1(key).digest()[:4], "big") % LOCK_STRIPES]
+
+
+@contextmanager
+def file_lock(path):
+    """对path加独占写锁（线程间+进程间，可重入）"""
+    stripe = _stripe_for(path)
+    stripe.acquire()
+    try:
+        yield
+    finally:
+        stripe.release()
+
+
+def fsync_dir(directory):
+    """fsync目录本身，使其中的rename/新建持久化"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, content, encoding="utf-8", sync_dir=True):
+    """
+    原子写入：临时文件 + fsync + rename
+    目标文件已存在时保留其权限位
+    sync_dir=False时不fsync所在目录，由调用方批量写完后统一调用fsync_dir()
+    """
+    path = Path(path)
+    data = content.encode(encoding) if isinstance(content, str) else content
+
+    with file_lock(path):
+        # 临时文件与目标同目录（rename才是原子的），以"."开头，watcher和索引都会忽略
+        tmp = path.parent / f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            try:
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            except FileNotFoundError:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.chmod(tmp, os.stat(path).st_mode & 0o777)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp, path)
+            content_cache.invalidate(path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        if sync_dir:
+            fsync_dir(path.parent)
+
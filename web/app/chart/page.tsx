@@ -3,24 +3,52 @@
 import { useEffect, useState } from 'react'
 import ReactMarkdown from 'react-markdown'
 import { AppShell } from '@/components/AppShell'
-import { fetchCharts, Chart } from '@/lib/api'
+import { fetchChart, fetchChartSummaries, ChartSummary } from '@/lib/api'
+
+const PAGE_SIZE = 30
 
 export default function ChartPage() {
-  const [charts, setCharts] = useState<Chart[]>([])
-  const [selected, setSelected] = useState<Chart | null>(null)
+  const [charts, setCharts] = useState<ChartSummary[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [selected, setSelected] = useState<ChartSummary | null>(null)
+  const [content, setContent] = useState<string>('')
   const [loading, setLoading] = useState(true)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [error, setError] = useState<string | null>(null)
 
   useEffect(() => {
-    fetchCharts()
-      .then(({ charts: data }) => {
+    fetchChartSummaries(PAGE_SIZE)
+      .then(({ charts: data, next_cursor }) => {
         setCharts(data)
+        setNextCursor(next_cursor)
         if (data.length > 0) setSelected(data[0])
       })
       .catch((e: Error) => setError(e.message))
       .finally(() => setLoading(false))
   }, [])
 
+  useEffect(() => {
+    if (!selected) return
+    let cancelled = false
+    setContent('')
+    fetchChart(selected.date)
+      .then(({ content: c }) => { if (!cancelled) setContent(c) })
+      .catch((e: Error) => setError(e.message))
+    return () => { cancelled = true }
+  }, [selected])
+
+  const loadMore = () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    fetchChartSummaries(PAGE_SIZE, nextCursor)
+      .then(({ charts: data, next_cursor }) => {
+        setCharts((prev) => [...prev, ...data])
+        setNextCursor(next_cursor)
+      })
+      .catch((e: Error) => setError(e.message))
+      .finally(() => setLoadingMore(false))
+  }
+
   return (
     <AppShell chatPlaceholder="Ask about sounding content…">
       <div className="flex h-full">
@@ -53,6 +81,15 @@ export default function ChartPage() {
                 <p className="text-xs text-stone-400 mt-0.5 truncate">{c.preview.slice(0, 50)}</p>
               </button>
             ))}
+            {nextCursor && (
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="w-full px-4 py-3 text-xs text-stone-400 hover:text-stone-600 hover:bg-stone-100 transition-colors"
+              >
+                {loadingMore ? 'Loading…' : 'Load older soundings'}
+              </button>
+            )}
           </div>
         </aside>
 
@@ -65,7 +102,7 @@ export default function ChartPage() {
                 <p className="text-xs text-stone-400 mt-1">Daily Sounding</p>
               </div>
               <div className="prose prose-stone prose-sm max-w-none">
-                <ReactMarkdown>{selected.content}</ReactMarkdown>
+                <ReactMarkdown>{content}</ReactMarkdown>
               </div>
             </>
           ) : (
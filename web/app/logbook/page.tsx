@@ -1,9 +1,10 @@
 'use client'
 
-import { useEffect, useState } from 'react'
+import { useCallback, useEffect, useState } from 'react'
 import ReactMarkdown from 'react-markdown'
 import { AppShell } from '@/components/AppShell'
-import { fetchCards, fetchCardDates, Card } from '@/lib/api'
+import { fetchCards, fetchCardDates, fetchRelated, Card, RelatedDocument } from '@/lib/api'
+import { useVaultEvents, VaultChange } from '@/lib/events'
 
 const TYPE_LABELS: Record<string, string> = { all: 'All', insights: 'Insight', fleeting: 'Fleeting' }
 
@@ -13,6 +14,7 @@ export default function LogbookPage() {
   const [typeFilter, setTypeFilter] = useState('all')
   const [cards, setCards] = useState<Card[]>([])
   const [detail, setDetail] = useState<Card | null>(null)
+  const [related, setRelated] = useState<RelatedDocument[]>([])
   const [loading, setLoading] = useState(true)
   const [cardLoading, setCardLoading] = useState(false)
 
@@ -37,6 +39,26 @@ export default function LogbookPage() {
       .finally(() => setCardLoading(false))
   }, [date, typeFilter])
 
+  useEffect(() => {
+    setRelated([])
+    if (!detail) return
+    fetchRelated(detail).then(({ results }) => setRelated(results)).catch(console.error)
+  }, [detail])
+
+  // Live updates: new days appear in the date list, and the open day reloads in place.
+  const refreshDates = useCallback(() => {
+    fetchCardDates().then(({ dates: d }) => setDates(d)).catch(console.error)
+  }, [])
+  const refreshCards = useCallback(() => {
+    if (!date) return
+    const type = typeFilter !== 'all' ? typeFilter : undefined
+    fetchCards(date, type).then(({ cards: c }) => setCards(c)).catch(console.error)
+  }, [date, typeFilter])
+  useVaultEvents(['card'], (c: VaultChange | null) => {
+    if (!c || c.action !== 'modified') refreshDates()
+    if (!c || c.date === date) refreshCards()
+  })
+
   return (
     <AppShell chatPlaceholder="Find cards about…">
       <div className="flex flex-col h-full">
@@ -102,7 +124,7 @@ export default function LogbookPage() {
                         {card.type === 'insights' ? 'I' : 'F'}
                       </span>
                     </div>
-                    <p className="text-xs text-stone-400 line-clamp-3 leading-relaxed">{card.preview}</p>
+                    <p className="text-xs text-stone-400 line-clamp-3 leading-relaxed">{card.content.slice(0, 300)}</p>
                   </button>
                 ))}
               </div>
@@ -122,6 +144,19 @@ export default function LogbookPage() {
               <div className="prose prose-stone prose-sm max-w-none">
                 <ReactMarkdown>{detail.content}</ReactMarkdown>
               </div>
+              {related.length > 0 && (
+                <div className="mt-8 pt-4 border-t border-stone-200">
+                  <p className="text-xs font-medium text-stone-500 mb-2">Related</p>
+                  <ul className="space-y-1">
+                    {related.map((r) => (
+                      <li key={r.path} className="text-xs text-stone-500 flex justify-between gap-3">
+                        <span className="truncate">{r.title || r.name}</span>
+                        <span className="text-stone-300 shrink-0">{r.kind === 'card' ? r.date : r.category}</span>
+                      </li>
+                    ))}
+                  </ul>
+                </div>
+              )}
             </div>
           )}
         </div>
@@ -1,9 +1,10 @@
 'use client'
 
-import { useEffect, useState } from 'react'
+import { useCallback, useEffect, useState } from 'react'
 import ReactMarkdown from 'react-markdown'
 import { AppShell } from '@/components/AppShell'
 import { fetchToday, fetchCards, TodayData, Card } from '@/lib/api'
+import { useVaultEvents } from '@/lib/events'
 
 export default function NavigationPage() {
   const [today, setToday] = useState<TodayData | null>(null)
@@ -11,13 +12,18 @@ export default function NavigationPage() {
   const [detail, setDetail] = useState<Card | null>(null)
   const [loading, setLoading] = useState(true)
 
-  useEffect(() => {
-    Promise.all([fetchToday(), fetchCards()])
+  const load = useCallback(() => {
+    return Promise.all([fetchToday(), fetchCards()])
       .then(([t, { cards: c }]) => { setToday(t); setCards(c) })
       .catch(console.error)
-      .finally(() => setLoading(false))
   }, [])
 
+  useEffect(() => {
+    load().finally(() => setLoading(false))
+  }, [load])
+
+  useVaultEvents(['sounding', 'course', 'card'], load, (c) => c.type === 'course' || c.date === today?.date)
+
   return (
     <AppShell chatPlaceholder="@navigation  @insight  @fleeting…">
       <div className="flex h-full min-h-0">
@@ -75,7 +81,7 @@ export default function NavigationPage() {
                       {card.type === 'insights' ? 'I' : 'F'}
                     </span>
                   </div>
-                  <p className="text-xs text-stone-400 line-clamp-2 leading-relaxed">{card.preview}</p>
+                  <p className="text-xs text-stone-400 line-clamp-2 leading-relaxed">{card.content.slice(0, 300)}</p>
                 </button>
               ))
             )}
@@ -1,10 +1,11 @@
 'use client'
 
-import { useEffect, useState } from 'react'
+import { useCallback, useEffect, useState } from 'react'
 import Link from 'next/link'
 import { useRouter } from 'next/navigation'
-import { fetchToday, fetchUserConfig, updateTodayField, generateNavigation, TodayData } from '@/lib/api'
+import { fetchToday, fetchUserConfig, updateTodayField, generateNavigation, ConflictError, TodayData } from '@/lib/api'
 import { FocusCard } from '@/components/FocusCard'
+import { useVaultEvents } from '@/lib/events'
 
 const NAVIGATION_TRIGGER = 'Focus confirmed. Start and check chart/sounding today'
 
@@ -52,6 +53,22 @@ export default function FocusPage() {
       .finally(() => setLoading(false))
   }, [])
 
+  const refreshToday = useCallback(() => {
+    fetchToday().then(setToday).catch(console.error)
+  }, [])
+  useVaultEvents(['sounding', 'course', 'card'], refreshToday, (c) => c.type === 'course' || c.date === today?.date)
+
+  const saveField = async (field: 'task' | 'focus', value: string) => {
+    try {
+      const { etag } = await updateTodayField(field, value, today?.course_etag)
+      setToday((prev) => prev ? { ...prev, [field]: value, course_etag: etag } : prev)
+    } catch (err) {
+      // Someone else edited the course: show their version and stay in edit mode
+      if (err instanceof ConflictError) refreshToday()
+      throw err
+    }
+  }
+
   return (
     <div className="flex flex-col h-screen bg-[#faf9f6] text-stone-900">
       {/* Header */}
@@ -195,18 +212,12 @@ export default function FocusPage() {
                 <FocusCard
                   title="Long-term Focus"
                   content={today.task}
-                  onSave={async (v) => {
-                    await updateTodayField('task', v)
-                    setToday((prev) => prev ? { ...prev, task: v } : prev)
-                  }}
+                  onSave={(v) => saveField('task', v)}
                 />
                 <FocusCard
                   title="Today's Focus"
                   content={today.focus}
-                  onSave={async (v) => {
-                    await updateTodayField('focus', v)
-                    setToday((prev) => prev ? { ...prev, focus: v } : prev)
-                  }}
+                  onSave={(v) => saveField('focus', v)}
                 />
               </div>
             )}
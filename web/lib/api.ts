@@ -1,7 +1,9 @@
 const BASE = '/api'
 
 async function get<T>(path: string): Promise<T> {
-  const res = await fetch(`${BASE}${path}`, { cache: 'no-store' })
+  // 'no-cache' lets the browser keep responses but revalidate them with
+  // ETag / Last-Modified, so unchanged files come back as an empty 304.
+  const res = await fetch(`${BASE}${path}`, { cache: 'no-cache' })
   if (!res.ok) {
     const err = await res.text().catch(() => res.statusText)
     throw new Error(err || `Request failed: ${res.status}`)
@@ -9,6 +11,16 @@ async function get<T>(path: string): Promise<T> {
   return res.json() as Promise<T>
 }
 
+async function getText(path: string): Promise<string> {
+  // Raw endpoints stream the markdown file itself instead of wrapping it in JSON.
+  const res = await fetch(`${BASE}${path}`, { cache: 'no-cache' })
+  if (!res.ok) {
+    const err = await res.text().catch(() => res.statusText)
+    throw new Error(err || `Request failed: ${res.status}`)
+  }
+  return res.text()
+}
+
 async function post<T>(path: string, body: unknown): Promise<T> {
   const res = await fetch(`${BASE}${path}`, {
     method: 'POST',
@@ -33,9 +45,10 @@ export interface UserConfig {
 
 export interface TodayData {
   date: string
-  goal: string
+  task: string
   focus: string
   note: string
+  course_etag: string | null
   sounding: string | null
   sounding_exists: boolean
   course_exists: boolean
@@ -48,14 +61,62 @@ export interface Card {
   type: string
   date: string
   content: string
-  preview: string
+}
+
+export interface RelatedDocument {
+  path: string
+  kind: 'card' | 'harbor'
+  category: string
+  date: string | null
+  name: string
+  title: string
+  score: number
+}
+
+export interface CardDay {
+  date: string
+  insights: number
+  fleeting: number
+  total: number
+  last_modified: string
+  tags: Record<string, number>
+}
+
+export interface CardDates {
+  dates: string[]
+  // Present with counts: true
+  days?: CardDay[]
+  totals?: { insights: number; fleeting: number; total: number }
+}
+
+export interface CardDateParams {
+  year?: number
+  month?: number
+  fromDate?: string
+  toDate?: string
+  counts?: boolean
 }
 
 export interface Chart {
   date: string
   filename: string
   content: string
-  preview: string
+  // Only sent when requested with fields (it is a prefix of content)
+  preview?: string
+}
+
+export type ChartSummary = Pick<Chart, 'date' | 'filename'> & { preview: string }
+
+export interface PageParams {
+  limit?: number
+  cursor?: string | null
+  fromDate?: string
+  toDate?: string
+  fields?: string[]
+}
+
+export interface Page {
+  next_cursor: string | null
 }
 
 export interface Course {
@@ -67,6 +128,18 @@ export interface Course {
   next: string
 }
 
+export interface Rollup {
+  kind: 'week' | 'month'
+  period: string
+  start: string
+  end: string
+  courses: string[]
+  sources: string[]
+  summary: { date: string; text: string }[]
+  next: { date: string; text: string }[]
+  text: string
+}
+
 export interface HarborFile {
   name: string
   filename: string
@@ -92,9 +165,29 @@ export interface Template {
 
 // ---------- API calls ----------
 
+function pageQuery({ limit, cursor, fromDate, toDate, fields }: PageParams = {}) {
+  const params = new URLSearchParams()
+  if (limit) params.set('limit', String(limit))
+  if (cursor) params.set('cursor', cursor)
+  if (fromDate) params.set('from_date', fromDate)
+  if (toDate) params.set('to_date', toDate)
+  if (fields?.length) params.set('fields', fields.join(','))
+  const qs = params.toString()
+  return qs ? `?${qs}` : ''
+}
+
 export const fetchUserConfig = () => get<UserConfig>('/config/user')
 export const fetchToday = () => get<TodayData>('/today')
-export const fetchCardDates = () => get<{ dates: string[] }>('/cards/dates')
+export const fetchCardDates = ({ year, month, fromDate, toDate, counts }: CardDateParams = {}) => {
+  const params = new URLSearchParams()
+  if (year) params.set('year', String(year))
+  if (month) params.set('month', String(month))
+  if (fromDate) params.set('from_date', fromDate)
+  if (toDate) params.set('to_date', toDate)
+  if (counts) params.set('counts', 'true')
+  const qs = params.toString()
+  return get<CardDates>(`/cards/dates${qs ? `?${qs}` : ''}`)
+}
 export const fetchCards = (date?: string, type?: string) => {
   const params = new URLSearchParams()
   if (date) params.set('date', date)
@@ -102,15 +195,32 @@ export const fetchCards = (date?: string, type?: string) => {
   const qs = params.toString()
   return get<{ date: string; cards: Card[] }>(`/cards${qs ? `?${qs}` : ''}`)
 }
-export const fetchCharts = () => get<{ charts: Chart[] }>('/charts')
-export const fetchChart = (date: string) => get<{ date: string; content: string }>(`/charts/${date}`)
-export const fetchCourses = () => get<{ courses: Course[] }>('/courses')
+export const fetchRelated = (card: Pick<Card, 'date' | 'filename'>, k = 5) =>
+  get<{ results: RelatedDocument[]; took_ms: number }>(
+    `/cards/${card.date}/${encodeURIComponent(card.filename)}/related?k=${k}`
+  )
+export const fetchCharts = (page?: PageParams) =>
+  get<{ charts: Chart[] } & Page>(`/charts${pageQuery(page)}`)
+export const fetchChartSummaries = (limit: number, cursor?: string | null) =>
+  get<{ charts: ChartSummary[] } & Page>(
+    `/charts${pageQuery({ limit, cursor, fields: ['date', 'filename', 'preview'] })}`
+  )
+export const fetchChart = async (date: string) => ({
+  date,
+  content: await getText(`/charts/${date}?raw=true`),
+})
+export const fetchCourses = (page?: PageParams) =>
+  get<{ courses: Course[] } & Page>(`/courses${pageQuery(page)}`)
 export const fetchCourse = (date: string) => get<Course & { content: string; note: string }>(`/courses/${date}`)
+export const fetchRollups = (kind: Rollup['kind'], limit?: number) =>
+  get<{ kind: Rollup['kind']; rollups: Rollup[] }>(`/rollups?kind=${kind}${limit ? `&limit=${limit}` : ''}`)
 export const fetchHarbor = () => get<{ harbor: HarborData }>('/harbor')
-export const fetchHarborFile = (category: string, filename: string) =>
-  get<{ category: string; filename: string; name: string; content: string }>(
-    `/harbor/${category}/${filename}`
-  )
+export const fetchHarborFile = async (category: string, filename: string) => ({
+  category,
+  filename,
+  name: filename.replace(/\.md$/, ''),
+  content: await getText(`/harbor/${category}/${encodeURIComponent(filename)}?raw=true`),
+})
 export const fetchTemplates = () => get<{ templates: Template[] }>('/templates')
 export const createFleetingCard = (title: string, content: string, tags?: string[]) =>
   post<{ path: string; message: string }>('/cards/fleeting', { title, content, tags })
@@ -118,9 +228,16 @@ export const createFleetingCard = (title: string, content: string, tags?: string
 export const generateNavigation = () =>
   post<{ ok: boolean; already_exists: boolean; path: string }>('/navigation/generate', {})
 
-export const updateTodayField = (field: 'goal' | 'focus', value: string) =>
+/** Thrown when the course changed since `etag` was read (HTTP 412). */
+export class ConflictError extends Error {}
+
+export const updateTodayField = (field: 'task' | 'goal' | 'focus', value: string, etag?: string | null) =>
   fetch(`/api/today`, {
     method: 'PATCH',
-    headers: { 'Content-Type': 'application/json' },
+    headers: { 'Content-Type': 'application/json', ...(etag ? { 'If-Match': etag } : {}) },
     body: JSON.stringify({ field, value }),
-  }).then((r) => { if (!r.ok) throw new Error('Failed to save') })
+  }).then(async (r) => {
+    if (r.status === 412) throw new ConflictError('Course was changed elsewhere')
+    if (!r.ok) throw new Error('Failed to save')
+    return (await r.json()) as { ok: boolean; etag: string | null }
+  })
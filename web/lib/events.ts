@@ -0,0 +1,67 @@
+import { useEffect, useRef } from 'react'
+
+export type VaultChangeType = 'sounding' | 'course' | 'card' | 'harbor' | 'map'
+
+export interface VaultChange {
+  type: VaultChangeType
+  action: 'added' | 'modified' | 'deleted'
+  path: string
+  date?: string
+  category?: string
+}
+
+const CHANGE_TYPES: VaultChangeType[] = ['sounding', 'course', 'card', 'harbor', 'map']
+
+/**
+ * Subscribe to vault change notifications from /api/events.
+ * `onResync` fires when the server reports that this client fell behind
+ * (or the stream reconnected), meaning everything should be refetched.
+ * Returns a function that closes the stream.
+ */
+export function subscribeVaultEvents(
+  onChange: (change: VaultChange) => void,
+  onResync?: () => void,
+): () => void {
+  const source = new EventSource('/api/events')
+  let connected = false
+
+  for (const type of CHANGE_TYPES) {
+    source.addEventListener(type, (e) => onChange(JSON.parse((e as MessageEvent).data)))
+  }
+  source.addEventListener('resync', () => onResync?.())
+  source.addEventListener('ready', () => {
+    // A second "ready" means EventSource reconnected and may have missed changes.
+    if (connected) onResync?.()
+    connected = true
+  })
+
+  return () => source.close()
+}
+
+/**
+ * React hook: call `refresh` with the change whenever one of `types` arrives
+ * (and `filter`, if given, accepts it), or with null when a resync is requested.
+ */
+export function useVaultEvents(
+  types: VaultChangeType[],
+  refresh: (change: VaultChange | null) => void,
+  filter?: (change: VaultChange) => boolean,
+) {
+  const refreshRef = useRef(refresh)
+  const filterRef = useRef(filter)
+  refreshRef.current = refresh
+  filterRef.current = filter
+  const key = types.join(',')
+
+  useEffect(() => {
+    const wanted = new Set(key.split(','))
+    return subscribeVaultEvents(
+      (change) => {
+        if (!wanted.has(change.type)) return
+        if (filterRef.current && !filterRef.current(change)) return
+        refreshRef.current(change)
+      },
+      () => refreshRef.current(null),
+    )
+  }, [key])
+}